@@ -0,0 +1,81 @@
+"""
+Measures the cold start of the chat path: importing and constructing ConversationalAgent.
+
+Each run is a fresh interpreter started with `python -X importtime`, so the numbers include
+every module import. The slowest imports are listed, and the modules that must stay off the
+query path (Zotero, pandas, the PDF stack) are reported if they were loaded. Exits with an
+error when the median wall time exceeds the budget. Run from the repository root:
+
+    python -m benchmarks.bench_cold_start --budget 1.0
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from src.agents.conversational_agent import ConversationalAgent
+ConversationalAgent()
+print(f"COLD_START_SECONDS={time.perf_counter() - start}")
+"""
+
+# Modules the chat path must not import before the first question.
+FORBIDDEN_MODULES = ("pandas", "pyzotero", "fitz", "pymupdf", "docling", "agno.db.postgres", "qdrant_client")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def run_once(repo_root):
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-cold-start-benchmark"), "PYTHONPATH": repo_root}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=repo_root, env=env, capture_output=True, text=True, check=True,
+    )
+    seconds = float(re.search(r"COLD_START_SECONDS=([0-9.]+)", completed.stdout).group(1))
+    imports = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imports[match.group(4)] = {"cumulative_ms": int(match.group(2)) / 1000, "depth": len(match.group(3)) // 2}
+    return seconds, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=1.0, help="Cold start budget in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    imports = {}
+    for _ in range(args.runs):
+        seconds, imports = run_once(repo_root)
+        timings.append(seconds)
+
+    top_level = {name: info["cumulative_ms"] for name, info in imports.items() if info["depth"] <= 1}
+    results = {
+        "median_seconds": statistics.median(timings),
+        "max_seconds": max(timings),
+        "budget_seconds": args.budget,
+        "modules_imported": len(imports),
+        "slowest_imports_ms": dict(sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]),
+        "forbidden_modules_loaded": [name for name in imports if name.split(".")[0] in FORBIDDEN_MODULES or name in FORBIDDEN_MODULES],
+    }
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    if results["median_seconds"] > args.budget or results["forbidden_modules_loaded"]:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
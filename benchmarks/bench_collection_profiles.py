@@ -0,0 +1,127 @@
+"""
+Compares memory, recall@k and search latency of the Qdrant collection profiles on synthetic corpora.
+
+Vectors are drawn around random cluster centres, which gives embedding-like neighbourhoods
+without calling an embedding API. Recall is measured against an exact (brute force) search on
+the same collection. Needs a running Qdrant server; run from the repository root:
+
+    python -m benchmarks.bench_collection_profiles --sizes 15000 150000
+"""
+import os
+import re
+import json
+import time
+import argparse
+import statistics
+import urllib.request
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+
+from src.data.collection_profiles import COLLECTION_PROFILES, create_collection, get_profile, search_params, wait_until_ready
+
+load_dotenv()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def synthetic_vectors(rng, centres, count, noise):
+    vectors = centres[rng.integers(0, len(centres), count)] + noise * rng.standard_normal((count, centres.shape[1]))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def estimated_ram_bytes(profile, size, dim):
+    """
+    RAM needed by the vectors and the HNSW graph, following Qdrant's capacity planning notes.
+    """
+    ram = 0 if profile["on_disk"] else size * dim * 4
+    if profile["quantization"] == "scalar":
+        ram += size * dim
+    elif profile["quantization"] == "binary":
+        ram += size * dim // 8
+    ram += size * profile["hnsw_m"] * 2 * 4
+    return int(ram * 1.5)
+
+
+def resident_bytes(url):
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/metrics", timeout=5) as response:
+            metrics = response.read().decode()
+    except OSError:
+        return None
+    match = re.search(r"^memory_resident_bytes\s+([0-9.e+]+)$", metrics, re.MULTILINE)
+    return int(float(match.group(1))) if match else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15000, 150000], help="Corpus sizes, ours and 10x")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=300)
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((max(args.sizes) // 100, args.dim))
+    queries = synthetic_vectors(rng, centres, args.queries, noise=0.8)
+
+    results = {}
+    for size in args.sizes:
+        for name in args.profiles:
+            profile = get_profile(name)
+            collection = f"bench_profile_{name}_{size}"
+            if client.collection_exists(collection):
+                client.delete_collection(collection)
+            resident_before = resident_bytes(args.url)
+            create_collection(client, collection, args.dim, profile)
+
+            start = time.perf_counter()
+            corpus_rng = np.random.default_rng(1)
+            for offset in range(0, size, args.batch_size):
+                count = min(args.batch_size, size - offset)
+                client.upsert(
+                    collection_name=collection,
+                    points=models.Batch(ids=list(range(offset, offset + count)), vectors=synthetic_vectors(corpus_rng, centres, count, noise=0.8).tolist()),
+                    wait=False,
+                )
+            wait_until_ready(client, collection)
+            load_seconds = time.perf_counter() - start
+
+            latencies, recalls = [], []
+            params = search_params(profile)
+            for query in queries.tolist():
+                exact = client.query_points(collection, query=query, limit=args.k, search_params=models.SearchParams(exact=True)).points
+                start = time.perf_counter()
+                approximate = client.query_points(collection, query=query, limit=args.k, search_params=params).points
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len({point.id for point in exact} & {point.id for point in approximate}) / args.k)
+
+            resident_after = resident_bytes(args.url)
+            results.setdefault(str(size), {})[name] = {
+                "estimated_ram_mb": estimated_ram_bytes(profile, size, args.dim) / 2**20,
+                "measured_resident_delta_mb": (resident_after - resident_before) / 2**20 if resident_before and resident_after else None,
+                f"recall@{args.k}": statistics.mean(recalls),
+                "p50_ms": statistics.median(latencies),
+                "p99_ms": percentile(latencies, 99),
+                "load_seconds": load_seconds,
+            }
+            print(json.dumps({"size": size, "profile": name, **results[str(size)][name]}))
+            client.delete_collection(collection)
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Measures the context sent to the chat model per turn with and without the retrieval post-processor.
+
+For every benchmark query, the unprocessed context (the top RETRIEVAL_MAX_RESULTS chunks, as
+the agent used to receive them) is compared with the packed one (over-fetched candidates,
+deduplicated, diversified with MMR, merged and packed into CONTEXT_TOKEN_BUDGET): prompt
+tokens, latency, and coverage, i.e. whether the chunks and papers that mention the queried
+name survive packing. With --answers, full chat answers are also timed both ways. Run from
+the repository root against the existing collection:
+
+    python -m benchmarks.bench_context_packing --token-budget 4000
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+from benchmarks.bench_retrieval import QUERIES, percentile
+from src.agents.paper_compression import count_tokens
+from src.data.bm25_index import BM25Index, build_from_collection
+from src.data.context_packing import ContextPacker
+from src.data.retrieval import KnowledgeRetriever
+from src.data.vector_database import connect_vector_db
+
+load_dotenv()
+
+
+def context_tokens(documents):
+    # The agent renders retrieved documents as indented JSON.
+    return count_tokens(json.dumps(documents, indent=2, ensure_ascii=False))
+
+
+def summary(values):
+    return {"mean": statistics.mean(values), "p50": statistics.median(values), "p99": percentile(values, 99)}
+
+
+def time_answers(agent, queries, packer):
+    from src.tracing import tracer
+
+    agent.retriever.packer = packer
+    tracer.stages.pop("chat_answer", None)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        agent.ask(query)
+        latencies.append(time.perf_counter() - start)
+    answers = tracer.snapshot().get("chat_answer", {})
+    return {
+        "latency_seconds": summary(latencies),
+        "input_tokens_per_answer": answers.get("input_tokens", 0) / len(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", default=None, help="Qdrant collection (default: QDRANT_COLLECTION)")
+    parser.add_argument("--index-path", default=os.getenv("BM25_INDEX_PATH", "bm25_index.sqlite"))
+    parser.add_argument("--max-results", type=int, default=int(os.getenv("RETRIEVAL_MAX_RESULTS", "50")), help="Chunks per turn without packing")
+    parser.add_argument("--token-budget", type=int, default=int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000")))
+    parser.add_argument("--candidates", type=int, default=int(os.getenv("RETRIEVAL_CANDIDATES", "80")))
+    parser.add_argument("--mmr-lambda", type=float, default=float(os.getenv("MMR_LAMBDA", "0.7")))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--answers", type=int, default=0, help="Also time this many full chat answers with and without packing")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    vector_db = connect_vector_db(args.collection)
+    index = BM25Index(args.index_path)
+    if not len(index):
+        build_from_collection(vector_db, index)
+    retriever = KnowledgeRetriever(vector_db, max_results=args.max_results, lexical_index=index)
+    packer = ContextPacker(token_budget=args.token_budget, candidates=args.candidates, mmr_lambda=args.mmr_lambda)
+
+    rows = {"raw": {"tokens": [], "chunks": [], "papers": [], "ms": []}, "packed": {"tokens": [], "chunks": [], "papers": [], "ms": []}}
+    hits, chunk_coverage, paper_coverage = [], [], []
+    for term, query in QUERIES.items():
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            raw = retriever.search(query, num_documents=args.max_results)
+            raw_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            packed = packer.pack(retriever.search(query, num_documents=max(args.candidates, args.max_results)))
+            packed_ms = (time.perf_counter() - start) * 1000
+        for name, documents, titles, ms in (
+            ("raw", raw, {document["name"] for document in raw}, raw_ms),
+            ("packed", packed, {document["title"] for document in packed}, packed_ms),
+        ):
+            rows[name]["tokens"].append(context_tokens(documents))
+            rows[name]["chunks"].append(len(documents))
+            rows[name]["papers"].append(len(titles))
+            rows[name]["ms"].append(ms)
+
+        # Coverage: of the raw chunks and papers that mention the queried name, how many are
+        # still in the packed context (merged chunks count through their content).
+        packed_text = "\n".join(document["content"] or "" for document in packed)
+        mentioning = [document for document in raw if term.lower() in (document["content"] or "").lower()]
+        hits.append(any(term.lower() in (document["content"] or "").lower() for document in packed) or not mentioning)
+        if mentioning:
+            chunk_coverage.append(sum(document["content"] in packed_text for document in mentioning) / len(mentioning))
+            mentioning_papers = {document["name"] for document in mentioning}
+            paper_coverage.append(len(mentioning_papers & {document["title"] for document in packed}) / len(mentioning_papers))
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **{
+            name: {
+                "context_tokens": summary(values["tokens"]),
+                "chunks": statistics.mean(values["chunks"]),
+                "papers": statistics.mean(values["papers"]),
+                "latency_ms": summary(values["ms"]),
+            }
+            for name, values in rows.items()
+        },
+        "token_reduction": 1 - sum(rows["packed"]["tokens"]) / max(1, sum(rows["raw"]["tokens"])),
+        "coverage": {
+            "term_hit_rate": statistics.mean(hits),
+            "mentioning_chunks_kept": statistics.mean(chunk_coverage) if chunk_coverage else None,
+            "mentioning_papers_kept": statistics.mean(paper_coverage) if paper_coverage else None,
+        },
+    }
+
+    if args.answers:
+        from src.agents.conversational_agent import ConversationalAgent
+
+        agent = ConversationalAgent()
+        queries = list(QUERIES.values())[:args.answers]
+        results["answers"] = {"raw": time_answers(agent, queries, None), "packed": time_answers(agent, queries, packer)}
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
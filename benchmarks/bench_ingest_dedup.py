@@ -0,0 +1,103 @@
+"""
+Measures what ingest-time near-duplicate elimination saves on the existing collection.
+
+The stored chunks are replayed document by document through a fresh MinHash/LSH index, as
+the ingestion pipeline would see them, for each Jaccard threshold: how many chunks are
+near-duplicates of an earlier one (within the same document or across documents, such as a
+preprint and its camera-ready version), and so how many embedding inputs and stored vectors
+would be saved, plus the signature and lookup overhead per chunk. The most shared chunks are
+listed, to check what is being merged. Run from the repository root:
+
+    python -m benchmarks.bench_ingest_dedup --thresholds 0.7 0.8 0.9
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from collections import Counter, defaultdict
+
+from dotenv import load_dotenv
+
+from src.data.chunk_dedup import ChunkDeduplicator
+from src.data.vector_database import connect_vector_db
+
+load_dotenv()
+
+
+def stored_documents(vector_db):
+    documents, offset = defaultdict(list), None
+    while True:
+        points, offset = vector_db.client.scroll(
+            collection_name=vector_db.collection, limit=1024, offset=offset, with_payload=["name", "content", "meta_data"], with_vectors=False
+        )
+        for point in points:
+            if point.payload and point.payload.get("content"):
+                meta_data = point.payload.get("meta_data") or {}
+                documents[point.payload.get("name")].append((meta_data.get("page") or 0, meta_data.get("chunk") or 0, str(point.id), point.payload["content"]))
+        if offset is None:
+            break
+    return {name: sorted(chunks) for name, chunks in sorted(documents.items(), key=lambda item: str(item[0]))}
+
+
+def replay(documents, threshold, dimensions, workdir):
+    deduplicator = ChunkDeduplicator(os.path.join(workdir, f"dedup_{threshold}.sqlite"), threshold)
+    owner, contents = {}, {}
+    within, across, latencies = 0, 0, []
+    shared = Counter()
+    for name, chunks in documents.items():
+        point_ids = [point_id for _, _, point_id, _ in chunks]
+        start = time.perf_counter()
+        canonical = deduplicator.claim(point_ids, [content for _, _, _, content in chunks])
+        latencies.append((time.perf_counter() - start) * 1000 / max(1, len(chunks)))
+        for (_, _, point_id, content), match in zip(chunks, canonical):
+            if match is None:
+                owner[point_id], contents[point_id] = name, content
+                continue
+            shared[match] += 1
+            if owner[match] == name:
+                within += 1
+            else:
+                across += 1
+    chunks = sum(len(chunks) for chunks in documents.values())
+    duplicates = within + across
+    return {
+        "chunks": chunks,
+        "duplicates": duplicates,
+        "within_document": within,
+        "across_documents": across,
+        "embedding_inputs_saved": duplicates / chunks if chunks else 0.0,
+        "vectors_stored": chunks - duplicates,
+        "vector_bytes_saved": duplicates * dimensions * 4,
+        "overhead_ms_per_chunk": statistics.mean(latencies) if latencies else 0.0,
+        "lsh_bands": [deduplicator.bands, deduplicator.rows],
+        "most_shared": [
+            {"references": count + 1, "paper": owner[point_id], "content": contents[point_id][:120]}
+            for point_id, count in shared.most_common(5)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", default=None, help="Qdrant collection (default: QDRANT_COLLECTION)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8"))])
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    vector_db = connect_vector_db(args.collection)
+    documents = stored_documents(vector_db)
+    results = {"documents": len(documents), "dimensions": vector_db.embedder.dimensions}
+    with tempfile.TemporaryDirectory() as workdir:
+        for threshold in args.thresholds:
+            results[f"threshold_{threshold}"] = replay(documents, threshold, vector_db.embedder.dimensions, workdir)
+
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
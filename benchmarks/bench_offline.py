@@ -0,0 +1,232 @@
+"""
+Offline end-to-end benchmark: ingest, extraction, analysis and chat retrieval against local stand-ins.
+
+OpenAI and Zotero are replaced by the fake servers of benchmarks.stand_ins (with a
+configurable model latency), Qdrant runs in local mode in a scratch directory and the
+library is a set of generated PDFs. Every stage runs in a fresh interpreter, so its peak
+RSS is measured on its own. Results are written to a timestamped JSON file, to compare runs
+over time. Run from the repository root:
+
+    python -m benchmarks.bench_offline --papers 20 --pages 12 --llm-latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+STAGES = ("ingest", "extract", "analyze", "chat")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def library_rows():
+    from src.data.pdf_matcher import LIBRARY_CSV, load_library
+
+    return [row for _, row in load_library(LIBRARY_CSV).iterrows() if row['pdf_name']]
+
+
+def run_ingest(args):
+    from src.data.vector_database import load_database
+
+    documents = len(library_rows())
+    start = time.perf_counter()
+    knowledge = load_database(os.environ["PDF_DIRECTORY"], parallel=True, parse_workers=args.parse_workers)
+    elapsed = time.perf_counter() - start
+    vector_db = knowledge.vector_db
+    names, offset = set(), None
+    while True:
+        points, offset = vector_db.client.scroll(vector_db.collection, limit=1024, offset=offset, with_payload=["name"])
+        names.update(point.payload.get("name") for point in points)
+        if offset is None:
+            break
+    return {
+        "documents": documents,
+        "documents_ingested": len(names),
+        "chunks": vector_db.client.count(collection_name=vector_db.collection).count,
+        "seconds": elapsed,
+        "docs_per_sec": len(names) / elapsed,
+        # The PDFs are parsed and chunked in worker processes.
+        "peak_parse_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def run_papers(agent, method_name, limit):
+    latencies = []
+    for row in library_rows()[:limit]:
+        start = time.perf_counter()
+        getattr(agent, method_name)(row['pdf_name'])
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+
+def run_extract(args):
+    from src.agents.extractor_agent import ExtractorAgent
+
+    return run_papers(ExtractorAgent(use_cache=False), "extract", args.agent_papers)
+
+
+def run_analyze(args):
+    from src.agents.analyzer_agent import AnalyzerAgent
+
+    return run_papers(AnalyzerAgent(use_cache=False), "analyze", args.agent_papers)
+
+
+def run_chat(args):
+    from benchmarks.stand_ins import TOPICS
+    from src.agents.conversational_agent import ConversationalAgent
+
+    rng = random.Random(args.seed)
+    queries = [
+        f"Which papers use {rng.choice(TOPICS['conditions'])} with {rng.choice(TOPICS['methods'])} on {rng.choice(TOPICS['datasets'])}? ({i})"
+        for i in range(args.queries)
+    ]
+    agent = ConversationalAgent()
+    start = time.perf_counter()
+    retriever = agent.retriever
+    open_seconds = time.perf_counter() - start
+
+    retrieval = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.search(query)
+        retrieval.append(time.perf_counter() - start)
+    answers = []
+    for query in queries[:args.asks]:
+        start = time.perf_counter()
+        agent.ask(query)
+        answers.append(time.perf_counter() - start)
+    return {
+        "retriever_open_seconds": open_seconds,
+        "retrieval": latency_summary(retrieval),
+        "answer": latency_summary(answers) if answers else None,
+    }
+
+
+def run_stage(args):
+    result = {"ingest": run_ingest, "extract": run_extract, "analyze": run_analyze, "chat": run_chat}[args.stage](args)
+    from src.tracing import tracer
+
+    spans = {stage: {key: value for key, value in summary.items() if key != "histogram"} for stage, summary in tracer.snapshot().items()}
+    print("STAGE_RESULT=" + json.dumps({**result, "peak_rss_mb": peak_rss_mb(), "spans": spans}))
+
+
+def stage_environment(workdir, openai_url, zotero_url):
+    return {
+        "OPENAI_API_KEY": "sk-offline-benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "ZOTERO_USER_ID": "1",
+        "ZOTERO_API_KEY": "offline-benchmark",
+        "ZOTERO_API_URL": zotero_url,
+        "PDF_DIRECTORY": os.path.join(workdir, "pdfs"),
+        "LIBRARY_CSV": os.path.join(workdir, "zotero_pdf_matches.csv"),
+        "QDRANT_PATH": os.path.join(workdir, "qdrant"),
+        "QDRANT_COLLECTION": "offline_benchmark",
+        # The ingest pipeline does not write to the contents database, so a throwaway SQLite
+        # URL stands in for Postgres.
+        "POSTGRES_DB_URL": f"sqlite:///{os.path.join(workdir, 'contents.sqlite')}",
+        "PDF_TEXT_CACHE_DIR": os.path.join(workdir, "pdf_text_cache"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25_index.sqlite"),
+        "INGEST_DEDUP_PATH": os.path.join(workdir, "chunk_dedup.sqlite"),
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.sqlite"),
+        "ZOTERO_STORE_PATH": os.path.join(workdir, "zotero_store.sqlite"),
+        "ZOTERO_CACHE_DIR": os.path.join(workdir, "zotero_cache_metadata"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_response_cache.sqlite"),
+        "TRACE_PATH": os.path.join(workdir, "traces.jsonl"),
+    }
+
+
+def git_commit(repo_root):
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--papers", type=int, default=20, help="Number of synthetic papers in the library")
+    parser.add_argument("--pages", type=int, default=12, help="Pages per synthetic paper")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake chat completion")
+    parser.add_argument("--embedding-latency", type=float, default=0.01, help="Seconds per fake embeddings request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform noise added to the fake latencies")
+    parser.add_argument("--agent-papers", type=int, default=5, help="Papers run through the extractor and the analyzer")
+    parser.add_argument("--queries", type=int, default=100, help="Retrieval queries for the chat stage")
+    parser.add_argument("--asks", type=int, default=5, help="Full chat answers for the chat stage")
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results file (default: benchmark_results/offline_<timestamp>.json)")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args)
+        return
+
+    from benchmarks.stand_ins import FakeOpenAIServer, FakeZoteroServer, make_library
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    openai_server = FakeOpenAIServer(args.llm_latency, args.embedding_latency, args.jitter, args.seed)
+    zotero_server = FakeZoteroServer()
+    started_at = datetime.now(timezone.utc)
+    results = {
+        "timestamp": started_at.isoformat(),
+        "git_commit": git_commit(repo_root),
+        "config": {key: value for key, value in vars(args).items() if key not in ("stage", "output")},
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        make_library(workdir, args.papers, args.pages, args.seed, zotero_server)
+        results["library_seconds"] = time.perf_counter() - start
+        env = {**os.environ, **stage_environment(workdir, openai_server.url, zotero_server.url), "PYTHONPATH": repo_root}
+
+        # Ingest runs first when selected, since the other stages read its collection.
+        for stage in [stage for stage in STAGES if stage in args.stages]:
+            command = [sys.executable, "-m", "benchmarks.bench_offline", "--stage", stage] + sys.argv[1:]
+            completed = subprocess.run(command, cwd=repo_root, env=env, capture_output=True, text=True)
+            lines = [line for line in completed.stdout.splitlines() if line.startswith("STAGE_RESULT=")]
+            if completed.returncode != 0 or not lines:
+                results["stages"][stage] = {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"}
+                continue
+            results["stages"][stage] = json.loads(lines[-1].removeprefix("STAGE_RESULT="))
+
+    results["stand_ins"] = {"openai": openai_server.counts, "zotero": zotero_server.counts}
+    openai_server.close()
+    zotero_server.close()
+
+    output = args.output or os.path.join(repo_root, "benchmark_results", f"offline_{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps(results, indent=4))
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
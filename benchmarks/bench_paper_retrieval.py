@@ -0,0 +1,82 @@
+"""
+Compares flat chunk retrieval with coarse-to-fine retrieval through the paper collection.
+
+For every benchmark query, the chunk collection is searched as a whole (flat) and restricted
+to the chunks of the top papers picked in the paper collection (coarse-to-fine): latency,
+distinct papers in the results (noise) and precision and hit rate of chunks that contain the
+queried name. The paper collection must be built first (python -m src.data.paper_index).
+Run from the repository root against the existing collections:
+
+    python -m benchmarks.bench_paper_retrieval --k 10 --top-papers 8
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+from benchmarks.bench_retrieval import QUERIES, percentile
+from src.data.bm25_index import BM25Index, build_from_collection
+from src.data.paper_index import PaperIndex
+from src.data.retrieval import KnowledgeRetriever, SEARCH_MODES
+from src.data.vector_database import connect_vector_db
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", default=None, help="Qdrant collection (default: QDRANT_COLLECTION)")
+    parser.add_argument("--index-path", default=os.getenv("BM25_INDEX_PATH", "bm25_index.sqlite"))
+    parser.add_argument("--mode", default="vector", choices=[mode for mode in SEARCH_MODES if mode != "lexical"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-papers", type=int, default=int(os.getenv("RETRIEVAL_TOP_PAPERS", "8")))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    vector_db = connect_vector_db(args.collection)
+    paper_index = PaperIndex()
+    if not paper_index.exists():
+        raise SystemExit(f"Paper collection '{paper_index.vector_db.collection}' not found, build it with python -m src.data.paper_index")
+    index = None
+    if args.mode == "hybrid":
+        index = BM25Index(args.index_path)
+        if not len(index):
+            build_from_collection(vector_db, index)
+    retriever = KnowledgeRetriever(vector_db, max_results=args.k, lexical_index=index, search_mode=args.mode, paper_index=paper_index)
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "chunks": vector_db.client.count(collection_name=vector_db.collection).count,
+        "papers": paper_index.vector_db.client.count(collection_name=paper_index.vector_db.collection).count,
+    }
+    for name, top_papers in (("flat", 0), ("coarse_to_fine", args.top_papers)):
+        latencies, papers, precisions, hits = [], [], [], []
+        for term, query in QUERIES.items():
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                documents = retriever.search(query, num_documents=args.k, top_papers=top_papers)
+                latencies.append((time.perf_counter() - start) * 1000)
+            relevant = [term.lower() in (document["content"] or "").lower() for document in documents]
+            papers.append(len({document["name"] for document in documents}))
+            precisions.append(sum(relevant) / args.k)
+            hits.append(any(relevant))
+        results[name] = {
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": percentile(latencies, 99),
+            "papers_per_query": statistics.mean(papers),
+            f"precision@{args.k}": statistics.mean(precisions),
+            f"hit_rate@{args.k}": statistics.mean(hits),
+        }
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
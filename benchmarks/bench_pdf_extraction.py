@@ -0,0 +1,108 @@
+"""
+Compares peak RSS and time of PDF text extraction on large synthetic PDFs.
+
+Modes:
+    legacy   the previous agents' read_pdf: `full_text += page text` over an open document
+    stream   read_pdf_text through iter_pages, cold cache (pages are streamed into the cache)
+    cached   read_pdf_text through iter_pages, warm cache
+    budget   read_pdf_text with a token budget, cold cache (stops early, nothing is cached)
+
+Every measurement runs in a fresh interpreter, so the peak RSS of one mode does not leak
+into another. Run from the repository root:
+
+    python -m benchmarks.bench_pdf_extraction --pages 300 1500
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+MEASURE_SCRIPT = """
+import os, sys, time, json, resource
+import fitz
+from src.data.pdf_extraction import read_pdf_text
+
+mode, pdf_filepath, token_budget = sys.argv[1], sys.argv[2], int(sys.argv[3])
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == "legacy":
+    doc = fitz.open(pdf_filepath, filetype="pdf")
+    full_text = ""
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        full_text += page.get_text()
+    doc.close()
+    text = full_text
+elif mode == "budget":
+    text = read_pdf_text(pdf_filepath, token_budget=token_budget)
+else:
+    text = read_pdf_text(pdf_filepath)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "extraction_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+    "characters": len(text),
+}))
+"""
+
+PARAGRAPH = (
+    "Facial expression synthesis conditions a generative model on a target expression while "
+    "preserving the identity of the input face. We evaluate the approach on several datasets "
+    "and report quantitative and qualitative results against strong baselines. "
+)
+
+
+def make_pdf(pdf_filepath: str, pages: int):
+    import fitz
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = f"Section {page_num // 10 + 1}, page {page_num + 1}\n" + PARAGRAPH * 14
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    doc.save(pdf_filepath)
+    doc.close()
+
+
+def measure(repo_root: str, mode: str, pdf_filepath: str, cache_dir: str, token_budget: int) -> dict:
+    env = {**os.environ, "PYTHONPATH": repo_root, "PDF_TEXT_CACHE_DIR": cache_dir}
+    completed = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT, mode, pdf_filepath, str(token_budget)],
+        cwd=repo_root, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[300, 1500], help="Page counts of the synthetic PDFs")
+    parser.add_argument("--token-budget", type=int, default=24000)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in args.pages:
+            pdf_filepath = os.path.join(workdir, f"synthetic_{pages}.pdf")
+            make_pdf(pdf_filepath, pages)
+            cache_dir = os.path.join(workdir, f"cache_{pages}")
+            budget_cache_dir = os.path.join(workdir, f"budget_cache_{pages}")
+            results[f"{pages}_pages"] = {
+                "file_mb": os.path.getsize(pdf_filepath) / 1024 / 1024,
+                "legacy": measure(repo_root, "legacy", pdf_filepath, cache_dir, args.token_budget),
+                "stream": measure(repo_root, "stream", pdf_filepath, cache_dir, args.token_budget),
+                "cached": measure(repo_root, "cached", pdf_filepath, cache_dir, args.token_budget),
+                "budget": measure(repo_root, "budget", pdf_filepath, budget_cache_dir, args.token_budget),
+            }
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares latency and hit quality of vector, hybrid and lexical retrieval on the existing corpus.
+
+A retrieved chunk counts as a hit when it contains the exact name being asked about, so the
+benchmark needs no hand-labelled relevance judgements. Run from the repository root:
+
+    python -m benchmarks.bench_retrieval --k 10
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+from agno.vectordb.qdrant import Qdrant
+
+from src.data.bm25_index import BM25Index, build_from_collection
+from src.data.retrieval import KnowledgeRetriever, SEARCH_MODES
+
+load_dotenv()
+
+QUERIES = {
+    "CelebA": "Which papers train on the CelebA dataset?",
+    "AffectNet": "Results reported on AffectNet",
+    "RaFD": "Papers evaluated on RaFD",
+    "GANimation": "How does GANimation condition the generator?",
+    "StarGAN": "Comparisons against StarGAN",
+    "StyleGAN": "Methods built on StyleGAN latent editing",
+    "DDPM": "Facial expression synthesis with DDPM",
+    "Stable Diffusion": "Approaches fine-tuning Stable Diffusion for expressions",
+    "action units": "How are action units used to control expressions?",
+    "landmarks": "Using facial landmarks as conditioning",
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", default="master_literature_review")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--index-path", default=os.getenv("BM25_INDEX_PATH", "bm25_index.sqlite"))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    vector_db = Qdrant(collection=args.collection, url=args.url)
+    index = BM25Index(args.index_path)
+    if not len(index):
+        build_from_collection(vector_db, index)
+
+    retriever = KnowledgeRetriever(vector_db, max_results=args.k, lexical_index=index)
+    results = {}
+    for mode in SEARCH_MODES:
+        latencies, precisions, hits = [], [], []
+        for term, query in QUERIES.items():
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                documents = retriever.search(query, num_documents=args.k, search_mode=mode)
+                latencies.append((time.perf_counter() - start) * 1000)
+            relevant = [term.lower() in (document["content"] or "").lower() for document in documents]
+            precisions.append(sum(relevant) / args.k)
+            hits.append(any(relevant))
+        results[mode] = {
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": percentile(latencies, 99),
+            f"precision@{args.k}": statistics.mean(precisions),
+            f"hit_rate@{args.k}": statistics.mean(hits),
+        }
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""
+Local stand-ins for the services the pipeline talks to, so benchmarks can run offline:
+an OpenAI-compatible model server, a Zotero web API server and a generated library of PDFs.
+"""
+import os
+import re
+import csv
+import json
+import time
+import base64
+import random
+import struct
+import hashlib
+import threading
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+EMBEDDING_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+EXTRACTION_ANSWER = {
+    "Uses Landmarks?": {"answer": True, "explanation": "Landmarks condition the generator."},
+    "Uses Action Units?": {"answer": False, "explanation": "No action units are mentioned."},
+    "Uses GANs?": {"answer": True, "explanation": "The model is adversarially trained."},
+    "Uses Diffusion?": {"answer": False, "explanation": "No diffusion model is used."},
+    "Specific GAN": {"answer": "StarGAN", "explanation": "Built on StarGAN."},
+    "Specific Diffusion": {"answer": None, "explanation": "Not applicable."},
+    "Datasets used": {"answer": ["CelebA", "AffectNet"], "explanation": "Both are used for training and evaluation."},
+}
+
+ANALYSIS_ANSWER = """## Paper content analysis
+The paper proposes a conditional generator for facial expression synthesis.
+
+---
+## Goals
+Synthesize nuanced expressions while preserving identity.
+
+---
+## Methodology
+An adversarially trained encoder-decoder conditioned on landmarks.
+
+---
+## Contributions
+A new conditioning scheme and an evaluation protocol.
+
+---
+## Main Results
+Improves FID and expression accuracy over the baselines.
+
+---
+## Limitations
+Evaluated on frontal faces only.
+
+---
+## Question Answering
+{
+"Is it correlated with the research directly?": "Yes",
+"Is the method well-explained and reproducible?": "Partially",
+"Does it compare against strong, state-of-the-art baselines?": "Yes",
+"Does it use relevant techniques?": "Yes",
+"Is the paper close to recent state-of-the-art?": "Partially"
+}
+"""
+
+
+def hashed_embedding(text: str, dimensions: int) -> List[float]:
+    """
+    Deterministic bag-of-words embedding: every word adds a signed unit to a hashed
+    dimension, so texts sharing words are close in cosine similarity.
+    """
+    vector = [0.0] * dimensions
+    for word in re.findall(r"[a-z0-9]+", text.lower()) or [text]:
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+class _Server():
+    def __init__(self, handler_class):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server.stand_in
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.rstrip("/").endswith("/embeddings"):
+            self._reply(200, server.embeddings(body))
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            if server.rate_limited():
+                self._reply(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                    {"Retry-After": str(server.retry_after)},
+                )
+            else:
+                self._reply(200, server.chat_completion(body))
+        else:
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+
+class FakeOpenAIServer(_Server):
+    """
+    OpenAI-compatible server for chat completions and embeddings. Chat requests sleep for
+    `chat_latency` seconds (plus up to `jitter` of uniform noise) and answer with a canned
+    extraction JSON, analysis markdown or chat reply depending on the system prompt.
+    Embeddings are deterministic hashed bag-of-words vectors.
+    With `rate_limit_every` set, every Nth chat request is rejected with a 429 and a
+    Retry-After of `retry_after` seconds. `counts` holds the number of rejected requests under
+    429 and the highest number of chat requests served at once under "max_concurrent_chat".
+    """
+    def __init__(self, chat_latency: float = 0.2, embedding_latency: float = 0.01, jitter: float = 0.0, seed: int = 0, rate_limit_every: int = 0, retry_after: float = 0):
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.counts = {"chat_requests": 0, "embedding_requests": 0, "embedded_texts": 0, 429: 0, "max_concurrent_chat": 0}
+        self.chat_attempts = 0
+        self.chat_in_flight = 0
+        super().__init__(_OpenAIHandler)
+
+    def rate_limited(self) -> bool:
+        with self.lock:
+            self.chat_attempts += 1
+            limited = bool(self.rate_limit_every) and self.chat_attempts % self.rate_limit_every == 0
+            if limited:
+                self.counts[429] += 1
+        return limited
+
+    def _sleep(self, seconds: float):
+        with self.lock:
+            noise = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(seconds + noise)
+
+    def embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS.get(body.get("model"), 1536)
+        with self.lock:
+            self.counts["embedding_requests"] += 1
+            self.counts["embedded_texts"] += len(texts)
+        self._sleep(self.embedding_latency)
+        data = []
+        for index, text in enumerate(texts):
+            vector = hashed_embedding(text if isinstance(text, str) else " ".join(map(str, text)), dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{dimensions}f", *vector)).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(str(text)) // 4 for text in texts)
+        return {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        system = " ".join(str(m.get("content")) for m in messages if m.get("role") in ("system", "developer"))
+        prompt_tokens = sum(len(str(m.get("content"))) // 4 for m in messages)
+        schema = (body.get("response_format") or {}).get("json_schema", {}).get("schema")
+        if schema:
+            # Structured output requests get the canned answers restricted to the schema's fields.
+            analysis, _, qa_block = ANALYSIS_ANSWER.partition("## Question Answering")
+            qa_answers = json.loads(qa_block)
+            answers = {**EXTRACTION_ANSWER, **qa_answers, "analysis": analysis.strip(), "question_answering": qa_answers}
+            content = json.dumps({key: answers[key] for key in schema.get("properties", {}) if key in answers})
+        elif "Uses Landmarks?" in system:
+            content = json.dumps(EXTRACTION_ANSWER)
+        elif "Question Answering" in system or "Is it correlated with the research directly?" in system:
+            content = ANALYSIS_ANSWER
+        else:
+            content = "Several papers in the knowledge base condition the generator on facial landmarks [1][2]."
+        with self.lock:
+            self.counts["chat_requests"] += 1
+            self.chat_in_flight += 1
+            self.counts["max_concurrent_chat"] = max(self.counts["max_concurrent_chat"], self.chat_in_flight)
+        try:
+            self._sleep(self.chat_latency)
+        finally:
+            with self.lock:
+                self.chat_in_flight -= 1
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{self.counts['chat_requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+class _ZoteroHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.stand_in
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        with server.lock:
+            server.counts["requests"] += 1
+            version = server.version
+            since = int(params.get("since", 0))
+            failure = server.failures.popleft() if server.failures else None
+            if_modified = self.headers.get("If-Modified-Since-Version")
+            if_unmodified = self.headers.get("If-Unmodified-Since-Version")
+            if failure is not None:
+                status, headers = failure, {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+            elif if_unmodified and int(if_unmodified) != version:
+                status, headers = 412, {}
+            elif if_modified and int(if_modified) >= version:
+                status, headers = 304, {}
+            else:
+                status, headers = 200, {}
+            if status != 200:
+                server.counts[status] = server.counts.get(status, 0) + 1
+                self.send_response(status)
+                self.send_header("Last-Modified-Version", str(version))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if url.path.endswith("/deleted"):
+                body, total = {"items": [key for key, deleted_at in server.deleted.items() if deleted_at > since]}, 0
+            else:
+                items = sorted((item for item in server.items.values() if item["version"] > since), key=lambda item: item["key"])
+                start, limit = int(params.get("start", 0)), int(params.get("limit", 25))
+                body, total = items[start:start + limit], len(items)
+        data = json.dumps(body).encode()
+        # Called before answering, so the client sees the change on its next request.
+        if server.after_response is not None:
+            server.after_response(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Last-Modified-Version", str(version))
+        self.send_header("Total-Results", str(total))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeZoteroServer(_Server):
+    """
+    Zotero web API v3 subset used by ZoteroSync: versioned /items with since/start/limit,
+    Total-Results, 304 on an unchanged library (If-Modified-Since-Version), 412 when the
+    library changed (If-Unmodified-Since-Version), and /deleted. `fail_next` makes the next
+    requests fail with a status such as 429 or 503, and `after_response` is called with the
+    path of every successful request once its answer is ready, e.g. to change the library in
+    the middle of a sync.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.deleted: Dict[str, int] = {}
+        self.counts: Dict[Any, int] = {"requests": 0}
+        self.failures: Deque[int] = deque()
+        self.retry_after: Optional[int] = None
+        self.after_response: Optional[Callable[[str], None]] = None
+        super().__init__(_ZoteroHandler)
+
+    def fail_next(self, status: int, count: int = 1, retry_after: Optional[int] = 0):
+        with self.lock:
+            self.failures.extend([status] * count)
+            self.retry_after = retry_after
+
+    def add_item(self, data: Dict[str, Any]):
+        with self.lock:
+            self.version += 1
+            self.items[data["key"]] = {"key": data["key"], "version": self.version, "data": {**data, "version": self.version}}
+
+    def delete_item(self, key: str):
+        with self.lock:
+            self.version += 1
+            self.items.pop(key, None)
+            self.deleted[key] = self.version
+
+
+TOPICS = {
+    "methods": ["StarGAN", "GANimation", "StyleGAN", "DDPM", "Stable Diffusion", "ControlNet", "VAE", "transformer"],
+    "datasets": ["CelebA", "AffectNet", "RaFD", "MEAD", "FFHQ", "BP4D", "DISFA", "Oulu-CASIA"],
+    "conditions": ["facial landmarks", "action units", "expression labels", "audio", "text prompts", "3DMM coefficients"],
+    "goals": ["identity preservation", "expression intensity control", "temporal consistency", "nuanced expressions", "few-shot editing"],
+}
+SECTIONS = ["Abstract", "1 Introduction", "2 Related Work", "3 Method", "4 Experiments", "5 Results", "6 Conclusion", "References"]
+
+
+def synthetic_paper(rng: random.Random, pages: int) -> Dict[str, Any]:
+    """
+    Generates the title and the page texts of a paper about facial expression synthesis.
+    """
+    method, dataset = rng.choice(TOPICS["methods"]), rng.choice(TOPICS["datasets"])
+    condition, goal = rng.choice(TOPICS["conditions"]), rng.choice(TOPICS["goals"])
+    title = f"{method.split()[0]}-based {goal} with {condition} on {dataset} {rng.randint(1, 10 ** 6)}"
+
+    def sentence() -> str:
+        return rng.choice([
+            f"We condition {rng.choice(TOPICS['methods'])} on {rng.choice(TOPICS['conditions'])} to improve {rng.choice(TOPICS['goals'])}.",
+            f"Experiments on {rng.choice(TOPICS['datasets'])} and {rng.choice(TOPICS['datasets'])} report FID and expression accuracy.",
+            f"Compared with {rng.choice(TOPICS['methods'])}, our model better preserves {rng.choice(TOPICS['goals'])}.",
+            f"The generator uses {condition} as conditioning and is trained on {dataset}.",
+            f"Ablations show that {rng.choice(TOPICS['conditions'])} matter for {goal}.",
+        ])
+
+    page_texts, section = [], None
+    for page_num in range(pages):
+        lines = [f"{title} - page {page_num + 1}"]
+        if SECTIONS[page_num * len(SECTIONS) // pages] != section:
+            section = SECTIONS[page_num * len(SECTIONS) // pages]
+            lines.append(section)
+        lines.extend(" ".join(sentence() for _ in range(5)) for _ in range(6))
+        page_texts.append("\n".join(lines))
+    return {"title": title, "method": method, "dataset": dataset, "pages": page_texts}
+
+
+def write_pdf(pdf_filepath: str, page_texts: List[str]):
+    import fitz
+
+    doc = fitz.open()
+    for text in page_texts:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    doc.save(pdf_filepath)
+    doc.close()
+
+
+def make_library(workdir: str, papers: int, pages: int, seed: int = 0, zotero: Optional[FakeZoteroServer] = None, collection: str = "SVUM4G2M") -> List[Dict[str, Any]]:
+    """
+    Writes `papers` synthetic PDFs to workdir/pdfs and the title to PDF mapping to
+    workdir/zotero_pdf_matches.csv, and adds the matching items to the fake Zotero library.
+    Returns one dictionary per paper with its title, pdf_name, method and dataset.
+    """
+    rng = random.Random(seed)
+    pdf_directory = os.path.join(workdir, "pdfs")
+    os.makedirs(pdf_directory, exist_ok=True)
+    library = []
+    for paper_num in range(papers):
+        paper = synthetic_paper(rng, pages)
+        author = rng.choice(["Silva", "Chen", "Kumar", "Müller", "Okafor", "García", "Tanaka", "Novak"])
+        year = rng.randint(2018, 2025)
+        pdf_name = f"{author} et al. - {year} - {paper['title']}.pdf"
+        write_pdf(os.path.join(pdf_directory, pdf_name), paper["pages"])
+        if zotero is not None:
+            zotero.add_item({
+                "key": f"SYN{paper_num:05d}",
+                "itemType": "journalArticle",
+                "title": paper["title"],
+                "date": str(year),
+                "creators": [{"creatorType": "author", "firstName": "A.", "lastName": author}],
+                "tags": [{"tag": paper["method"]}, {"tag": paper["dataset"]}],
+                "collections": [collection],
+                "publicationTitle": "Synthetic Journal of Facial Expression Synthesis",
+            })
+        library.append({"title": paper["title"], "pdf_name": pdf_name, "method": paper["method"], "dataset": paper["dataset"]})
+
+    with open(os.path.join(workdir, "zotero_pdf_matches.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["title", "pdf_name"])
+        writer.writeheader()
+        writer.writerows({"title": paper["title"], "pdf_name": paper["pdf_name"]} for paper in library)
+    return library
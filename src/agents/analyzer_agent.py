@@ -1,21 +1,27 @@
 import os
 import json
+import asyncio
 import logging
-import fitz
-import pandas as pd
 from dotenv import load_dotenv
-from docling.document_converter import DocumentConverter
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
 from agno.utils.pprint import pprint_run_response
-from src.agents.prompts import ANALYZER_SYSTEM_PROMPT, ANALYZER_PROMPT
+from src.data.pdf_extraction import read_pdf_pages, read_pdf_text, read_pdf_markdown
+from src.agents.prompts import ANALYZER_SYSTEM_PROMPT, ANALYZER_PROMPT, ANALYZER_QUESTIONS, REASK_SYSTEM_PROMPT
+from src.agents.batch_runner import BatchRunner, estimate_tokens
+from src.agents.response_cache import ResponseCache, generation_params
+from src.agents.paper_compression import compress_paper, count_tokens
+from src.agents.structured_output import AnalyzerOutput, QuestionAnswering, answers_model, match_answers, parse_answers, parse_json, reask_message, response_text, schema_fingerprint
+from src.tracing import span, token_usage
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+REASK_TOKEN_BUDGET = int(os.getenv("REASK_TOKEN_BUDGET", "4000"))
+
 class AnalyzerAgent():
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.llm_model  = os.getenv("LLM_MODEL", "gpt-5-mini")
         if not self.openai_api_key:
@@ -23,32 +29,66 @@ class AnalyzerAgent():
 
         self.agent = Agent(
             model=OpenAIChat(id=self.llm_model, system_prompt=ANALYZER_SYSTEM_PROMPT),
+            output_schema=AnalyzerOutput,
         )
+        self.response_cache = ResponseCache(bypass=not use_cache or None)
 
-    def read_pdf_docling(self, pdf_filepath: str):
+    def reask_agent(self, missing: list) -> Agent:
+        """
+        Builds an agent whose response schema holds only the missing questions.
+        """
+        return Agent(
+            model=OpenAIChat(id=self.llm_model, system_prompt=REASK_SYSTEM_PROMPT),
+            output_schema=answers_model("QuestionAnsweringReask", {question: ANALYZER_QUESTIONS[question] for question in missing}),
+        )
+
+    def complete(self, message: str, agent: Agent | None = None) -> str:
         """
-        Reads and extracts text from a PDF file.
+        Runs the agent on a message, serving byte-identical requests from the response cache.
         """
-        if not os.path.isfile(pdf_filepath):
-            logging.error(f"PDF file not found: {pdf_filepath}")
-            raise FileNotFoundError(f"PDF file not found: {pdf_filepath}")
+        agent = agent or self.agent
+        system_prompt = agent.model.system_prompt
+        params = {**generation_params(agent.model), "response_schema": schema_fingerprint(agent.output_schema)}
+        cached = self.response_cache.get(self.llm_model, system_prompt, message, params)
+        if cached is not None:
+            return cached
+        with span("llm_call", agent="analyzer", model=self.llm_model) as s:
+            response = agent.run(message)
+            content = response_text(response.content)
+            s.add(**token_usage(response), bytes=len(content))
+        pprint_run_response(response)
+        self.response_cache.set(self.llm_model, system_prompt, message, content, params)
+        return content
 
-        converter = DocumentConverter()
-        doc = converter.convert(pdf_filepath).document
-        return doc.export_to_markdown()
+    async def acomplete(self, message: str, runner: BatchRunner, agent: Agent | None = None) -> str:
+        """
+        Async variant of `complete` that goes through the batch runner's rate limiter on a cache miss.
+        """
+        agent = agent or self.agent
+        system_prompt = agent.model.system_prompt
+        params = {**generation_params(agent.model), "response_schema": schema_fingerprint(agent.output_schema)}
+        cached = self.response_cache.get(self.llm_model, system_prompt, message, params)
+        if cached is not None:
+            return cached
+        with span("llm_call", agent="analyzer", model=self.llm_model) as s:
+            response = await runner.call(lambda: agent.arun(message), estimate_tokens(message))
+            content = response_text(response.content)
+            s.add(**token_usage(response), bytes=len(content))
+        self.response_cache.set(self.llm_model, system_prompt, message, content, params)
+        return content
 
-    def read_pdf(self, pdf_filepath: str):
+    def read_pdf_docling(self, pdf_filepath: str):
         """
-        Reads and extracts text from a PDF file.
+        Reads and extracts text from a PDF file as markdown, using the shared extraction cache.
         """
-        doc = fitz.open(pdf_filepath, filetype="pdf")
-        full_text = ""
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            full_text += text
-        doc.close()
-        return full_text
+        return read_pdf_markdown(pdf_filepath)
+
+    def read_pdf(self, pdf_filepath: str, token_budget: int | None = None):
+        """
+        Reads and extracts text from a PDF file page by page, using the shared extraction cache.
+        With a token budget, extraction stops once the budget is reached.
+        """
+        return read_pdf_text(pdf_filepath, token_budget=token_budget, count_fn=count_tokens)
 
     def get_cached_metadata(self, pdf_filename: str) -> dict | None:
         """
@@ -80,50 +120,140 @@ class AnalyzerAgent():
             json.dump(data, f, indent=4)
         logging.info(f"JSON data saved to {output_path}")
 
-    def analyze(self, pdf_filename: str):
+    def build_message(self, pdf_filename: str) -> str:
         """
-        Processes a user query, searches for relevant documents, and generates a response.
+        Reads a paper and its cached metadata and renders the analyzer prompt.
         """
         pdf_directory = os.getenv("PDF_DIRECTORY", "")
         pdf_filepath = os.path.join(pdf_directory, pdf_filename)
-        paper_content = self.read_pdf(pdf_filepath)
+        with span("read_pdf", paper=pdf_filename) as s:
+            pages = read_pdf_pages(pdf_filepath)
+            s.add(items=len(pages), bytes=sum(len(page) for page in pages))
+        with span("compress_paper", paper=pdf_filename) as s:
+            paper_content = compress_paper(pages, ANALYZER_SYSTEM_PROMPT, paper_name=pdf_filename)
+            s.add(bytes=len(paper_content))
         paper_metadata = self.get_cached_metadata(pdf_filename) or {}
-        message = ANALYZER_PROMPT.format(paper_metadata=paper_metadata, paper_content=paper_content)
-        response = self.agent.run(message)
-        pprint_run_response(response)
+        return ANALYZER_PROMPT.format(paper_metadata=paper_metadata, paper_content=paper_content)
+
+    def parse_result(self, result: str) -> tuple:
+        """
+        Splits the analyzer output into the analysis markdown and the question answering
+        answers, also accepting markdown followed by a "## Question Answering" JSON block.
+        Returns the analysis, the valid answers and the missing or invalid questions.
+        """
+        with span("json_parse", agent="analyzer", bytes=len(result)) as s:
+            try:
+                data = parse_json(result)
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and "analysis" in data:
+                analysis, qa_json = str(data["analysis"]), data.get("question_answering")
+            elif "## Question Answering" in result:
+                analysis, _, qa_block = result.partition("## Question Answering")
+                try:
+                    qa_json = parse_json(qa_block)
+                except ValueError:
+                    qa_json = None
+            else:
+                analysis, qa_json = "", data
+            answers, missing = match_answers(qa_json, ANALYZER_QUESTIONS)
+            s.add(missing=len(missing))
+        return analysis.strip(), answers, missing
+
+    def build_reask(self, missing: list, analysis: str, pdf_filename: str) -> str:
+        """
+        Renders the follow-up prompt for the missing questions. The analysis the model already
+        wrote is the context; without one, a short excerpt of the paper is used instead.
+        """
+        context = analysis
+        if not context:
+            pdf_filepath = os.path.join(os.getenv("PDF_DIRECTORY", ""), pdf_filename)
+            context = compress_paper(read_pdf_pages(pdf_filepath), "\n".join(missing), token_budget=REASK_TOKEN_BUDGET, paper_name=pdf_filename)
+        return reask_message(ANALYZER_QUESTIONS, missing, context)
+
+    def parse_reask(self, result: str, missing: list) -> tuple:
+        with span("json_parse", agent="analyzer", bytes=len(result)) as s:
+            answers, missing = parse_answers(result, {question: ANALYZER_QUESTIONS[question] for question in missing})
+            s.add(missing=len(missing))
+        return answers, missing
+
+    def finalize(self, pdf_filename: str, analysis: str, answers: dict, missing: list) -> tuple:
+        """
+        Renders the analysis markdown with its question answering block, and the answers JSON.
+        """
+        if missing:
+            raise ValueError(f"Analyzer left {missing} unanswered for {pdf_filename}")
+        qa_json = QuestionAnswering.model_validate(answers).model_dump(by_alias=True)
+        return f"{analysis}\n\n## Question Answering\n{json.dumps(qa_json, indent=4)}\n", qa_json
 
-        result = response.content
-        filtered_string = result[result.find("## Question Answering"): ]
-        qa_json = filtered_string[filtered_string.find("{"): filtered_string.find("}")+1].replace('\n', ' ')
-        qa_json = json.loads(qa_json)
-        return result, qa_json
+    def analyze(self, pdf_filename: str):
+        """
+        Analyzes a paper, returning the analysis markdown and the question answering JSON.
+        Answers that are missing after local repair are asked again in one short follow-up call.
+        """
+        message = self.build_message(pdf_filename)
+        analysis, answers, missing = self.parse_result(self.complete(message))
+        if missing:
+            reask = self.build_reask(missing, analysis, pdf_filename)
+            found, missing = self.parse_reask(self.complete(reask, self.reask_agent(missing)), missing)
+            answers.update(found)
+        return self.finalize(pdf_filename, analysis, answers, missing)
+
+    async def analyze_many(self, pdf_filenames: list, on_result=None, **batch_options) -> list:
+        """
+        Analyzes many papers concurrently with the same agent, under a client-side rate limit.
+        `on_result(pdf_filename, result)` is called as each paper finishes; failed papers
+        get the exception instead of a result. `batch_options` are passed to BatchRunner.
+        """
+        runner = BatchRunner(**batch_options)
+
+        async def analyze_one(pdf_filename: str):
+            message = await asyncio.to_thread(self.build_message, pdf_filename)
+            analysis, answers, missing = self.parse_result(await self.acomplete(message, runner))
+            if missing:
+                reask = await asyncio.to_thread(self.build_reask, missing, analysis, pdf_filename)
+                found, missing = self.parse_reask(await self.acomplete(reask, runner, self.reask_agent(missing)), missing)
+                answers.update(found)
+            return self.finalize(pdf_filename, analysis, answers, missing)
+
+        results = await runner.run(pdf_filenames, analyze_one, on_result=on_result)
+        logging.info(f"LLM response cache: {self.response_cache.stats()}")
+        return results
 
 if __name__ == '__main__':
-    library = pd.read_csv('/home/mlevi/Work/research-assistant/src/data/zotero_pdf_matches.csv', encoding='windows-1252')
-    for i, row in library.iterrows():
-        print(f'Executing {i+1} of {len(library)}')
-        try:
-            analyzer_agent = AnalyzerAgent()
-            pdf_name = row['pdf_name']
-
-            # Edge cases treatment
-            if 'Parkinson' in pdf_name:
-                pdf_name = pdf_name.replace("Parkinsons's", 'Parkinsons’s')
-            if 'wavelet' in pdf_name:
-                pdf_name = pdf_name.replace('diffusion-a', 'diffusion–a')
-            analysis_output_path = os.path.join("analysis_outputs", f"{pdf_name.replace('.pdf', '')}_analysis.md")
-            if not os.path.isfile(os.path.join(os.getenv("PDF_DIRECTORY", ""), pdf_name)):
-                raise FileNotFoundError(f"PDF file not found: {pdf_name}")
-
-            if not os.path.isfile(analysis_output_path):
-                result, qa_json = analyzer_agent.analyze(pdf_name)
-                analyzer_agent.save_result(result, analysis_output_path)
-                analyzer_agent.save_json(qa_json, analysis_output_path.replace('_analysis.md', '_qa.json'))
-            #else:
-                #logging.info(f"Analysis output already exists at {analysis_output_path}")
-        except ValueError as ve:
-            print(f"Configuration Error: {ve}")
-        except FileNotFoundError as fnfe:
-            print(f"File Error: {fnfe}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    from src.data.pdf_matcher import LIBRARY_CSV, library_pdfs, load_library
+    from src.data.corpus_table import ANALYSIS_OUTPUTS_DIR, compile_corpus
+    from src.data.paper_index import build_paper_index
+
+    from src.tracing import start_metrics_server
+
+    start_metrics_server()
+    library = load_library(LIBRARY_CSV)
+    try:
+        analyzer_agent = AnalyzerAgent()
+    except ValueError as ve:
+        print(f"Configuration Error: {ve}")
+        raise SystemExit(1)
+
+    pending = []
+    for pdf in library_pdfs(library, os.getenv("PDF_DIRECTORY", "")):
+        pdf_name = pdf['pdf_name']
+        analysis_output_path = os.path.join(ANALYSIS_OUTPUTS_DIR, f"{pdf_name.replace('.pdf', '')}_analysis.md")
+        if not os.path.isfile(os.path.join(os.getenv("PDF_DIRECTORY", ""), pdf_name)):
+            print(f"File Error: PDF file not found: {pdf_name}")
+        elif not os.path.isfile(analysis_output_path):
+            pending.append(pdf_name)
+
+    def save_analysis(pdf_name, output):
+        if isinstance(output, Exception):
+            print(f"An unexpected error occurred on {pdf_name}: {output}")
+            return
+        result, qa_json = output
+        analysis_output_path = os.path.join(ANALYSIS_OUTPUTS_DIR, f"{pdf_name.replace('.pdf', '')}_analysis.md")
+        analyzer_agent.save_result(result, analysis_output_path)
+        analyzer_agent.save_json(qa_json, analysis_output_path.replace('_analysis.md', '_qa.json'))
+
+    print(f'Analyzing {len(pending)} of {len(library)} papers')
+    asyncio.run(analyzer_agent.analyze_many(pending, on_result=save_analysis))
+    compile_corpus(library=library)
+    build_paper_index(library=library)
@@ -0,0 +1,147 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+from src.tracing import current_span
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about four characters per token) used for client-side rate limiting.
+    """
+    return max(1, len(text) // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Checks whether an exception raised by agno or the OpenAI client is an HTTP 429.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and getattr(error, "response", None) is not None:
+        status_code = getattr(error.response, "status_code", None)
+    return status_code == 429 or type(error).__name__ in ("RateLimitError", "ModelRateLimitError")
+
+
+class TokenBucket():
+    """
+    Async token bucket that refills continuously up to `capacity` units per minute.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.refill_rate = capacity / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: int = 1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.refill_rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter():
+    """
+    Client-side limit on requests per minute and tokens per minute. A 429 from the provider
+    pauses every caller for the backoff period, not only the one that was rejected.
+    """
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+    async def acquire(self, tokens: int):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class BatchRunner():
+    """
+    Runs many LLM requests concurrently under a rate limit, retrying 429s with exponential backoff.
+    Configured through LLM_CONCURRENCY, LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE.
+    """
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        base_delay: float = 2.0,
+    ):
+        self.concurrency = concurrency or int(os.getenv("LLM_CONCURRENCY", "4"))
+        self.limiter = RateLimiter(
+            requests_per_minute or int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+            tokens_per_minute or int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    async def call(self, request: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        """
+        Awaits `request()` once the rate limiter allows it, backing off on 429 responses.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(tokens)
+            try:
+                return await request()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = self.base_delay * (2 ** attempt) * (1 + random.random())
+                if current_span() is not None:
+                    current_span().add(retries=1)
+                logging.warning(f"Rate limited by the provider, backing off for {delay:.1f}s (attempt {attempt + 1})")
+                self.limiter.pause(delay)
+
+    async def run(
+        self,
+        items: List[Any],
+        worker: Callable[[Any], Awaitable[Any]],
+        on_result: Optional[Callable[[Any, Any], None]] = None,
+    ) -> List[Any]:
+        """
+        Runs `worker(item)` for every item with at most `concurrency` in flight. Returns the results
+        in input order; failed items hold their exception instead of a result.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        done = 0
+
+        async def run_one(item):
+            nonlocal done
+            async with semaphore:
+                try:
+                    result = await worker(item)
+                except Exception as e:
+                    logging.error(f"Error processing {item}: {e}")
+                    result = e
+            done += 1
+            logging.info(f"Completed {done} of {len(items)} ({done / (time.perf_counter() - start):.2f} items/sec)")
+            if on_result is not None:
+                on_result(item, result)
+            return result
+
+        return await asyncio.gather(*(run_one(item) for item in items))
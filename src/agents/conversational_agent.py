@@ -1,34 +1,191 @@
 import os
+import json
 import typer
 import logging
+import threading
 from dotenv import load_dotenv
+from typing import Optional
 from rich.prompt import Prompt
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from src.data.vector_database import load_database
 from src.agents.prompts import CONVERSATIONAL_SYSTEM_PROMPT, CONVERSATIONAL_PROMPT
+from src.tracing import span, token_usage
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ConversationalAgent():
+    """
+    Chat agent over the knowledge base. Construction only reads the configuration; agno,
+    Qdrant and the retrieval indexes are imported and opened on first use (or by `warm_up`),
+    and Zotero, the library CSV and the PDF stack are never touched on the query path.
+    """
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.llm_model  = os.getenv("LLM_MODEL", "gpt-5-mini")
-        self.knowledge = load_database(os.getenv("PDF_DIRECTORY", ""), skip_add=True)
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY must be set in the .env file.")
+        self._retriever = None
+        self._agent = None
+        self._init_lock = threading.Lock()
 
-        self.agent = Agent(
-            model=OpenAIChat(id=self.llm_model, system_prompt=CONVERSATIONAL_SYSTEM_PROMPT),
-            knowledge=self.knowledge,
-            search_knowledge=True,
-            instructions=[
-                "Always search your knowledge base before answering questions",
-                "Include source references in your responses when possible"
+    @property
+    def retriever(self):
+        with self._init_lock:
+            if self._retriever is None:
+                from src.data.vector_database import connect_vector_db
+                from src.data.retrieval import KnowledgeRetriever
+                from src.data.query_cache import SemanticQueryCache
+                from src.data.ingest_manifest import IngestManifest
+                from src.data.bm25_index import BM25Index
+                from src.data.context_packing import ContextPacker
+                from src.data.paper_index import PaperIndex
+
+                packer = ContextPacker()
+                self._retriever = KnowledgeRetriever(
+                    connect_vector_db(),
+                    max_results=int(os.getenv("RETRIEVAL_MAX_RESULTS", "50")),
+                    query_cache=SemanticQueryCache(generation_fn=IngestManifest().generation),
+                    lexical_index=BM25Index(),
+                    packer=packer if packer.token_budget > 0 else None,
+                    paper_index=PaperIndex(),
+                )
+        return self._retriever
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from agno.agent import Agent
+            from agno.models.openai import OpenAIChat
+
+            from src.data.corpus_table import describe_fields
+
+            retriever = self.retriever
+            with self._init_lock:
+                if self._agent is None:
+                    self._agent = Agent(
+                        model=OpenAIChat(id=self.llm_model, system_prompt=CONVERSATIONAL_SYSTEM_PROMPT),
+                        knowledge_retriever=retriever,
+                        search_knowledge=True,
+                        tools=[self.search_papers, self.query_corpus],
+                        instructions=[
+                            "Always search your knowledge base before answering questions about the content of the papers",
+                            "When the question restricts the papers by year, author, tag or type, use search_papers with those filters",
+                            "For questions that count, rank or list papers by their metadata or extracted attributes "
+                            "(e.g. how many papers use diffusion, which datasets are used the most), use query_corpus "
+                            "instead of counting retrieved chunks. Its fields are:\n" + describe_fields(),
+                            "Include source references in your responses when possible, citing the title and year of each source you use"
+                        ]
+                    )
+        return self._agent
+
+    def warm_up(self):
+        """
+        Builds the agent in a background thread, so the first question does not pay for it.
+        """
+        threading.Thread(target=lambda: self.agent, daemon=True).start()
+
+    def search_papers(
+        self,
+        query: str,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        author: Optional[str] = None,
+        tag: Optional[str] = None,
+        item_type: Optional[str] = None,
+        num_documents: int = 10,
+    ) -> str:
+        """
+        Searches the literature knowledge base, keeping only chunks of papers that match the given filters.
+
+        Args:
+            query: What to search for in the papers.
+            year_from: Only papers published in this year or later.
+            year_to: Only papers published in this year or earlier.
+            author: Last name of one of the authors.
+            tag: A Zotero tag of the paper.
+            item_type: Zotero item type, such as journalArticle, conferencePaper or preprint.
+            num_documents: Maximum number of chunks to return.
+
+        Returns:
+            A JSON list of matching chunks with the paper title, year, authors and content,
+            packed into the context token budget.
+        """
+        year = {key: value for key, value in (("gte", year_from), ("lte", year_to)) if value is not None}
+        filters = {
+            "year": year or None,
+            "creators": author.strip().lower() if author else None,
+            "tags": tag.strip().lower() if tag else None,
+            "item_type": item_type,
+        }
+        results = self.retriever(query, num_documents=num_documents, filters={k: v for k, v in filters.items() if v is not None})
+        if self.retriever.packer is None:
+            results = [
+                {
+                    "title": result["name"],
+                    "year": result["meta_data"].get("year"),
+                    "authors": result["meta_data"].get("authors"),
+                    "content": result["content"],
+                }
+                for result in results
             ]
-        )
+        return json.dumps(results)
+
+    def query_corpus(
+        self,
+        where: Optional[str] = None,
+        count_by: Optional[str] = None,
+        list_papers: bool = False,
+        limit: int = 20,
+    ) -> str:
+        """
+        Answers filter and aggregate questions about the papers exactly, from the table of
+        extracted attributes and Zotero metadata of every paper.
+
+        Args:
+            where: JSON object of conditions on the fields, all of which must hold. A value matches
+                exactly (case-insensitive; on list fields, any element), a list matches any of its
+                values, {"gte": 2022, "lte": 2024} is a range and {"contains": "text"} a substring.
+                Example: {"uses_diffusion": true, "year": {"gte": 2022}}.
+            count_by: Field whose values are counted over the matching papers, e.g. "datasets_used" or "year".
+            list_papers: Also return the titles, years and authors of the matching papers.
+            limit: Maximum number of counted values and of listed papers.
+
+        Returns:
+            A JSON object with the number of matching papers, and the counts and papers when requested.
+        """
+        from src.data.corpus_table import get_corpus_table
+
+        with span("corpus_query") as s:
+            try:
+                result = get_corpus_table().query(json.loads(where) if where else None, count_by, list_papers, limit)
+            except (ValueError, FileNotFoundError) as e:
+                s.add(error_message=str(e))
+                return json.dumps({"error": str(e)})
+            s.add(items=result["matching_papers"])
+        return json.dumps(result, ensure_ascii=False)
+
+    def ask(self, message: str) -> str:
+        """
+        Answers a single question non-interactively and returns the full response.
+        """
+        with span("chat_answer", model=self.llm_model) as s:
+            response = self.agent.run(message)
+            s.add(**token_usage(response), bytes=len(response.content or ""))
+        return response.content
+
+    def ask_stream(self, message: str):
+        """
+        Answers a single question, yielding the response text as it is generated.
+        """
+        from agno.run.agent import RunEvent
+
+        with span("chat_answer", model=self.llm_model, stream=True) as s:
+            for event in self.agent.run(message, stream=True):
+                if event.event == RunEvent.run_error.value:
+                    raise RuntimeError(event.content)
+                if event.event == RunEvent.run_content.value and event.content:
+                    s.add(bytes=len(event.content))
+                    yield event.content
 
     def run(self, user: str = "Levi"):
         """
@@ -38,7 +195,7 @@ class ConversationalAgent():
             message = Prompt.ask(f"[bold] :sunglasses: {user} [/bold]")
             if message in ("exit", "bye"):
                 break
-            self.agent.print_response(message)
+            self.agent.print_response(message, stream=True)
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,199 @@
+import os
+import re
+import logging
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+KNOWN_SECTIONS = (
+    "abstract", "introduction", "related work", "background", "preliminaries", "method", "methods",
+    "methodology", "approach", "proposed method", "experiments", "experimental setup", "experimental results",
+    "evaluation", "results", "discussion", "limitations", "conclusion", "conclusions", "future work",
+    "references", "bibliography", "acknowledgements", "acknowledgments", "appendix", "supplementary material",
+)
+DROPPED_SECTIONS = ("references", "bibliography", "acknowledgement", "acknowledgment", "funding", "author contributions")
+DOWNWEIGHTED_SECTIONS = ("appendix", "supplementary")
+SECTION_PRIORS = {
+    "abstract": 3.0, "introduction": 1.5, "method": 2.0, "approach": 2.0, "experiment": 2.0,
+    "result": 1.5, "evaluation": 1.5, "dataset": 2.0, "conclusion": 1.2, "limitation": 1.2,
+}
+STOPWORDS = {
+    "does", "paper", "used", "uses", "using", "which", "with", "that", "this", "from", "there", "their",
+    "answer", "question", "consider", "specific", "employed", "what", "into", "about", "other", "such",
+}
+
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+)?(?P<title>[A-Z][A-Za-z\- ]{2,60})\s*$"
+)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates four characters per token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Returns the longest prefix of `text` that fits in `max_tokens` tokens, as counted by count_tokens.
+    """
+    if _encoding is None:
+        return text[:max(max_tokens, 0) * 4]
+    tokens = _encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    text = _encoding.decode(tokens[:max(max_tokens, 0)])
+    # A character split across the cut decodes to U+FFFD, and re-encoding the prefix can
+    # merge tokens differently, so the count is checked again.
+    text = text.rstrip("\ufffd")
+    while text and count_tokens(text) > max_tokens:
+        text = text[:-1]
+    return text
+
+
+def _normalize_line(line: str) -> str:
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def strip_repeated_lines(pages: List[str], edge_lines: int = 3, min_ratio: float = 0.5) -> List[str]:
+    """
+    Removes running headers and footers: lines near the top or bottom of a page that repeat
+    (ignoring digits) on at least `min_ratio` of the pages, plus bare page numbers.
+    """
+    if len(pages) < 3:
+        return pages
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        counts.update({_normalize_line(line) for line in lines[:edge_lines] + lines[-edge_lines:]})
+    repeated = {line for line, count in counts.items() if count >= min_ratio * len(pages)}
+
+    cleaned = []
+    for page in pages:
+        lines = page.splitlines()
+        kept = [
+            line for line in lines
+            if _normalize_line(line) not in repeated and not re.fullmatch(r"\s*\d{1,4}\s*", line)
+        ]
+        cleaned.append("\n".join(kept))
+    return cleaned
+
+
+def _section_key(title: str) -> Optional[str]:
+    lowered = title.strip().lower()
+    for known in KNOWN_SECTIONS:
+        if lowered == known or lowered.startswith(known):
+            return known
+    return None
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    Splits paper text into (title, body) sections. Everything before the first heading is
+    returned as a 'front matter' section (title, authors and usually the abstract).
+    """
+    sections = []
+    title, body = "front matter", []
+    for line in text.splitlines():
+        match = HEADING_PATTERN.match(line)
+        is_numbered = bool(re.match(r"^\s*(\d+(\.\d+)*\.?|[IVX]+\.)\s+", line))
+        if match and (_section_key(match.group("title")) or (is_numbered and len(line.split()) <= 8)):
+            sections.append((title, "\n".join(body)))
+            title, body = match.group("title").strip(), []
+        else:
+            body.append(line)
+    sections.append((title, "\n".join(body)))
+    return [(t, b) for t, b in sections if b.strip()]
+
+
+def question_keywords(system_prompt: str) -> Set[str]:
+    """
+    Collects the content words of the questions asked by an agent's system prompt, together
+    with the line that follows each question (where the prompts explain what to look for).
+    """
+    lines = system_prompt.splitlines()
+    questions = []
+    for i, line in enumerate(lines):
+        if "?" in line:
+            questions.extend(lines[i:i + 2])
+    words = re.findall(r"[A-Za-z][A-Za-z\-]{3,}", " ".join(questions))
+    return {word.lower() for word in words if word.lower() not in STOPWORDS}
+
+
+def _score_section(title: str, body: str, keywords: Set[str]) -> float:
+    lowered_title = title.lower()
+    prior = 1.0
+    for name, weight in SECTION_PRIORS.items():
+        if name in lowered_title:
+            prior = max(prior, weight)
+    if any(name in lowered_title for name in DOWNWEIGHTED_SECTIONS):
+        prior = 0.3
+    words = re.findall(r"[a-z][a-z\-]{3,}", body.lower())
+    density = sum(word in keywords for word in words) / max(len(words), 1)
+    return prior * (1.0 + 50.0 * density)
+
+
+def compress_paper(pages: List[str], system_prompt: str, token_budget: Optional[int] = None, paper_name: str = "") -> str:
+    """
+    Builds the paper content for a prompt: strips headers and footers, drops the bibliography
+    and acknowledgements, and packs the remaining sections into `token_budget` tokens,
+    prioritising the sections that best match the questions in `system_prompt`.
+    The budget comes from PAPER_TOKEN_BUDGET when not given; 0 disables compression.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("PAPER_TOKEN_BUDGET", "24000"))
+    raw_text = "".join(pages)
+    if token_budget <= 0:
+        return raw_text
+
+    tokens_before = count_tokens(raw_text)
+    sections = [
+        (title, body)
+        for title, body in split_sections("\n".join(strip_repeated_lines(pages)))
+        if not any(name in title.lower() for name in DROPPED_SECTIONS)
+    ]
+    keywords = question_keywords(system_prompt)
+    # The front matter carries the title, authors and abstract, so it is always packed first.
+    ranked = sorted(
+        range(len(sections)),
+        key=lambda i: (sections[i][0] != "front matter", -_score_section(*sections[i], keywords)),
+    )
+
+    remaining = token_budget
+    packed = {}
+    for i in ranked:
+        title, body = sections[i]
+        text = body if title == "front matter" else f"{title}\n{body}"
+        tokens = count_tokens(text)
+        if tokens <= remaining:
+            packed[i] = text
+            remaining -= tokens
+        elif remaining > 200:
+            # Keep the beginning of the section, which usually states its main point.
+            marker = "\n[...]"
+            packed[i] = truncate_tokens(text, remaining - count_tokens(marker)).rsplit("\n", 1)[0] + marker
+            remaining -= count_tokens(packed[i])
+        if remaining <= 200:
+            break
+
+    compressed = "\n\n".join(packed[i] for i in sorted(packed))
+    tokens_after = count_tokens(compressed)
+    logging.info(
+        f"Compressed paper {paper_name}: {tokens_before} -> {tokens_after} tokens "
+        f"({100 * (1 - tokens_after / max(tokens_before, 1)):.0f}% reduction, {len(packed)}/{len(sections)} sections)"
+    )
+    return compressed
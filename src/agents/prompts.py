@@ -31,11 +31,11 @@ After processing the whole paper and extracting its summarized content, you will
 
     output a JSON object structured as follows:
     {
-    "Is it correlated with the research directly?": "Yes", "Partially", "Slightly", "No",
-    "Is the method well-explained and reproducible?": "Yes", "Partially", "Slightly", "No",
-    "Does it compare against strong, state-of-the-art baselines?: "Yes", "Partially", "Slightly", "No",
-    "Does it use relevant techniques?": "Yes", "Partially", "Slightly", "No",
-    "Is the paper close to recent state-of-the-art?": "Yes", "Partially", "Slightly", "No",
+    "Is it correlated with the research directly?": "Yes" | "Partially" | "Slightly" | "No",
+    "Is the method well-explained and reproducible?": "Yes" | "Partially" | "Slightly" | "No",
+    "Does it compare against strong, state-of-the-art baselines?": "Yes" | "Partially" | "Slightly" | "No",
+    "Does it use relevant techniques?": "Yes" | "Partially" | "Slightly" | "No",
+    "Is the paper close to recent state-of-the-art?": "Yes" | "Partially" | "Slightly" | "No"
     }
 </Task>
 <Guidelines>
@@ -54,6 +54,10 @@ After processing the whole paper and extracting its summarized content, you will
 [The full text content of the scientific paper to be analyzed]
 </InputFormat>
 <OutputFormat>
+A JSON object with two keys:
+- "analysis": the markdown analysis below, as a single string.
+- "question_answering": the JSON object with the answers to the five questions.
+
 ## Paper content analysis
 [Reasoning over the content of the paper]
 
@@ -92,15 +96,6 @@ After processing the whole paper and extracting its summarized content, you will
 ---
 ## Keywords
 [Listing the keywords related to the content]
-
-## Question Answering
-{
-    "Is it correlated with the research directly?": "Yes", "Partially", "Slightly", "No",
-    "Is the method well-explained and reproducible?": "Yes", "Partially", "Slightly", "No",
-    "Does it compare against strong, state-of-the-art baselines?: "Yes", "Partially", "Slightly", "No",
-    "Does it use relevant techniques?": "Yes", "Partially", "Slightly", "No",
-    "Is the paper close to recent state-of-the-art?": "Yes", "Partially", "Slightly", "No",
-}
 </OutputFormat>
 
 """)
@@ -124,7 +119,7 @@ article and extract specific knowledge points by answering a set of predefined q
     - If Diffusion Models are used, which specific Diffusion architecture is employed? Ex: DDPM, Latent Diffusion, Stable Diffusion, etc.
     - Which datasets are used in the paper for training and evaluation?
 
-    If you cannot find the answer to any of the questions in the paper, respond with "null" for string answers, ]
+    If you cannot find the answer to any of the questions in the paper, respond with "null" for string answers,
     an empty list for list answers, and "No" for boolean answers.
     After answering the questions, provide a concise explanation for each answer.
 
@@ -205,6 +200,25 @@ article and extract specific knowledge points by answering a set of predefined q
 
 """)
 
+# Answer kinds of the questionnaires above, used to build the response schemas.
+ANALYZER_GRADES = ("Yes", "Partially", "Slightly", "No")
+ANALYZER_QUESTIONS = {
+    "Is it correlated with the research directly?": "grade",
+    "Is the method well-explained and reproducible?": "grade",
+    "Does it compare against strong, state-of-the-art baselines?": "grade",
+    "Does it use relevant techniques?": "grade",
+    "Is the paper close to recent state-of-the-art?": "grade",
+}
+EXTRACTOR_QUESTIONS = {
+    "Uses Landmarks?": "bool",
+    "Uses Action Units?": "bool",
+    "Uses GANs?": "bool",
+    "Uses Diffusion?": "bool",
+    "Specific GAN": "string | null",
+    "Specific Diffusion": "string | null",
+    "Datasets used": "string[]",
+}
+
 ANALYZER_PROMPT = dedent("""
 # PAPER METADATA:
 {paper_metadata}
@@ -217,6 +231,20 @@ EXTRACTOR_PROMPT = dedent("""
 {paper_content}
 """)
 
+REASK_SYSTEM_PROMPT = dedent(
+"""
+You complete a partially answered questionnaire about a scientific paper.
+Answer only the requested fields, based only on the provided context, and output a JSON object
+with exactly those keys.
+""")
+
+REASK_PROMPT = dedent("""
+# FIELDS:
+{fields}
+# CONTEXT:
+{context}
+""")
+
 CONVERSATIONAL_SYSTEM_PROMPT = "You are a helpful research assistant that answers questions based on provided academic documents."
 CONVERSATIONAL_PROMPT = dedent(
 """
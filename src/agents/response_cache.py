@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+GENERATION_PARAMS = ("temperature", "top_p", "max_tokens", "max_completion_tokens", "reasoning_effort", "seed", "response_format")
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def generation_params(model: Any) -> Dict[str, Any]:
+    """
+    Collects the generation parameters of an agno model that affect its output.
+    """
+    params = {}
+    for name in GENERATION_PARAMS:
+        value = getattr(model, name, None)
+        if value is not None:
+            params[name] = value if isinstance(value, (str, int, float, bool, dict, list)) else repr(value)
+    return params
+
+
+class ResponseCache():
+    """
+    Disk-backed cache of LLM responses, keyed on the model id, the system prompt hash, the
+    rendered message hash and the generation parameters. Entries beyond `max_entries` are
+    evicted least recently used first. Set LLM_CACHE_BYPASS=1 (or bypass=True) to always
+    call the model; fresh responses are still stored.
+    """
+    def __init__(self, cache_path: Optional[str] = None, max_entries: Optional[int] = None, bypass: Optional[bool] = None):
+        self.cache_path = cache_path or os.getenv("LLM_CACHE_PATH", "llm_response_cache.sqlite")
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+        self.bypass = bypass if bypass is not None else os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(self.cache_path):
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.conn.commit()
+
+    def make_key(self, model_id: str, system_prompt: str, message: str, params: Optional[Dict[str, Any]] = None) -> str:
+        return sha256(json.dumps(
+            {"model": model_id, "system": sha256(system_prompt), "message": sha256(message), "params": params or {}},
+            sort_keys=True,
+        ))
+
+    def get(self, model_id: str, system_prompt: str, message: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Returns the cached response, or None on a miss or when the cache is bypassed.
+        """
+        if self.bypass:
+            self.misses += 1
+            return None
+        key = self.make_key(model_id, system_prompt, message, params)
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+        return row[0]
+
+    def set(self, model_id: str, system_prompt: str, message: str, response: str, params: Optional[Dict[str, Any]] = None):
+        key = self.make_key(model_id, system_prompt, message, params)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, model_id, response, now, now)
+            )
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bypass": self.bypass,
+        }
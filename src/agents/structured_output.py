@@ -0,0 +1,294 @@
+"""
+Typed answers for the analyzer and extractor questionnaires.
+
+The questions and their answer kinds live in prompts.py; this module turns them into
+pydantic models (sent to the model as a strict JSON schema), parses model output tolerantly
+(code fences, prose around the object, trailing commas, single quotes, Python literals,
+truncated output) and coerces each answer to its type, reporting the fields that are still
+missing or invalid so that only those are asked again.
+"""
+import re
+import json
+import difflib
+import hashlib
+import logging
+from typing import Any, Dict, List, Literal, Optional, Tuple, Type
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, create_model
+
+from src.agents.prompts import ANALYZER_GRADES, ANALYZER_QUESTIONS, EXTRACTOR_QUESTIONS, REASK_PROMPT
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ANSWER_TYPES = {
+    "grade": Literal[ANALYZER_GRADES],
+    "bool": bool,
+    "string | null": Optional[str],
+    "string[]": List[str],
+}
+NULL_STRINGS = {"", "null", "none", "n/a", "na", "not applicable", "not mentioned", "unknown"}
+TRUE_STRINGS = {"yes", "true", "y", "1"}
+FALSE_STRINGS = {"no", "false", "n", "0"}
+# A leading yes/no answer followed by an explanation ("No, the paper...").
+LEADING_BOOL = re.compile(r"(yes|no|true|false)\b")
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+_adapters = {kind: TypeAdapter(annotation) for kind, annotation in ANSWER_TYPES.items()}
+
+
+def answers_model(name: str, questions: Dict[str, str], explained: bool = False) -> Type[BaseModel]:
+    """
+    Builds a pydantic model with one field per question (aliased by the question text). With
+    `explained`, every field is an {"answer": ..., "explanation": ...} object.
+    """
+    fields = {}
+    for i, (question, kind) in enumerate(questions.items()):
+        annotation = ANSWER_TYPES[kind]
+        if explained:
+            annotation = create_model(
+                f"{name}Answer{i}",
+                __config__=ConfigDict(extra="forbid"),
+                answer=(annotation, ...),
+                explanation=(str, ...),
+            )
+        fields[f"answer_{i}"] = (annotation, Field(alias=question))
+    return create_model(name, __config__=ConfigDict(populate_by_name=True, extra="forbid"), **fields)
+
+
+QuestionAnswering = answers_model("QuestionAnswering", ANALYZER_QUESTIONS)
+Extraction = answers_model("Extraction", EXTRACTOR_QUESTIONS, explained=True)
+AnalyzerOutput = create_model(
+    "AnalyzerOutput",
+    __config__=ConfigDict(extra="forbid"),
+    analysis=(str, ...),
+    question_answering=(QuestionAnswering, ...),
+)
+
+
+def schema_fingerprint(model: Type[BaseModel]) -> str:
+    """
+    Short hash of a model's JSON schema, so that cached responses follow schema changes.
+    """
+    return hashlib.sha256(json.dumps(model.model_json_schema(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def response_text(content: Any) -> str:
+    """
+    Serializes a run response's content (a parsed model, or the raw text when the output did
+    not validate) back to the JSON text stored in the response cache.
+    """
+    if isinstance(content, BaseModel):
+        return content.model_dump_json(by_alias=True)
+    return content or ""
+
+
+def _repair(text: str) -> str:
+    """
+    Rewrites the first JSON-like object in `text` as strict JSON: converts single-quoted
+    strings and Python literals, escapes raw newlines in strings, drops trailing commas and
+    closes whatever a truncated output left open.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in the model output")
+    out: List[str] = []
+    closers: List[str] = []
+    quote = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\" and i + 1 < len(text):
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                i += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+        elif char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            _strip_trailing(out, ",")
+            out.append(closers.pop() if closers else char)
+            if not closers:
+                break
+        elif char.isalpha():
+            word = re.match(r"\w+", text[i:]).group()
+            if word in ("true", "false", "null"):
+                out.append(word)
+            else:
+                # Python literals, or bare words left unquoted by the model.
+                out.append(PYTHON_LITERALS.get(word, json.dumps(word)))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if quote:
+        out.append('"')
+    if closers:
+        # Truncated output: drop a dangling separator or key and close the open containers.
+        _strip_trailing(out, ",")
+        if "".join(out).rstrip().endswith(":"):
+            repaired = re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*$', "", "".join(out))
+            out = [repaired]
+        out.extend(reversed(closers))
+    return "".join(out)
+
+
+def _strip_trailing(out: List[str], separator: str):
+    while out and not out[-1].strip():
+        out.pop()
+    if out and out[-1] == separator:
+        out.pop()
+
+
+def parse_json(text: str) -> Any:
+    """
+    Parses model output as JSON, repairing it locally when it is not valid as is.
+    Raises ValueError when no JSON object can be recovered.
+    """
+    text = text.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    return json.loads(_repair(text.translate(SMART_QUOTES)), strict=False)
+
+
+def _normalize_key(key: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", str(key).lower())
+
+
+def _lookup(data: Dict[str, Any], question: str) -> Tuple[bool, Any]:
+    """
+    Finds the value of a question in a parsed object, tolerating reworded or re-cased keys.
+    """
+    if question in data:
+        return True, data[question]
+    keys = {_normalize_key(key): key for key in data}
+    matches = difflib.get_close_matches(_normalize_key(question), list(keys), n=1, cutoff=0.8)
+    if matches:
+        return True, data[keys[matches[0]]]
+    return False, None
+
+
+def coerce(value: Any, kind: str) -> Any:
+    """
+    Converts common near-misses (e.g. "yes" for True, "N/A" for null, a comma separated
+    string for a list) to the answer type of `kind`. Answers are recognized by their first
+    whole word, so "None of the above" or "Noticeably" are not taken for "No". Raises
+    ValueError when it cannot, which makes the question missing and re-asked.
+    """
+    if kind == "grade":
+        if isinstance(value, bool):
+            value = "Yes" if value else "No"
+        elif isinstance(value, str):
+            word = re.match(r"[a-z]*", value.strip().lower()).group(0)
+            for grade in ANALYZER_GRADES:
+                # A shortened grade ("partial", "slight") is accepted when it is at least five letters long.
+                if word == grade.lower() or (len(word) >= 5 and grade.lower().startswith(word)):
+                    value = grade
+                    break
+    elif kind == "bool":
+        if isinstance(value, str):
+            text = value.strip().lower().rstrip(".")
+            leading = LEADING_BOOL.match(text)
+            if text in TRUE_STRINGS or (leading and leading.group(1) in ("yes", "true")):
+                value = True
+            elif text in FALSE_STRINGS or (leading and leading.group(1) in ("no", "false")):
+                value = False
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = bool(value)
+    elif kind == "string | null":
+        if isinstance(value, str) and value.strip().lower().rstrip(".") in NULL_STRINGS:
+            value = None
+        elif isinstance(value, list):
+            value = ", ".join(str(item) for item in value) if value else None
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+    elif kind == "string[]":
+        if value is None or (isinstance(value, str) and value.strip().lower() in NULL_STRINGS):
+            value = []
+        elif isinstance(value, str):
+            value = [item.strip() for item in re.split(r"[,;]", value) if item.strip()]
+        elif isinstance(value, list):
+            value = [str(item) for item in value if item is not None]
+    try:
+        return _adapters[kind].validate_python(value)
+    except ValidationError as e:
+        raise ValueError(f"Invalid {kind} answer {value!r}") from e
+
+
+def match_answers(data: Any, questions: Dict[str, str], explained: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Validates parsed output question by question. Returns the valid answers, keyed by the
+    question text, and the questions that are missing or could not be coerced.
+    """
+    answers, missing = {}, []
+    if not isinstance(data, dict):
+        return answers, list(questions)
+    for question, kind in questions.items():
+        found, value = _lookup(data, question)
+        if not found:
+            missing.append(question)
+            continue
+        explanation = ""
+        if explained:
+            if isinstance(value, dict):
+                explanation = str(value.get("explanation") or "")
+                value = value.get("answer")
+        try:
+            value = coerce(value, kind)
+        except ValueError:
+            missing.append(question)
+            continue
+        answers[question] = {"answer": value, "explanation": explanation} if explained else value
+    return answers, missing
+
+
+def parse_answers(text: str, questions: Dict[str, str], explained: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Parses and validates a JSON answer object; unparseable output leaves every question missing.
+    """
+    try:
+        data = parse_json(text)
+    except ValueError:
+        data = None
+    return match_answers(data, questions, explained)
+
+
+def default_answer(kind: str) -> Any:
+    """
+    The answer the extractor prompt prescribes when a question cannot be answered.
+    """
+    return {"bool": False, "string | null": None, "string[]": []}[kind]
+
+
+def reask_message(questions: Dict[str, str], missing: List[str], context: str, explained: bool = False) -> str:
+    """
+    Renders a short prompt asking only for the missing fields.
+    """
+    fields = []
+    for question in missing:
+        kind = " | ".join(f'"{grade}"' for grade in ANALYZER_GRADES) if questions[question] == "grade" else questions[question]
+        fields.append(f'- "{question}": ' + (f'{{"answer": {kind}, "explanation": string}}' if explained else kind))
+    return REASK_PROMPT.format(fields="\n".join(fields), context=context)
@@ -0,0 +1,258 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.data.metadata_filters import matches
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+# Bumped when `tokenize` changes, so that existing indexes are re-tokenized on open.
+TOKENIZER_VERSION = "2"
+
+# English function words. They occur in nearly every chunk, so they add almost nothing to the
+# BM25 scores while making up most of the postings a query has to read.
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers herself him himself his how i if in into is it it's its
+itself just me more most my myself no nor not of off on once only or other our ours ourselves
+out over own same she should so some such than that that's the their theirs them themselves
+then there these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index():
+    """
+    On-disk BM25 inverted index over the same chunks stored in Qdrant, keyed by point id.
+    Answers keyword queries (dataset or architecture names, for instance) without any
+    embedding call. Like the 'sources' payload of the points, each chunk lists the documents
+    that contain it, which can be more than its own when near-duplicates are stored once.
+    """
+    def __init__(self, index_path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.index_path = index_path or os.getenv("BM25_INDEX_PATH", "bm25_index.sqlite")
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        if os.path.dirname(self.index_path):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        has_sources = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sources'").fetchone()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                content TEXT NOT NULL,
+                meta_data TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id);
+            CREATE TABLE IF NOT EXISTS sources (
+                chunk_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (name, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS sources_chunk_id ON sources (chunk_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        if not has_sources:
+            # Indexes built before back-references only know each chunk's own document.
+            self.conn.execute("INSERT OR IGNORE INTO sources SELECT id, name FROM chunks WHERE name IS NOT NULL")
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'tokenizer_version'").fetchone()
+        if version is None or version[0] != TOKENIZER_VERSION:
+            self._retokenize()
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('tokenizer_version', ?)", (TOKENIZER_VERSION,))
+        self.conn.commit()
+        self._refresh_stats()
+
+    def _retokenize(self):
+        """
+        Rebuilds the postings and chunk lengths from the stored chunk contents.
+        """
+        self.conn.execute("DELETE FROM postings")
+        rows = self.conn.execute("SELECT id, content FROM chunks").fetchall()
+        if rows:
+            logging.info(f"Re-tokenizing {len(rows)} chunks of the BM25 index at {self.index_path}")
+        for chunk_id, content in rows:
+            terms = Counter(tokenize(content))
+            self.conn.execute("UPDATE chunks SET length = ? WHERE id = ?", (sum(terms.values()), chunk_id))
+            self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(term, chunk_id, tf) for term, tf in terms.items()])
+
+    def _refresh_stats(self):
+        count, total_length = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+        self.num_chunks = count
+        self.avg_length = total_length / count if count else 0.0
+
+    def __len__(self) -> int:
+        return self.num_chunks
+
+    def _delete(self, chunk_ids: List[str], sources: bool = True):
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            self.conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self.conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            if sources:
+                self.conn.execute(f"DELETE FROM sources WHERE chunk_id IN ({placeholders})", batch)
+
+    def ids(self) -> Set[str]:
+        """
+        Returns the id of every indexed chunk, including chunks only known by a back-reference.
+        """
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT id FROM chunks UNION SELECT chunk_id FROM sources")}
+
+    def add(self, chunks: Iterable[Dict[str, Any]], keep_sources: bool = True):
+        """
+        Indexes chunks given as dictionaries with 'id', 'name', 'content', 'meta_data' and
+        optionally 'sources' (default: [name]), replacing any previous version of the same ids.
+        Back-references may be recorded before the chunk itself is indexed, so the sources
+        already listed are kept, unless `keep_sources` is False.
+        """
+        chunks = list(chunks)
+        with self.lock:
+            self._delete([str(chunk["id"]) for chunk in chunks], sources=not keep_sources)
+            for chunk in chunks:
+                terms = Counter(tokenize(chunk["content"]))
+                self.conn.execute(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+                    (str(chunk["id"]), chunk.get("name"), chunk["content"], json.dumps(chunk.get("meta_data") or {}, default=str), sum(terms.values())),
+                )
+                self.conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)", [(term, str(chunk["id"]), tf) for term, tf in terms.items()]
+                )
+                sources = chunk.get("sources") or [chunk.get("name")]
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO sources VALUES (?, ?)", [(str(chunk["id"]), source) for source in sources if source]
+                )
+            self.conn.commit()
+            self._refresh_stats()
+
+    def add_sources(self, chunk_ids: Iterable[str], name: str):
+        """
+        Lists a document among the sources of chunks it shares with other documents.
+        """
+        with self.lock:
+            self.conn.executemany("INSERT OR IGNORE INTO sources VALUES (?, ?)", [(str(chunk_id), name) for chunk_id in set(chunk_ids)])
+            self.conn.commit()
+
+    def remove_sources(self, chunk_ids: Iterable[str], name: str):
+        with self.lock:
+            self.conn.executemany("DELETE FROM sources WHERE chunk_id = ? AND name = ?", [(str(chunk_id), name) for chunk_id in set(chunk_ids)])
+            self.conn.commit()
+
+    def delete(self, chunk_ids: Iterable[str]):
+        with self.lock:
+            self._delete([str(chunk_id) for chunk_id in chunk_ids])
+            self.conn.commit()
+            self._refresh_stats()
+
+    def search(self, query: str, limit: int = 10, filters: Optional[Dict[str, Any]] = None, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the best BM25 matches as dictionaries with id, name, content, meta_data and score.
+        `filters` are meta_data conditions, with the semantics of `metadata_filters.to_qdrant_filter`;
+        `names` restricts the search to the chunks those documents contain, their own or shared.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.num_chunks:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        with self.lock:
+            allowed = None
+            if names is not None:
+                names, allowed = list(set(names)), set()
+                for i in range(0, len(names), 500):
+                    batch = names[i:i + 500]
+                    allowed.update(row[0] for row in self.conn.execute(
+                        f"SELECT chunk_id FROM sources WHERE name IN ({','.join('?' * len(batch))})", batch
+                    ))
+            for term in terms:
+                rows = self.conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                # The document frequency is counted over the whole index, so scores do not
+                # depend on the restriction to `names`.
+                idf = math.log(1 + (self.num_chunks - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+
+            results = []
+            for chunk_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                name, content, meta_data = self.conn.execute(
+                    "SELECT name, content, meta_data FROM chunks WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                meta_data = json.loads(meta_data)
+                if not matches(meta_data, filters):
+                    continue
+                results.append({"id": chunk_id, "name": name, "content": content, "meta_data": meta_data, "score": score})
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def build_from_collection(vector_db: Any, index: Optional[BM25Index] = None, batch_size: int = 256) -> BM25Index:
+    """
+    Builds (or refreshes) the BM25 index from every point already stored in a Qdrant collection.
+    The collection is authoritative: chunks it no longer holds are removed from the index, and
+    the sources of the others are replaced by those of their payload.
+    """
+    index = index if index is not None else BM25Index()
+    stale = index.ids()
+    offset = None
+    total = 0
+    while True:
+        points, offset = vector_db.client.scroll(
+            collection_name=vector_db.collection, limit=batch_size, offset=offset, with_payload=True, with_vectors=False
+        )
+        index.add((
+            {
+                "id": point.id,
+                "name": point.payload.get("name"),
+                "content": point.payload.get("content", ""),
+                "meta_data": point.payload.get("meta_data"),
+                "sources": point.payload.get("sources"),
+            }
+            for point in points
+            if point.payload
+        ), keep_sources=False)
+        stale.difference_update(str(point.id) for point in points)
+        total += len(points)
+        if offset is None:
+            break
+    if stale:
+        index.delete(stale)
+    logging.info(f"Built BM25 index with {total} chunks from collection '{vector_db.collection}', removed {len(stale)} stale chunks")
+    return index
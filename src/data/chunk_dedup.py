@@ -0,0 +1,279 @@
+"""
+Near-duplicate chunk detection at ingest: MinHash signatures of word shingles, and an LSH
+index over the signatures of every chunk already stored, persisted in SQLite.
+
+    python -m src.data.chunk_dedup             # index the chunks already in the collection
+"""
+import os
+import re
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """
+    Word n-grams of a text, lowercased and without punctuation.
+    """
+    words = WORD_PATTERN.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Splits the signature into bands of rows. Two chunks become candidates with a probability
+    that rises steeply around (1 / bands) ** (1 / rows); the split whose midpoint is the
+    highest one at or below the threshold is used, since candidates are verified anyway.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold] or splits[:1]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+
+class MinHasher():
+    """
+    MinHash over word shingles with `num_perm` universal hash permutations of 32-bit shingle hashes.
+    """
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles(text, self.shingle_size)],
+            dtype=np.uint64,
+        )
+        permuted = ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class ChunkDeduplicator():
+    """
+    LSH index of the chunks stored in the collection, keyed by point id. A new chunk whose
+    estimated Jaccard similarity with a stored one reaches the threshold is a duplicate of it:
+    it is not embedded, and the stored point takes it as a back-reference instead.
+    The threshold defaults to INGEST_DEDUP_THRESHOLD.
+
+    A chunk claimed by an ingest stays unconfirmed until its point is upserted (`confirm`) or
+    the upsert fails (`remove`); `wait_for` lets the documents that duplicate it wait for
+    either. Unconfirmed claims left by an interrupted ingest are dropped on open, so only one
+    ingest should use the index at a time.
+    """
+    def __init__(self, index_path: Optional[str] = None, threshold: Optional[float] = None, num_perm: int = 128, shingle_size: int = 5):
+        self.index_path = index_path or os.getenv("INGEST_DEDUP_PATH", "chunk_dedup.sqlite")
+        self.threshold = threshold if threshold is not None else float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8"))
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = lsh_bands(num_perm, self.threshold)
+        self.lock = threading.Lock()
+        self.confirmed = threading.Condition(self.lock)
+        if os.path.dirname(self.index_path):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                point_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                confirmed INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket BLOB NOT NULL,
+                point_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_band_bucket ON buckets (band, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_point_id ON buckets (point_id);
+            """
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(signatures)")}
+        if "confirmed" not in columns:
+            self.conn.execute("ALTER TABLE signatures ADD COLUMN confirmed INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("DELETE FROM buckets WHERE point_id IN (SELECT point_id FROM signatures WHERE confirmed = 0)")
+        self.conn.execute("DELETE FROM signatures WHERE confirmed = 0")
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _find(self, signature: np.ndarray) -> Optional[str]:
+        candidates = set()
+        for band, bucket in self._band_keys(signature):
+            candidates.update(row[0] for row in self.conn.execute(
+                "SELECT point_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+            ))
+        best, best_similarity = None, self.threshold
+        for point_id in candidates:
+            stored = np.frombuffer(self.conn.execute("SELECT signature FROM signatures WHERE point_id = ?", (point_id,)).fetchone()[0], dtype=np.uint32)
+            similarity = float(np.mean(stored == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = point_id, similarity
+        return best
+
+    def _add(self, point_id: str, signature: np.ndarray, confirmed: bool):
+        self.conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)", (point_id, signature.tobytes(), int(confirmed)))
+        self.conn.executemany("INSERT INTO buckets VALUES (?, ?, ?)", [(band, bucket, point_id) for band, bucket in self._band_keys(signature)])
+
+    def claim(self, point_ids: List[str], contents: List[str], confirmed: bool = False) -> List[Optional[str]]:
+        """
+        Returns, for each chunk, the id of the stored chunk it duplicates, or None when it is
+        new. New chunks are registered right away, so later chunks of the same or of a
+        concurrent document match them; `confirm` them once stored, or `remove` them if they
+        end up not being stored. Chunks already in the collection are claimed as `confirmed`.
+        """
+        signatures = [self.hasher.signature(content) for content in contents]
+        canonical = []
+        with self.lock:
+            for point_id, signature in zip(point_ids, signatures):
+                if self.conn.execute("SELECT 1 FROM signatures WHERE point_id = ?", (point_id,)).fetchone():
+                    canonical.append(point_id)
+                    continue
+                match = self._find(signature)
+                if match is None:
+                    self._add(point_id, signature, confirmed)
+                canonical.append(match)
+            self.conn.commit()
+        return canonical
+
+    def confirm(self, point_ids: Iterable[str]):
+        """
+        Marks claimed chunks as stored in the collection.
+        """
+        point_ids = [str(point_id) for point_id in point_ids]
+        with self.lock:
+            for i in range(0, len(point_ids), 500):
+                batch = point_ids[i:i + 500]
+                self.conn.execute(f"UPDATE signatures SET confirmed = 1 WHERE point_id IN ({','.join('?' * len(batch))})", batch)
+            self.conn.commit()
+            self.confirmed.notify_all()
+
+    def remove(self, point_ids: Iterable[str]):
+        point_ids = [str(point_id) for point_id in point_ids]
+        with self.lock:
+            for i in range(0, len(point_ids), 500):
+                batch = point_ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                self.conn.execute(f"DELETE FROM buckets WHERE point_id IN ({placeholders})", batch)
+                self.conn.execute(f"DELETE FROM signatures WHERE point_id IN ({placeholders})", batch)
+            self.conn.commit()
+            self.confirmed.notify_all()
+
+    def wait_for(self, point_ids: Iterable[str], timeout: float = 600.0) -> Set[str]:
+        """
+        Waits until the claimed chunks are confirmed or removed, and returns the removed ones.
+        Raises TimeoutError when some are still unconfirmed after `timeout` seconds.
+        """
+        point_ids = [str(point_id) for point_id in point_ids]
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                states = {}
+                for i in range(0, len(point_ids), 500):
+                    batch = point_ids[i:i + 500]
+                    states.update(self.conn.execute(
+                        f"SELECT point_id, confirmed FROM signatures WHERE point_id IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall())
+                if all(states.values()):
+                    return set(point_ids) - set(states)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{sum(not state for state in states.values())} claimed chunks still not stored after {timeout:.0f}s")
+                self.confirmed.wait(remaining)
+
+
+# Qdrant cannot append to a payload list, so the read-modify-write of 'sources' is serialised.
+_sources_lock = threading.Lock()
+
+
+def add_sources(vector_db: Any, point_ids: Iterable[str], name: str) -> Set[str]:
+    """
+    Adds a document name to the back-references ('sources') of stored points. Returns the
+    ids that are not in the collection, whose back-references could not be recorded.
+    """
+    point_ids = list({str(point_id) for point_id in point_ids})
+    if not point_ids:
+        return set()
+    with _sources_lock:
+        points = vector_db.client.retrieve(vector_db.collection, ids=point_ids, with_payload=["name", "sources"])
+        for point in points:
+            sources = (point.payload or {}).get("sources") or [(point.payload or {}).get("name")]
+            if name not in sources:
+                vector_db.client.set_payload(vector_db.collection, payload={"sources": sources + [name]}, points=[point.id], wait=True)
+    found = {uuid.UUID(str(point.id)) for point in points}
+    return {point_id for point_id in point_ids if uuid.UUID(point_id) not in found}
+
+
+def remove_sources(vector_db: Any, point_ids: Iterable[str], name: str):
+    """
+    Drops a document name from the back-references of points other documents still use.
+    """
+    point_ids = list(set(point_ids))
+    if not point_ids:
+        return
+    with _sources_lock:
+        for point in vector_db.client.retrieve(vector_db.collection, ids=point_ids, with_payload=["sources"]):
+            sources = (point.payload or {}).get("sources") or []
+            if name in sources:
+                vector_db.client.set_payload(vector_db.collection, payload={"sources": [source for source in sources if source != name]}, points=[point.id], wait=True)
+
+
+def build_from_collection(vector_db: Any, deduplicator: Optional[ChunkDeduplicator] = None, batch_size: int = 256) -> Dict[str, int]:
+    """
+    Registers every point already stored in the collection, so that later ingests match
+    against them. Returns how many stored chunks are near-duplicates of earlier ones, i.e. the
+    embeddings and vectors that ingest-time deduplication would have saved.
+    """
+    deduplicator = deduplicator if deduplicator is not None else ChunkDeduplicator()
+    stats = {"chunks": 0, "duplicates": 0, "indexed": 0}
+    offset = None
+    while True:
+        points, offset = vector_db.client.scroll(
+            collection_name=vector_db.collection, limit=batch_size, offset=offset, with_payload=["content"], with_vectors=False
+        )
+        points = [point for point in points if point.payload and point.payload.get("content")]
+        canonical = deduplicator.claim([str(point.id) for point in points], [point.payload["content"] for point in points], confirmed=True)
+        stats["chunks"] += len(points)
+        stats["duplicates"] += sum(match is not None and match != str(point.id) for match, point in zip(canonical, points))
+        stats["indexed"] += sum(match is None for match in canonical)
+        if offset is None:
+            break
+    logging.info(f"Built chunk deduplication index from collection '{vector_db.collection}': {stats}")
+    return stats
+
+
+def main():
+    from src.data.vector_database import connect_vector_db
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--collection", default=None, help="Qdrant collection (default: QDRANT_COLLECTION)")
+    parser.add_argument("--index-path", default=None)
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+    build_from_collection(connect_vector_db(args.collection), ChunkDeduplicator(args.index_path, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Storage and index settings for the Qdrant collection. "default" keeps everything in RAM
+# with Qdrant's defaults; the others trade RAM for recall and latency, and the quantized
+# ones rescore the oversampled candidates with the original vectors read from disk.
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "quantization": None,
+        "on_disk": False,
+        "on_disk_payload": False,
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "search_ef": 128,
+    },
+    "on_disk": {
+        "quantization": None,
+        "on_disk": True,
+        "on_disk_payload": True,
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "search_ef": 128,
+    },
+    "scalar": {
+        "quantization": "scalar",
+        "on_disk": True,
+        "on_disk_payload": True,
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 200,
+        "search_ef": 128,
+        "rescore": True,
+        "oversampling": 2.0,
+    },
+    "binary": {
+        "quantization": "binary",
+        "on_disk": True,
+        "on_disk_payload": True,
+        "hnsw_m": 32,
+        "hnsw_ef_construct": 256,
+        "search_ef": 256,
+        "rescore": True,
+        "oversampling": 3.0,
+    },
+}
+
+
+# Zotero fields flattened into the chunk payloads (see zotero_integration.flatten_zotero_item),
+# indexed so that metadata filters are evaluated by Qdrant instead of by the LLM.
+PAYLOAD_INDEXES: Dict[str, models.PayloadSchemaType] = {
+    "meta_data.year": models.PayloadSchemaType.INTEGER,
+    "meta_data.creators": models.PayloadSchemaType.KEYWORD,
+    "meta_data.item_type": models.PayloadSchemaType.KEYWORD,
+    "meta_data.tags": models.PayloadSchemaType.KEYWORD,
+    "meta_data.collections": models.PayloadSchemaType.KEYWORD,
+    "meta_data.item_key": models.PayloadSchemaType.KEYWORD,
+    "name": models.PayloadSchemaType.KEYWORD,
+    "sources": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def get_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns a collection profile by name, defaulting to QDRANT_COLLECTION_PROFILE.
+    """
+    name = name or os.getenv("QDRANT_COLLECTION_PROFILE", "default")
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}', expected one of {list(COLLECTION_PROFILES)}")
+    return {"name": name, **COLLECTION_PROFILES[name]}
+
+
+def hnsw_config(profile: Dict[str, Any]) -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(m=profile["hnsw_m"], ef_construct=profile["hnsw_ef_construct"], on_disk=profile["on_disk"])
+
+
+def quantization_config(profile: Dict[str, Any]) -> Optional[models.QuantizationConfig]:
+    if profile["quantization"] == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile["quantization"] == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def search_params(profile: Dict[str, Any]) -> models.SearchParams:
+    """
+    Search-time parameters of a profile: HNSW ef and, for quantized profiles, rescoring.
+    """
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(
+            rescore=profile.get("rescore", True), oversampling=profile.get("oversampling")
+        )
+    return models.SearchParams(hnsw_ef=profile["search_ef"], quantization=quantization)
+
+
+def create_collection(client: QdrantClient, collection_name: str, vector_size: int, profile: Optional[Dict[str, Any]] = None):
+    """
+    Creates a cosine collection with unnamed vectors, the layout agno's Qdrant uses, tuned by a profile.
+    """
+    profile = profile or get_profile()
+    logging.info(f"Creating Qdrant collection '{collection_name}' with profile '{profile['name']}'")
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=profile["on_disk"]),
+        hnsw_config=hnsw_config(profile),
+        quantization_config=quantization_config(profile),
+        on_disk_payload=profile["on_disk_payload"],
+    )
+
+
+def create_payload_indexes(client: QdrantClient, collection_name: str):
+    """
+    Creates the payload indexes of PAYLOAD_INDEXES that the collection does not have yet.
+    """
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name not in existing:
+            logging.info(f"Creating payload index on '{field_name}' in '{collection_name}'")
+            client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema, wait=True)
+
+
+def migrate_collection(client: QdrantClient, collection_name: str, profile: Dict[str, Any], wait_ready: bool = True, timeout: float = 3600):
+    """
+    Applies a profile to an existing collection in place. Qdrant rebuilds the HNSW graph and
+    the quantized vectors in the background; with `wait_ready` this returns once the
+    collection is green again.
+    """
+    logging.info(f"Migrating Qdrant collection '{collection_name}' to profile '{profile['name']}'")
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile["on_disk"], hnsw_config=hnsw_config(profile))},
+        hnsw_config=hnsw_config(profile),
+        quantization_config=quantization_config(profile) or models.Disabled.DISABLED,
+        collection_params=models.CollectionParamsDiff(on_disk_payload=profile["on_disk_payload"]),
+    )
+    if wait_ready:
+        wait_until_ready(client, collection_name, timeout)
+
+
+def wait_until_ready(client: QdrantClient, collection_name: str, timeout: float = 3600, poll_interval: float = 1.0):
+    """
+    Waits until the collection finished optimizing and indexing.
+    """
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection '{collection_name}' was not ready after {timeout}s")
+        time.sleep(poll_interval)
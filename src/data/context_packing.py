@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.tracing import span
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def _shingles(words: List[str], size: int = 3) -> Set[str]:
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _count_tokens(text: str) -> int:
+    from src.agents.paper_compression import count_tokens
+
+    return count_tokens(text)
+
+
+class ContextPacker():
+    """
+    Post-processes over-fetched retrieval results into the context of a chat turn: drops
+    near-duplicate chunks, orders the rest by maximal marginal relevance (relevance minus
+    redundancy with what is already selected, where chunks of an already selected paper count
+    as partly redundant), packs them into a token budget, merges adjacent chunks of the same
+    page and numbers the sources for citation.
+    Settings default to CONTEXT_TOKEN_BUDGET, RETRIEVAL_CANDIDATES, MMR_LAMBDA and
+    DEDUP_THRESHOLD.
+    """
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        candidates: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup_threshold: Optional[float] = None,
+        paper_redundancy: float = 0.5,
+        count_fn: Callable[[str], int] = _count_tokens,
+    ):
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+        self.candidates = candidates or int(os.getenv("RETRIEVAL_CANDIDATES", "80"))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("MMR_LAMBDA", "0.7"))
+        self.dedup_threshold = dedup_threshold if dedup_threshold is not None else float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        self.paper_redundancy = paper_redundancy
+        self.count_fn = count_fn
+
+    def deduplicate(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keeps the best scored of every group of identical or near-identical chunks (Jaccard
+        similarity of word 3-shingles at or above the threshold). Results must be sorted by score.
+        """
+        kept, seen_hashes = [], set()
+        for result in results:
+            words = _words(result.get("content"))
+            digest = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+            if not words or digest in seen_hashes:
+                continue
+            shingles = _shingles(words)
+            if any(jaccard(shingles, other["_shingles"]) >= self.dedup_threshold for other in kept):
+                continue
+            seen_hashes.add(digest)
+            kept.append({**result, "_words": set(words), "_shingles": shingles})
+        return kept
+
+    def _similarity(self, a: Dict[str, Any], b: Dict[str, Any]) -> float:
+        similarity = jaccard(a["_words"], b["_words"])
+        if a.get("name") == b.get("name"):
+            similarity = max(similarity, self.paper_redundancy)
+        return similarity
+
+    def _render(self, result: Dict[str, Any], number: int = 0) -> Dict[str, Any]:
+        """
+        A chunk as the agent sees it: a numbered source with only the fields needed to cite it.
+        """
+        meta_data = result.get("meta_data") or {}
+        document = {"source": number, "title": result.get("name"), "year": meta_data.get("year"), "authors": meta_data.get("authors")}
+        if meta_data.get("page") is not None:
+            document["page"] = meta_data["page"]
+        document["content"] = result.get("content")
+        return document
+
+    def select(self, candidates: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Greedy MMR selection under the token budget. A chunk that does not fit in what is left
+        of the budget is skipped in favour of smaller ones.
+        """
+        if not candidates:
+            return []
+        scores = [candidate.get("score") or 0.0 for candidate in candidates]
+        low, high = min(scores), max(scores)
+        relevance = [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+        # Costs are counted on the rendering the agent sends (indented JSON).
+        costs = [self.count_fn(json.dumps(self._render(candidate), indent=2, ensure_ascii=False, default=str)) for candidate in candidates]
+        redundancy = [0.0] * len(candidates)
+        remaining = set(range(len(candidates)))
+        selected, budget = [], self.token_budget
+        while remaining and (limit is None or len(selected) < limit):
+            best = max(remaining, key=lambda i: (self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy[i], -i))
+            remaining.discard(best)
+            if costs[best] > budget:
+                continue
+            budget -= costs[best]
+            selected.append(candidates[best])
+            for i in remaining:
+                redundancy[i] = max(redundancy[i], self._similarity(candidates[i], candidates[best]))
+        return selected
+
+    def merge_adjacent(self, selected: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merges selected chunks that are consecutive on the same page of the same paper, in
+        reading order; the merged chunk takes the place of its best ranked member.
+        """
+        def position(result):
+            meta_data = result.get("meta_data") or {}
+            if meta_data.get("chunk") is None or meta_data.get("page") is None:
+                return None
+            return (str(result.get("name")), meta_data["page"], meta_data["chunk"])
+
+        run_of, previous = {}, None
+        for pos, rank in sorted((position(result), rank) for rank, result in enumerate(selected) if position(result) is not None):
+            adjacent = previous is not None and previous[0][:2] == pos[:2] and pos[2] - previous[0][2] == 1
+            run_of[rank] = run_of[previous[1]] if adjacent else rank
+            previous = (pos, rank)
+        runs: Dict[int, List[int]] = {}
+        for rank in range(len(selected)):
+            runs.setdefault(run_of.get(rank, rank), []).append(rank)
+
+        merged = []
+        for members in sorted(runs.values(), key=min):
+            if len(members) == 1:
+                merged.append(selected[members[0]])
+                continue
+            members.sort(key=lambda rank: position(selected[rank])[2])
+            best = selected[min(members)]
+            merged.append({
+                **best,
+                "content": "\n".join(selected[rank].get("content") or "" for rank in members),
+                "merged_chunks": [position(selected[rank])[2] for rank in members],
+            })
+        return merged
+
+    def cite(self, packed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Renders the packed chunks as numbered sources: only the fields the answer needs to cite
+        them, not the whole payload.
+        """
+        return [self._render(result, number) for number, result in enumerate(packed, start=1)]
+
+    def pack(self, results: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Turns retrieval results, sorted by score, into the cited context of a chat turn.
+        """
+        with span("context_pack", candidates=len(results), token_budget=self.token_budget) as s:
+            candidates = self.deduplicate(results)
+            packed = self.merge_adjacent(self.select(candidates, limit))
+            documents = self.cite(packed)
+            s.add(
+                items=len(documents),
+                duplicates=len(results) - len(candidates),
+                papers=len({document["title"] for document in documents}),
+                bytes=sum(len(document["content"] or "") for document in documents),
+            )
+        return documents
@@ -0,0 +1,353 @@
+"""
+Compiles the extractor and analyzer outputs and the Zotero metadata of every paper into one
+typed Parquet table, and answers filter and aggregate questions over it without the LLM.
+
+    python -m src.data.corpus_table            # incremental compile
+    python -m src.data.corpus_table --query '{"uses_diffusion": true}' --count-by datasets_used
+"""
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.agents.prompts import ANALYZER_QUESTIONS, EXTRACTOR_QUESTIONS
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CORPUS_TABLE_PATH = os.getenv("CORPUS_TABLE_PATH", "corpus_table.parquet")
+EXTRACTION_OUTPUTS_DIR = os.getenv("EXTRACTION_OUTPUTS_DIR", "extraction_outputs")
+ANALYSIS_OUTPUTS_DIR = os.getenv("ANALYSIS_OUTPUTS_DIR", "analysis_outputs")
+# Bumped when the columns change, so that existing tables are rebuilt.
+CORPUS_TABLE_VERSION = "1"
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+METADATA_COLUMNS = {
+    "title": "string",
+    "pdf_name": "string",
+    "item_key": "string",
+    "item_type": "string",
+    "year": "int",
+    "authors": "string",
+    "creators": "string[]",
+    "tags": "string[]",
+    "collections": "string[]",
+    "venue": "string",
+    "doi": "string",
+}
+# Columns with a value index; free text (title, authors, explanations) is only scanned.
+INDEXED_METADATA = ("item_type", "year", "creators", "tags", "collections", "venue")
+
+
+def column_name(question: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", question.lower()).strip("_")
+
+
+EXTRACTION_COLUMNS = {column_name(question): kind for question, kind in EXTRACTOR_QUESTIONS.items()}
+QA_COLUMNS = {column_name(question): kind for question, kind in ANALYZER_QUESTIONS.items()}
+ANSWER_COLUMNS = {**EXTRACTION_COLUMNS, **QA_COLUMNS}
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(), "string | null": pa.string(), "grade": pa.string(),
+        "int": pa.int32(), "bool": pa.bool_(), "string[]": pa.list_(pa.string()),
+    }
+    fields = [pa.field(name, types[kind]) for name, kind in METADATA_COLUMNS.items()]
+    for name, kind in EXTRACTION_COLUMNS.items():
+        fields += [pa.field(name, types[kind]), pa.field(f"{name}_explanation", pa.string())]
+    fields += [pa.field(name, types[kind]) for name, kind in QA_COLUMNS.items()]
+    fields += [
+        pa.field("has_extraction", pa.bool_()),
+        pa.field("has_analysis", pa.bool_()),
+        pa.field("source_signature", pa.string()),
+    ]
+    return pa.schema(fields, metadata={"corpus_table_version": CORPUS_TABLE_VERSION})
+
+
+def describe_fields() -> str:
+    """
+    One line per queryable field, for the conversational agent's instructions.
+    """
+    lines = [f"- {name} ({kind})" for name, kind in METADATA_COLUMNS.items()]
+    lines += [f"- {column_name(question)} ({kind}): {question}" for question, kind in EXTRACTOR_QUESTIONS.items()]
+    lines += [f"- {column_name(question)} (Yes/Partially/Slightly/No): {question}" for question in ANALYZER_QUESTIONS]
+    return "\n".join(lines)
+
+
+def _file_signature(filepath: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_json(filepath: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        if os.path.exists(filepath):
+            logging.warning(f"Could not read {filepath}: {e}")
+        return None
+
+
+def build_row(title: str, pdf_name: str, metadata: Dict[str, Any], extraction: Optional[Dict[str, Any]], qa: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Flattens the outputs of one paper into a table row. Missing answers stay null.
+    """
+    from src.agents.structured_output import match_answers
+
+    row = {name: metadata.get(name) for name in METADATA_COLUMNS}
+    row.update(title=title, pdf_name=pdf_name)
+    for name in ("creators", "tags", "collections"):
+        row[name] = list(row[name] or [])
+    extracted, _ = match_answers(extraction, EXTRACTOR_QUESTIONS, explained=True)
+    for question in EXTRACTOR_QUESTIONS:
+        answer = extracted.get(question)
+        row[column_name(question)] = answer["answer"] if answer else None
+        row[f"{column_name(question)}_explanation"] = answer["explanation"] if answer else None
+    answered, _ = match_answers(qa, ANALYZER_QUESTIONS)
+    for question in ANALYZER_QUESTIONS:
+        row[column_name(question)] = answered.get(question)
+    row["has_extraction"] = extraction is not None
+    row["has_analysis"] = qa is not None
+    return row
+
+
+def compile_corpus(table_path: Optional[str] = None, extraction_dir: Optional[str] = None, analysis_dir: Optional[str] = None, library=None, zotero_store=None, pdf_directory: Optional[str] = None) -> Dict[str, int]:
+    """
+    Incrementally (re)builds the corpus table, one row per PDF of the library folder. A paper's
+    row is rebuilt only when its extraction or QA file, or its Zotero item version, changed
+    since the last compile; rows of papers no longer in the library are dropped. The table is
+    replaced atomically.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.data.pdf_matcher import LIBRARY_CSV, library_pdfs, load_library
+    from src.data.zotero_integration import ZoteroStore, flatten_zotero_item
+
+    table_path = table_path or CORPUS_TABLE_PATH
+    extraction_dir = extraction_dir or EXTRACTION_OUTPUTS_DIR
+    analysis_dir = analysis_dir or ANALYSIS_OUTPUTS_DIR
+    library = library if library is not None else load_library(LIBRARY_CSV)
+    pdf_directory = pdf_directory if pdf_directory is not None else os.getenv("PDF_DIRECTORY", "")
+    zotero_store = zotero_store if zotero_store is not None else ZoteroStore()
+
+    existing = {}
+    if os.path.isfile(table_path):
+        table = pq.read_table(table_path)
+        if (table.schema.metadata or {}).get(b"corpus_table_version") == CORPUS_TABLE_VERSION.encode():
+            existing = {row["pdf_name"]: row for row in table.to_pylist()}
+
+    rows, stats = [], {"papers": 0, "rebuilt": 0, "reused": 0, "dropped": 0}
+    # The agents name their outputs after the resolved file name, and titles sharing a PDF
+    # share its outputs, so the rows are keyed on the resolved file.
+    for pdf in library_pdfs(library, pdf_directory):
+        stem = pdf['pdf_name'].replace('.pdf', '')
+        extraction_path = os.path.join(extraction_dir, f"{stem}_extraction.json")
+        qa_path = os.path.join(analysis_dir, f"{stem}_qa.json")
+        item = zotero_store.find_by_title(pdf['title'])
+        signature = json.dumps([_file_signature(extraction_path), _file_signature(qa_path), item.get('version') if item else None])
+        previous = existing.pop(pdf['pdf_name'], None)
+        if previous is not None and previous["source_signature"] == signature and previous["title"] == pdf['title']:
+            rows.append(previous)
+            stats["reused"] += 1
+            continue
+        row = build_row(pdf['title'], pdf['pdf_name'], flatten_zotero_item(item) if item else {}, _read_json(extraction_path), _read_json(qa_path))
+        row["source_signature"] = signature
+        rows.append(row)
+        stats["rebuilt"] += 1
+    stats["papers"] = len(rows)
+    stats["dropped"] = len(existing)
+
+    if stats["rebuilt"] or stats["dropped"] or not os.path.isfile(table_path):
+        if os.path.dirname(table_path):
+            os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        tmp_path = f"{table_path}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=arrow_schema()), tmp_path)
+        os.replace(tmp_path, table_path)
+    logging.info(f"Corpus table {table_path}: {stats}")
+    return stats
+
+
+class FieldIndex():
+    """
+    Value index of one column: lowercased value -> row positions (every element of a list
+    column is indexed), plus the sorted numeric values for range conditions.
+    """
+    def __init__(self, values: List[Any]):
+        self.postings: Dict[Any, Set[int]] = defaultdict(set)
+        self.labels: Dict[Any, Counter] = defaultdict(Counter)
+        numeric = []
+        for position, value in enumerate(values):
+            for element in (value if isinstance(value, list) else [value]):
+                if element is None:
+                    continue
+                key = self.key(element)
+                self.postings[key].add(position)
+                self.labels[key][element] += 1
+                if isinstance(element, (int, float)) and not isinstance(element, bool):
+                    numeric.append((element, position))
+        numeric.sort()
+        self.numeric_values = [value for value, _ in numeric]
+        self.numeric_positions = [position for _, position in numeric]
+
+    @staticmethod
+    def key(value: Any) -> Any:
+        return value.strip().lower() if isinstance(value, str) else value
+
+    def label(self, key: Any) -> Any:
+        """
+        The most common original spelling of an indexed value.
+        """
+        return self.labels[key].most_common(1)[0][0]
+
+    def lookup(self, values: List[Any]) -> Set[int]:
+        positions: Set[int] = set()
+        for value in values:
+            positions |= self.postings.get(self.key(value), set())
+        return positions
+
+    def range(self, bounds: Dict[str, Any]) -> Set[int]:
+        lo, hi = 0, len(self.numeric_values)
+        if "gte" in bounds:
+            lo = max(lo, bisect.bisect_left(self.numeric_values, bounds["gte"]))
+        if "gt" in bounds:
+            lo = max(lo, bisect.bisect_right(self.numeric_values, bounds["gt"]))
+        if "lte" in bounds:
+            hi = min(hi, bisect.bisect_right(self.numeric_values, bounds["lte"]))
+        if "lt" in bounds:
+            hi = min(hi, bisect.bisect_left(self.numeric_values, bounds["lt"]))
+        return set(self.numeric_positions[lo:hi])
+
+
+class CorpusTable():
+    """
+    In-memory view of the corpus table with an index per filterable field. The file is
+    reloaded when a compile replaces it.
+    """
+    def __init__(self, table_path: Optional[str] = None):
+        self.table_path = table_path or CORPUS_TABLE_PATH
+        self.lock = threading.Lock()
+        self.columns: Dict[str, List[Any]] = {}
+        self.indexes: Dict[str, FieldIndex] = {}
+        self.size = 0
+        self._signature = None
+
+    def _refresh(self):
+        import pyarrow.parquet as pq
+
+        signature = _file_signature(self.table_path)
+        if signature is None:
+            raise FileNotFoundError(f"Corpus table not found at {self.table_path}; run python -m src.data.corpus_table")
+        if signature == self._signature:
+            return
+        table = pq.read_table(self.table_path)
+        self.columns = {name: table.column(name).to_pylist() for name in table.column_names}
+        self.size = table.num_rows
+        self.indexes = {name: FieldIndex(self.columns[name]) for name in (*INDEXED_METADATA, *ANSWER_COLUMNS) if name in self.columns}
+        self._signature = signature
+        logging.info(f"Loaded corpus table with {self.size} papers")
+
+    def _positions(self, field: str, condition: Any) -> Set[int]:
+        if isinstance(condition, dict) and set(condition) == {"contains"}:
+            needle = str(condition["contains"]).lower()
+            return {
+                position for position, value in enumerate(self.columns[field])
+                if any(needle in str(element).lower() for element in (value if isinstance(value, list) else [value]) if element is not None)
+            }
+        if isinstance(condition, dict):
+            if not condition or not set(condition) <= set(RANGE_OPERATORS):
+                raise ValueError(
+                    f"Unsupported condition {json.dumps(condition, default=str)} on '{field}': expected a value, a list of "
+                    f"values, {{\"contains\": text}} or a range with {', '.join(RANGE_OPERATORS)}"
+                )
+        else:
+            values = condition if isinstance(condition, list) else [condition]
+            if any(isinstance(value, (dict, list)) for value in values):
+                raise ValueError(f"Unsupported condition {json.dumps(condition, default=str)} on '{field}': a list can only hold plain values")
+        # Fields without an index (free text such as the title) are indexed for this query only.
+        index = self.indexes.get(field) or FieldIndex(self.columns[field])
+        return index.range(condition) if isinstance(condition, dict) else index.lookup(values)
+
+    def query(self, where: Optional[Dict[str, Any]] = None, count_by: Optional[str] = None, list_papers: bool = False, limit: int = 20) -> Dict[str, Any]:
+        """
+        Filters papers and optionally counts the values of a field over them. Conditions are
+        ANDed: a value matches exactly (case-insensitive, any element of a list field), a list
+        matches any of its values, a dictionary of gt/gte/lt/lte is a range and
+        {"contains": text} is a substring match. A null value matches papers where the field is missing.
+        """
+        with self.lock:
+            self._refresh()
+            positions = set(range(self.size))
+            for field, condition in (where or {}).items():
+                if field not in self.columns:
+                    raise ValueError(f"Unknown field '{field}'")
+                if condition is None:
+                    positions &= {position for position, value in enumerate(self.columns[field]) if value is None or value == []}
+                else:
+                    positions &= self._positions(field, condition)
+            result: Dict[str, Any] = {"total_papers": self.size, "matching_papers": len(positions)}
+            if count_by:
+                if count_by not in self.columns:
+                    raise ValueError(f"Unknown field '{count_by}'")
+                index = self.indexes.get(count_by) or FieldIndex(self.columns[count_by])
+                counts = Counter()
+                for key, key_positions in index.postings.items():
+                    if key_positions & positions:
+                        counts[key] = len(key_positions & positions)
+                result["counts"] = [{"value": index.label(key), "papers": count} for key, count in counts.most_common(limit)]
+                result["distinct_values"] = len(counts)
+                result["papers_without_value"] = sum(1 for position in positions if self.columns[count_by][position] in (None, []))
+            if list_papers:
+                ordered = sorted(positions, key=lambda position: (-(self.columns["year"][position] or 0), self.columns["title"][position]))
+                result["papers"] = [
+                    {"title": self.columns["title"][position], "year": self.columns["year"][position], "authors": self.columns["authors"][position]}
+                    for position in ordered[:limit]
+                ]
+            return result
+
+
+_corpus_table = None
+
+
+def get_corpus_table() -> CorpusTable:
+    global _corpus_table
+    if _corpus_table is None:
+        _corpus_table = CorpusTable()
+    return _corpus_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", default=CORPUS_TABLE_PATH)
+    parser.add_argument("--query", default=None, help="JSON object of conditions; skips the compile")
+    parser.add_argument("--count-by", default=None)
+    parser.add_argument("--list-papers", action="store_true")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.query is None and args.count_by is None and not args.list_papers:
+        compile_corpus(args.table)
+        return
+    start = time.perf_counter()
+    result = CorpusTable(args.table).query(json.loads(args.query or "{}"), args.count_by, args.list_papers, args.limit)
+    result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    print(json.dumps(result, indent=4, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
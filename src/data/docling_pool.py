@@ -0,0 +1,396 @@
+"""
+Long-lived pool of docling worker processes.
+
+Each worker loads the docling models once and converts the PDFs it takes from a shared queue
+in page ranges. The number of pages converted per call adapts to an RSS ceiling: it grows
+while the worker stays well under the ceiling and is halved when it gets close, and a worker
+that ends a PDF above the ceiling is replaced by a fresh one.
+
+    python -m src.data.docling_pool --pdf-directory /path/to/pdfs --workers 2
+"""
+import os
+import gc
+import time
+import atexit
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DOCLING_WORKERS = int(os.getenv("DOCLING_WORKERS", "1"))
+DOCLING_RSS_CEILING_MB = int(os.getenv("DOCLING_RSS_CEILING_MB", "4096"))
+DOCLING_MAX_PAGE_BATCH = int(os.getenv("DOCLING_MAX_PAGE_BATCH", "8"))
+MAX_STARTUP_FAILURES = 3
+
+
+def current_rss_mb() -> float:
+    """
+    Resident set size of this process in MB, read from /proc where available and
+    otherwise approximated by the peak RSS.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PageBatchController():
+    """
+    Chooses how many pages a worker converts per docling call. Additive increase while the
+    RSS stays below `low` of the ceiling, halving once it passes `high`.
+    """
+    def __init__(self, rss_ceiling_mb: float, max_batch: int, initial: int = 2, low: float = 0.7, high: float = 0.9):
+        self.rss_ceiling_mb = rss_ceiling_mb
+        self.max_batch = max(1, max_batch)
+        self.size = min(max(1, initial), self.max_batch)
+        self.low = low
+        self.high = high
+
+    def update(self, rss_mb: float) -> int:
+        if rss_mb > self.high * self.rss_ceiling_mb:
+            self.size = max(1, self.size // 2)
+        elif rss_mb < self.low * self.rss_ceiling_mb and self.size < self.max_batch:
+            self.size += 1
+        return self.size
+
+
+def _load_converter(max_batch: int):
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    from docling.datamodel.pipeline_options import ThreadedPdfPipelineOptions
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.settings import settings
+
+    # The page range of each call bounds how many pages are in flight, so the model batch
+    # sizes can stay at the largest page batch instead of being pinned to 1.
+    settings.perf.page_batch_size = max_batch
+    pipeline_options = ThreadedPdfPipelineOptions(
+        ocr_batch_size=max_batch,
+        layout_batch_size=max_batch,
+        table_batch_size=max_batch,
+    )
+    converter = DocumentConverter(format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)})
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+def _page_count(pdf_filepath: str) -> int:
+    import fitz
+
+    with fitz.open(pdf_filepath, filetype="pdf") as doc:
+        return len(doc)
+
+
+def _convert(converter, controller: PageBatchController, pdf_filepath: str) -> Tuple[str, int, List[int]]:
+    page_count = _page_count(pdf_filepath)
+    parts, batch_sizes = [], []
+    first_page = 1
+    while first_page <= page_count:
+        last_page = min(first_page + controller.size - 1, page_count)
+        result = converter.convert(pdf_filepath, page_range=(first_page, last_page))
+        parts.append(result.document.export_to_markdown())
+        batch_sizes.append(last_page - first_page + 1)
+        del result
+        gc.collect()
+        controller.update(current_rss_mb())
+        first_page = last_page + 1
+    return "\n\n".join(parts), page_count, batch_sizes
+
+
+def _worker_main(conn, rss_ceiling_mb: float, max_batch: int, threads: int):
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    converter = _load_converter(max_batch)
+    controller = PageBatchController(rss_ceiling_mb, max_batch)
+    conn.send(("ready", None, None))
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        job_id, pdf_filepath = task
+        start = time.perf_counter()
+        try:
+            markdown, pages, batch_sizes = _convert(converter, controller, pdf_filepath)
+        except Exception as e:
+            conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+            continue
+        rss_mb = current_rss_mb()
+        # A worker that ends above the ceiling says so with its result and exits, so the pool
+        # never hands it another PDF.
+        recycle = rss_mb > rss_ceiling_mb
+        conn.send(("done", job_id, {
+            "markdown": markdown,
+            "pages": pages,
+            "seconds": time.perf_counter() - start,
+            "batch_sizes": batch_sizes,
+            "rss_mb": rss_mb,
+            "recycle": recycle,
+        }))
+        if recycle:
+            return
+
+
+class DoclingPool():
+    """
+    Converts PDFs to markdown on a pool of warm docling worker processes. `submit` returns a
+    Future of the markdown; `stats` reports the per-page throughput of the conversions so far.
+
+    Each worker has its own pipe and is handed one PDF at a time, so the pool always knows
+    which PDF a worker was converting when it dies (for instance killed for running out of
+    memory) and a dead worker cannot block the others.
+    """
+    def __init__(self, workers: Optional[int] = None, rss_ceiling_mb: Optional[float] = None, max_page_batch: Optional[int] = None):
+        self.workers = workers or DOCLING_WORKERS
+        self.rss_ceiling_mb = rss_ceiling_mb or DOCLING_RSS_CEILING_MB
+        self.max_page_batch = max_page_batch or DOCLING_MAX_PAGE_BATCH
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, Any] = {}
+        self._connections: Dict[int, Any] = {}
+        self._idle: Deque[int] = deque()
+        self._running: Dict[int, int] = {}
+        self._pending: Deque[int] = deque()
+        self._futures: Dict[int, Tuple[str, Future]] = {}
+        self._ready = set()
+        self._startup_failures = 0
+        self._error: Optional[str] = None
+        self._lock = threading.RLock()
+        self._next_job = 0
+        self._next_worker = 0
+        self._closed = False
+        self.pages = 0
+        self.documents = 0
+        self.busy_seconds = 0.0
+        self.recycled = 0
+        self._started_at = time.perf_counter()
+
+        for _ in range(self.workers):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _spawn(self):
+        worker_id = self._next_worker
+        self._next_worker += 1
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.rss_ceiling_mb, self.max_page_batch, self.threads),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._processes[worker_id] = process
+        self._connections[worker_id] = parent_conn
+
+    def submit(self, pdf_filepath: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DoclingPool is closed")
+            if self._error:
+                raise RuntimeError(self._error)
+            job_id = self._next_job
+            self._next_job += 1
+            self._futures[job_id] = (pdf_filepath, future)
+            self._pending.append(job_id)
+            self._dispatch()
+        return future
+
+    def convert(self, pdf_filepath: str) -> str:
+        return self.submit(pdf_filepath).result()
+
+    def _dispatch(self):
+        while self._idle and self._pending:
+            worker_id = self._idle.popleft()
+            if worker_id not in self._processes:
+                continue
+            job_id = self._pending.popleft()
+            try:
+                self._connections[worker_id].send((job_id, self._futures[job_id][0]))
+            except OSError:
+                # The worker died; the PDF goes back to the queue and `_reap` replaces the worker.
+                self._pending.appendleft(job_id)
+                continue
+            self._running[worker_id] = job_id
+
+    def _finish(self, job_id: int, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            entry = self._futures.pop(job_id, None)
+        if entry is None:
+            # Already failed, for instance when the pool gave up on starting workers.
+            return
+        pdf_filepath, future = entry
+        if error is not None:
+            logging.error(f"Docling failed on {os.path.basename(pdf_filepath)}: {error}")
+            future.set_exception(RuntimeError(error))
+            return
+        self.pages += result["pages"]
+        self.documents += 1
+        self.busy_seconds += result["seconds"]
+        logging.info(
+            f"Docling converted {os.path.basename(pdf_filepath)}: {result['pages']} pages in {result['seconds']:.1f}s "
+            f"({result['pages'] / max(result['seconds'], 1e-9):.2f} pages/s, page batches {sorted(set(result['batch_sizes']))}, "
+            f"RSS {result['rss_mb']:.0f} MB)"
+        )
+        future.set_result(result["markdown"])
+
+    def _collect(self):
+        while not self._closed:
+            with self._lock:
+                connections = {conn: worker_id for worker_id, conn in self._connections.items()}
+                sentinels = {process.sentinel: worker_id for worker_id, process in self._processes.items()}
+            for ready in wait(list(connections) + list(sentinels), timeout=1.0):
+                if ready in connections:
+                    self._receive(connections[ready], ready)
+            self._reap()
+
+    def _receive(self, worker_id: int, conn):
+        try:
+            while conn.poll():
+                kind, job_id, payload = conn.recv()
+                with self._lock:
+                    if kind == "ready":
+                        self._ready.add(worker_id)
+                        self._startup_failures = 0
+                        self._idle.append(worker_id)
+                    elif kind == "done" and payload.get("recycle"):
+                        self._running.pop(worker_id, None)
+                        logging.info(f"Recycling docling worker {worker_id} at {payload['rss_mb']:.0f} MB RSS")
+                        self._retire(worker_id)
+                        self.recycled += 1
+                        self._spawn()
+                    elif kind in ("done", "error"):
+                        self._running.pop(worker_id, None)
+                        self._idle.append(worker_id)
+                if kind == "done":
+                    self._finish(job_id, result=payload)
+                elif kind == "error":
+                    self._finish(job_id, error=payload)
+                with self._lock:
+                    self._dispatch()
+                if kind == "done" and payload.get("recycle"):
+                    return
+        except (EOFError, OSError):
+            pass
+
+    def _retire(self, worker_id: int):
+        process = self._processes.pop(worker_id)
+        self._connections.pop(worker_id).close()
+        process.join(timeout=30)
+
+    def _reap(self):
+        """
+        Replaces workers that died without reporting, such as after an OOM kill, and fails the
+        PDF they were converting. When workers keep dying before loading the models, the pool
+        gives up and fails every queued PDF; PDFs already on live workers still finish.
+        """
+        with self._lock:
+            dead = [worker_id for worker_id, process in self._processes.items() if not process.is_alive()]
+        for worker_id in dead:
+            if self._closed:
+                return
+            # A worker that exits right after reporting (a recycle) may still have its result
+            # in the pipe; read it before deciding the PDF was lost.
+            conn = self._connections.get(worker_id)
+            if conn is not None:
+                self._receive(worker_id, conn)
+            with self._lock:
+                if worker_id not in self._processes:
+                    continue
+                exitcode = self._processes[worker_id].exitcode
+                self._retire(worker_id)
+                job_id = self._running.pop(worker_id, None)
+                if worker_id not in self._ready:
+                    self._startup_failures += 1
+                if self._startup_failures >= MAX_STARTUP_FAILURES:
+                    self._error = f"docling workers failed to start (exit code {exitcode})"
+                    logging.error(self._error)
+                    failed = list(self._pending) + ([job_id] if job_id is not None else [])
+                    self._pending.clear()
+                else:
+                    failed = [job_id] if job_id is not None else []
+                    self._spawn()
+            for failed_job in failed:
+                self._finish(failed_job, error=self._error or f"worker exited with code {exitcode}")
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._started_at
+        return {
+            "workers": self.workers,
+            "documents": self.documents,
+            "pages": self.pages,
+            "pages_per_sec": self.pages / max(elapsed, 1e-9),
+            "pages_per_worker_sec": self.pages / max(self.busy_seconds, 1e-9),
+            "recycled_workers": self.recycled,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for conn in self._connections.values():
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+        self._collector.join(timeout=5)
+        for process in self._processes.values():
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+
+_pool: Optional[DoclingPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_docling_pool() -> DoclingPool:
+    """
+    Returns the process-wide docling pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DoclingPool()
+            atexit.register(_pool.close)
+    return _pool
+
+
+def main():
+    from src.data.pdf_extraction import read_pdf_markdown
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf-directory", default=os.getenv("PDF_DIRECTORY", ""))
+    parser.add_argument("--workers", type=int, default=DOCLING_WORKERS)
+    parser.add_argument("--rss-ceiling-mb", type=float, default=DOCLING_RSS_CEILING_MB)
+    parser.add_argument("--max-page-batch", type=int, default=DOCLING_MAX_PAGE_BATCH)
+    args = parser.parse_args()
+
+    global _pool
+    _pool = DoclingPool(args.workers, args.rss_ceiling_mb, args.max_page_batch)
+    pdf_filepaths = sorted(
+        os.path.join(args.pdf_directory, name) for name in os.listdir(args.pdf_directory) if name.lower().endswith(".pdf")
+    )
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=args.workers * 2) as executor:
+        failures = sum(future.exception() is not None for future in [executor.submit(read_pdf_markdown, path) for path in pdf_filepaths])
+    logging.info(f"Docling pool stats: {_pool.stats()} ({failures} failures)")
+    _pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import fcntl
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from agno.knowledge.embedder.base import Embedder
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore():
+    """
+    Persistent embedding cache for one (embedder model, dimension) pair. Vectors are appended
+    to a float32 matrix that is read back through a memory map, and a SQLite index maps each
+    text hash to its row. Appends take a file lock, so worker processes can share the store.
+    The index also holds the number of committed rows: bytes past it, left by an append that
+    was interrupted before its rows were indexed, are truncated by the next append.
+    """
+    def __init__(self, cache_dir: str, model_id: str, dimensions: int):
+        self.dimensions = dimensions
+        os.makedirs(cache_dir, exist_ok=True)
+        prefix = os.path.join(cache_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_id)}-{dimensions}")
+        self.matrix_path = f"{prefix}.f32"
+        self.lock_path = f"{prefix}.lock"
+        self.conn = sqlite3.connect(f"{prefix}.index.sqlite", check_same_thread=False, timeout=30)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Stores written before the row count was kept: every indexed row is committed.
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta SELECT 'committed_rows', COALESCE(MAX(row) + 1, 0) FROM rows"
+        )
+        self.conn.commit()
+        self.thread_lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+
+    def _committed_rows(self) -> int:
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'committed_rows'").fetchone()[0]
+
+    def _rows_on_disk(self) -> int:
+        if not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (4 * self.dimensions)
+
+    def _matrix_with(self, row: int) -> np.memmap:
+        if self._matrix is None or row >= self._matrix.shape[0]:
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(self._rows_on_disk(), self.dimensions))
+        return self._matrix
+
+    def get_many(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self.thread_lock:
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, row FROM rows WHERE hash IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for hash_, row in rows:
+                    found[hash_] = self._matrix_with(row)[row].tolist()
+        return found
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        if not items:
+            return
+        vectors = np.asarray([vector for _, vector in items], dtype=np.float32)
+        with self.thread_lock, open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            first_row = self._committed_rows()
+            with open(self.matrix_path, "ab") as f:
+                if f.tell() < first_row * 4 * self.dimensions:
+                    logging.error(f"{self.matrix_path} is shorter than its index, clearing the embedding cache")
+                    self.conn.execute("DELETE FROM rows")
+                    first_row = 0
+                if f.tell() > first_row * 4 * self.dimensions:
+                    logging.warning(f"Discarding {f.tell() - first_row * 4 * self.dimensions} uncommitted bytes of {self.matrix_path}")
+                    f.truncate(first_row * 4 * self.dimensions)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO rows VALUES (?, ?)",
+                [(hash_, first_row + i) for i, (hash_, _) in enumerate(items)],
+            )
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'committed_rows'", (first_row + len(items),))
+            self.conn.commit()
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    """
+    agno Embedder that wraps another embedder with a persistent cache keyed on
+    (embedder model, dimension, text hash) and embeds cache misses in batches of `batch_size`,
+    deduplicating identical texts. The cache lives under EMBEDDING_CACHE_DIR, so re-ingesting
+    a paper only pays for the chunks whose text actually changed.
+    """
+    embedder: Any = None
+    cache_dir: Optional[str] = None
+    batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+
+    def __post_init__(self):
+        if self.embedder is None:
+            from agno.knowledge.embedder.openai import OpenAIEmbedder
+            self.embedder = OpenAIEmbedder()
+        self.dimensions = self.embedder.dimensions
+        self.id = getattr(self.embedder, "id", type(self.embedder).__name__)
+        self.store = EmbeddingStore(
+            self.cache_dir or os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache"), self.id, self.dimensions
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        client = getattr(self.embedder, "client", None)
+        if client is not None and hasattr(client, "embeddings"):
+            request: Dict[str, Any] = {"input": texts, "model": self.embedder.id, "encoding_format": "float"}
+            if self.embedder.id.startswith("text-embedding-3"):
+                request["dimensions"] = self.dimensions
+            response = client.embeddings.create(**request)
+            return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+        return [self.embedder.get_embedding(text) for text in texts]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts, reading cached vectors and calling the model only for new texts.
+        """
+        hashes = [text_hash(text) for text in texts]
+        cached = self.store.get_many(list(set(hashes)))
+        missing = {}
+        for hash_, text in zip(hashes, texts):
+            if hash_ not in cached:
+                missing.setdefault(hash_, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        missing_items = list(missing.items())
+        for i in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[i:i + self.batch_size]
+            embeddings = self._embed_batch([text for _, text in batch])
+            if any(not embedding for embedding in embeddings):
+                raise RuntimeError("Empty embedding returned by the embedder")
+            self.store.put_many([(hash_, embedding) for (hash_, _), embedding in zip(batch, embeddings)])
+            cached.update({hash_: embedding for (hash_, _), embedding in zip(batch, embeddings)})
+        return [cached[hash_] for hash_ in hashes]
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+    async def async_get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.get_embedding(text), None
+
+
+class EmbeddingBatcher():
+    """
+    Coalesces embedding requests made concurrently from several threads (one per document
+    in the ingest upsert stage) into shared calls of up to `batch_size` texts. close(), or
+    leaving a `with` block, stops the worker thread once the pending requests are served.
+    """
+    def __init__(self, embedder: CachedEmbedder, batch_size: Optional[int] = None, max_wait: float = 0.05):
+        self.embedder = embedder
+        self.batch_size = batch_size or embedder.batch_size
+        self.max_wait = max_wait
+        self.pending: List[Tuple[List[str], Future]] = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.worker.join()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        future: Future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self.pending.append((texts, future))
+            self.condition.notify()
+        return future.result()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while sum(len(texts) for texts, _ in self.pending) < self.batch_size and time.monotonic() < deadline and not self.closed:
+                    self.condition.wait(deadline - time.monotonic())
+                requests, self.pending = self.pending, []
+
+            try:
+                embeddings = self.embedder.get_embeddings([text for texts, _ in requests for text in texts])
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for texts, future in requests:
+                future.set_result(embeddings[offset:offset + len(texts)])
+                offset += len(texts)
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.data.ingestion import file_content_hash
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class IngestManifest():
+    """
+    Persistent record of every ingested PDF, keyed on its file path. Stores the file size,
+    mtime and content hash, plus the vector ids that each document produced, so re-runs
+    only touch new or changed files and can delete the vectors of stale ones.
+    """
+    def __init__(self, manifest_path: Optional[str] = None):
+        self.manifest_path = manifest_path or os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.sqlite")
+        if os.path.dirname(self.manifest_path):
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.manifest_path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                vector_ids TEXT NOT NULL,
+                ingested_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Which documents reference each vector id, so the ids still in use by other documents
+        # are found without reading every entry.
+        has_refs = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vector_refs'").fetchone()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vector_refs (vector_id TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (vector_id, path))"
+        )
+        if not has_refs:
+            for path, vector_ids in self.conn.execute("SELECT path, vector_ids FROM documents").fetchall():
+                self._add_refs(path, json.loads(vector_ids))
+        self.conn.commit()
+
+    def _add_refs(self, path: str, vector_ids: List[str]):
+        self.conn.executemany("INSERT OR IGNORE INTO vector_refs VALUES (?, ?)", ((vector_id, path) for vector_id in vector_ids))
+
+    def generation(self) -> int:
+        """
+        Returns the collection generation, a counter bumped every time an ingest run changes
+        the collection. Retrieval caches use it to invalidate their entries.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def bump_generation(self) -> int:
+        generation = self.generation() + 1
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+        self.conn.commit()
+        return generation
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT path, name, size, mtime, content_hash, chunk_count, vector_ids FROM documents WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "path": row[0], "name": row[1], "size": row[2], "mtime": row[3],
+            "content_hash": row[4], "chunk_count": row[5], "vector_ids": json.loads(row[6]),
+        }
+
+    def paths(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT path FROM documents")]
+
+    def record(self, path: str, name: str, size: int, mtime: float, content_hash: str, vector_ids: List[str]):
+        """
+        Records (or replaces) the manifest entry of an ingested document.
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, name, size, mtime, content_hash, len(vector_ids), json.dumps(vector_ids), time.time()),
+        )
+        self.conn.execute("DELETE FROM vector_refs WHERE path = ?", (path,))
+        self._add_refs(path, vector_ids)
+        self.conn.commit()
+
+    def touch(self, path: str, size: int, mtime: float):
+        """
+        Updates size and mtime of an entry whose content hash did not change.
+        """
+        self.conn.execute("UPDATE documents SET size = ?, mtime = ? WHERE path = ?", (size, mtime, path))
+        self.conn.commit()
+
+    def remove(self, path: str):
+        self.conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+        self.conn.execute("DELETE FROM vector_refs WHERE path = ?", (path,))
+        self.conn.commit()
+
+    def referenced_ids(self, vector_ids: Iterable[str], exclude_path: Optional[str] = None, batch_size: int = 500) -> Set[str]:
+        """
+        Returns the given vector ids that are still referenced by a document other than `exclude_path`.
+        """
+        vector_ids = list(vector_ids)
+        ids: Set[str] = set()
+        for start in range(0, len(vector_ids), batch_size):
+            batch = vector_ids[start:start + batch_size]
+            rows = self.conn.execute(
+                f"SELECT DISTINCT vector_id FROM vector_refs WHERE vector_id IN ({', '.join('?' * len(batch))}) AND path != ?",
+                (*batch, exclude_path or ""),
+            )
+            ids.update(row[0] for row in rows)
+        return ids
+
+    def plan(self, jobs: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Splits the jobs into new, changed and unchanged documents and lists the manifest entries
+        whose file is no longer part of the library. Files whose size and mtime match the
+        manifest are not opened; the others are hashed to detect in-place replacements.
+        Entries are keyed on the path, so when several jobs share a file only the first is kept.
+        """
+        plan = {"new": [], "changed": [], "unchanged": [], "removed": []}
+        seen = set()
+        for job in jobs:
+            path = job["filepath"]
+            if path in seen:
+                logging.warning(f"'{job['name']}' has the same file as another document, skipping it: {path}")
+                continue
+            seen.add(path)
+            entry = self.get(path)
+            if not os.path.isfile(path):
+                if entry is not None:
+                    plan["removed"].append(entry)
+                continue
+
+            stat = os.stat(path)
+            job = {**job, "size": stat.st_size, "mtime": stat.st_mtime}
+            if entry is None:
+                plan["new"].append(job)
+            elif entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime and entry["name"] == job["name"]:
+                plan["unchanged"].append(job)
+            else:
+                content_hash = file_content_hash(path)
+                if content_hash == entry["content_hash"] and entry["name"] == job["name"]:
+                    self.touch(path, stat.st_size, stat.st_mtime)
+                    plan["unchanged"].append(job)
+                else:
+                    plan["changed"].append({**job, "content_hash": content_hash, "previous_vector_ids": entry["vector_ids"]})
+
+        for path in self.paths():
+            if path not in seen:
+                plan["removed"].append(self.get(path))
+
+        logging.info(
+            f"Ingest manifest plan: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+            f"{len(plan['unchanged'])} unchanged, {len(plan['removed'])} removed"
+        )
+        return plan
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,354 @@
+import os
+import time
+import heapq
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from qdrant_client import models
+
+from src.data.chunk_dedup import add_sources, remove_sources
+from src.data.embedding_cache import CachedEmbedder, EmbeddingBatcher
+from src.tracing import span
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PARSE_STAGE = "parse"
+UPSERT_STAGE = "upsert"
+
+
+def file_content_hash(filepath: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 hash of a file, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_and_chunk(job: Dict[str, Any], similarity_threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    Parses and semantically chunks a single PDF. Runs inside a worker process, so it only
+    receives and returns plain picklable data.
+    """
+    from src.data.pdf_extraction import CachedPDFReader
+    from src.data.semantic_chunking import CachedSemanticChunking
+
+    filepath = job["filepath"]
+    if not os.path.isfile(filepath):
+        raise FileNotFoundError(f"PDF file not found: {filepath}")
+
+    reader = CachedPDFReader(
+        name="Semantic Chunking Reader",
+        chunking_strategy=CachedSemanticChunking(similarity_threshold=similarity_threshold),
+    )
+    documents = reader.read(filepath, name=job["name"])
+    chunks = [
+        {"content": document.content, "meta_data": {**document.meta_data, **(job.get("metadata") or {})}}
+        for document in documents
+        if document.content
+    ]
+    return {**job, "content_hash": job.get("content_hash") or file_content_hash(filepath), "chunks": chunks}
+
+
+def chunk_point_id(content: str) -> str:
+    """
+    Point id of a chunk, the same agno's Qdrant.insert uses: the MD5 of its content.
+    """
+    return hashlib.md5(content.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+def embed_and_upsert(vector_db: Any, parsed: Dict[str, Any], embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None) -> List[str]:
+    """
+    Embeds the chunks of a parsed document and upserts them into the Qdrant collection,
+    using the same point ids and payload layout as agno's Qdrant.insert.
+    `embed_fn` embeds a list of texts at once; without it each chunk is embedded separately.
+    Returns the ids of the upserted points.
+    """
+    contents = [chunk["content"].replace("\x00", "\ufffd") for chunk in parsed["chunks"]]
+    with span("embed", document=parsed["name"], items=len(contents), bytes=sum(len(content) for content in contents)):
+        if embed_fn is not None:
+            embeddings = [(embedding, None) for embedding in embed_fn(contents)] if contents else []
+        else:
+            embeddings = [vector_db.embedder.get_embedding_and_usage(content) for content in contents]
+
+    points = []
+    for chunk, cleaned_content, (embedding, usage) in zip(parsed["chunks"], contents, embeddings):
+        if not embedding:
+            raise RuntimeError(f"Empty embedding returned for a chunk of '{parsed['name']}'")
+        points.append(
+            models.PointStruct(
+                id=chunk_point_id(cleaned_content),
+                vector=embedding,
+                payload={
+                    "name": parsed["name"],
+                    "meta_data": chunk["meta_data"],
+                    "content": cleaned_content,
+                    "usage": usage,
+                    "content_id": parsed["content_hash"],
+                    "content_hash": parsed["content_hash"],
+                    "sources": [parsed["name"]],
+                },
+            )
+        )
+    if points:
+        with span("qdrant_upsert", document=parsed["name"], items=len(points)):
+            vector_db.client.upsert(collection_name=vector_db.collection, wait=True, points=points)
+    return [point.id for point in points]
+
+
+def delete_vectors(vector_db: Any, vector_ids: List[str]):
+    """
+    Deletes the given point ids from the Qdrant collection.
+    """
+    if vector_ids:
+        vector_db.client.delete(
+            collection_name=vector_db.collection,
+            points_selector=models.PointIdsList(points=list(vector_ids)),
+            wait=True,
+        )
+
+
+class IngestionPipeline():
+    """
+    Two-stage ingestion: PDF parsing and chunking run in a process pool, embedding and
+    upsert run in a bounded thread pool. Failed documents are re-scheduled with exponential
+    backoff without blocking the workers that are processing other documents.
+    When an IngestManifest is given, only new or changed files are processed and the vectors
+    of changed or removed files are deleted; otherwise documents are skipped by name.
+    When a BM25Index is given, it is kept in sync with the upserted and deleted chunks.
+    When a ChunkDeduplicator is given, chunks that nearly duplicate a stored chunk (of another
+    version of the paper, or boilerplate) are not embedded: the document references the
+    stored point, which lists the document in its 'sources'.
+    Chunk embeddings go through a persistent CachedEmbedder, and the chunks of documents
+    upserted concurrently are embedded together in batches of up to `embedding_batch_size`.
+    """
+    def __init__(
+        self,
+        vector_db: Any,
+        parse_workers: Optional[int] = None,
+        upsert_workers: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 5.0,
+        skip_if_exists: bool = True,
+        similarity_threshold: float = 0.5,
+        manifest: Any = None,
+        lexical_index: Any = None,
+        embedding_batch_size: Optional[int] = None,
+        deduplicator: Any = None,
+    ):
+        self.vector_db = vector_db
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.upsert_workers = upsert_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.skip_if_exists = skip_if_exists
+        self.similarity_threshold = similarity_threshold
+        self.manifest = manifest
+        self.lexical_index = lexical_index
+        self.deduplicator = deduplicator
+        self.embedder = vector_db.embedder if isinstance(vector_db.embedder, CachedEmbedder) else CachedEmbedder(embedder=vector_db.embedder)
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_batcher: Optional[EmbeddingBatcher] = None
+        # Bounds the number of parsed documents waiting for the upsert stage, so memory stays flat.
+        self.max_in_flight = 2 * max(self.parse_workers, self.upsert_workers)
+
+    def _schedule_retry(self, retries: list, stage: str, item: Dict[str, Any], attempt: int, error: Exception) -> bool:
+        if attempt >= self.max_retries:
+            logging.error(f"Giving up on '{item['name']}' after {attempt + 1} attempts at {stage} stage: {error}")
+            return False
+        delay = self.retry_backoff * (2 ** attempt)
+        logging.warning(f"Error on {stage} stage for '{item['name']}' (attempt {attempt + 1}), retrying in {delay:.1f}s: {error}")
+        heapq.heappush(retries, (time.monotonic() + delay, id(item), stage, item, attempt + 1))
+        return True
+
+    def _delete_chunks(self, chunk_ids: List[str]):
+        delete_vectors(self.vector_db, chunk_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(chunk_ids)
+        if self.deduplicator is not None:
+            self.deduplicator.remove(chunk_ids)
+
+    def _upsert(self, parsed: Dict[str, Any]) -> Tuple[List[str], Set[int]]:
+        """
+        Embeds and upserts the chunks of a document that are not near-duplicates of stored
+        ones. Returns the point id of every chunk and the positions of the duplicates.
+        """
+        if self.deduplicator is None:
+            return embed_and_upsert(self.vector_db, parsed, self.embedding_batcher.embed), set()
+        point_ids = [chunk_point_id(chunk["content"]) for chunk in parsed["chunks"]]
+        with span("dedup", document=parsed["name"], items=len(point_ids)) as s:
+            canonical = self.deduplicator.claim(point_ids, [chunk["content"] for chunk in parsed["chunks"]])
+            duplicates = {i for i, match in enumerate(canonical) if match is not None}
+            s.add(duplicates=len(duplicates))
+        unique = {**parsed, "chunks": [chunk for i, chunk in enumerate(parsed["chunks"]) if i not in duplicates]}
+        claimed = [point_ids[i] for i in range(len(point_ids)) if i not in duplicates]
+        try:
+            stored = iter(embed_and_upsert(self.vector_db, unique, self.embedding_batcher.embed))
+        except Exception:
+            self.deduplicator.remove(claimed)
+            raise
+        self.deduplicator.confirm(claimed)
+        vector_ids = [match or next(stored) for match in canonical]
+        # Points upserted for this document already list it as their source. The others may
+        # have been claimed by a concurrent document that has not stored them yet: their
+        # back-references are only recorded once they are stored, and when that upsert failed
+        # the document is retried, so that it stores those chunks itself.
+        referenced = {canonical[i] for i in duplicates} - set(claimed)
+        with span("dedup_sources", document=parsed["name"], items=len(referenced)):
+            missing = self.deduplicator.wait_for(referenced)
+            missing |= add_sources(self.vector_db, referenced - missing, parsed["name"])
+        if missing:
+            raise RuntimeError(f"{len(missing)} chunks of '{parsed['name']}' duplicate chunks that were not stored")
+        return vector_ids, duplicates
+
+    def _index_lexically(self, parsed: Dict[str, Any], vector_ids: List[str], duplicates: Set[int]):
+        self.lexical_index.add(
+            {"id": vector_id, "name": parsed["name"], "content": chunk["content"], "meta_data": chunk["meta_data"]}
+            for i, (vector_id, chunk) in enumerate(zip(vector_ids, parsed["chunks"]))
+            if i not in duplicates
+        )
+        self.lexical_index.add_sources((vector_ids[i] for i in duplicates), parsed["name"])
+
+    def _remove_sources(self, point_ids: Set[str], name: str):
+        remove_sources(self.vector_db, point_ids, name)
+        if self.lexical_index is not None:
+            self.lexical_index.remove_sources(point_ids, name)
+
+    def _record_document(self, parsed: Dict[str, Any], vector_ids: List[str]):
+        stale_ids = set(parsed.get("previous_vector_ids") or []) - set(vector_ids)
+        if stale_ids:
+            referenced = self.manifest.referenced_ids(stale_ids, parsed["filepath"])
+            self._delete_chunks(list(stale_ids - referenced))
+            if self.deduplicator is not None:
+                self._remove_sources(referenced, parsed["name"])
+        self.manifest.record(
+            parsed["filepath"], parsed["name"], parsed["size"], parsed["mtime"], parsed["content_hash"], vector_ids
+        )
+
+    def _remove_document(self, entry: Dict[str, Any]):
+        logging.info(f"Removing stale vectors of '{entry['name']}' ({entry['path']})")
+        referenced = self.manifest.referenced_ids(entry["vector_ids"], entry["path"])
+        self._delete_chunks(list(set(entry["vector_ids"]) - referenced))
+        if self.deduplicator is not None:
+            self._remove_sources(referenced, entry["name"])
+        self.manifest.remove(entry["path"])
+
+    def run(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Ingests a list of jobs, each a dictionary with 'name', 'filepath' and 'metadata'.
+        Returns the ingestion statistics, including the throughput in documents per second.
+        """
+        if not self.vector_db.exists():
+            self.vector_db.create()
+
+        stats = {"documents": 0, "chunks": 0, "duplicate_chunks": 0, "skipped": 0, "failed": 0, "retries": 0, "removed": 0}
+        pending = deque()
+        if self.manifest is not None:
+            plan = self.manifest.plan(jobs)
+            pending.extend(plan["new"] + plan["changed"])
+            stats["skipped"] = len(plan["unchanged"])
+            for entry in plan["removed"]:
+                self._remove_document(entry)
+                stats["removed"] += 1
+        else:
+            for job in jobs:
+                if self.skip_if_exists and self.vector_db.name_exists(job["name"]):
+                    stats["skipped"] += 1
+                else:
+                    pending.append(job)
+
+        total = len(pending)
+        logging.info(f"Ingesting {total} documents with {self.parse_workers} parse workers and {self.upsert_workers} upsert workers")
+        start = time.perf_counter()
+        retries: list = []
+        parse_futures: Dict[Any, tuple] = {}
+        upsert_futures: Dict[Any, tuple] = {}
+
+        # The batcher's thread is stopped after the upsert pool has finished.
+        with EmbeddingBatcher(self.embedder, batch_size=self.embedding_batch_size) as self.embedding_batcher, \
+                ProcessPoolExecutor(max_workers=self.parse_workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=self.upsert_workers) as upsert_pool:
+
+            def submit(stage: str, item: Dict[str, Any], attempt: int):
+                if stage == PARSE_STAGE:
+                    future = parse_pool.submit(read_and_chunk, item, self.similarity_threshold)
+                    parse_futures[future] = (item, attempt)
+                else:
+                    future = upsert_pool.submit(self._upsert, item)
+                    upsert_futures[future] = (item, attempt)
+
+            while pending or retries or parse_futures or upsert_futures:
+                now = time.monotonic()
+                while retries and retries[0][0] <= now:
+                    _, _, stage, item, attempt = heapq.heappop(retries)
+                    submit(stage, item, attempt)
+
+                while pending and len(parse_futures) + len(upsert_futures) < self.max_in_flight:
+                    submit(PARSE_STAGE, pending.popleft(), 0)
+
+                in_flight = list(parse_futures) + list(upsert_futures)
+                timeout = max(retries[0][0] - now, 0) if retries else None
+                if not in_flight:
+                    time.sleep(timeout or 0)
+                    continue
+
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in parse_futures:
+                        job, attempt = parse_futures.pop(future)
+                        try:
+                            parsed = future.result()
+                        except Exception as e:
+                            if self._schedule_retry(retries, PARSE_STAGE, job, attempt, e):
+                                stats["retries"] += 1
+                            else:
+                                stats["failed"] += 1
+                            continue
+                        submit(UPSERT_STAGE, parsed, 0)
+                    else:
+                        parsed, attempt = upsert_futures.pop(future)
+                        try:
+                            vector_ids, duplicates = future.result()
+                            if self.lexical_index is not None:
+                                self._index_lexically(parsed, vector_ids, duplicates)
+                            if self.manifest is not None:
+                                self._record_document(parsed, vector_ids)
+                        except Exception as e:
+                            if self._schedule_retry(retries, UPSERT_STAGE, parsed, attempt, e):
+                                stats["retries"] += 1
+                            else:
+                                stats["failed"] += 1
+                            continue
+                        stats["documents"] += 1
+                        stats["chunks"] += len(vector_ids)
+                        stats["duplicate_chunks"] += len(duplicates)
+                        elapsed = time.perf_counter() - start
+                        logging.info(
+                            f"Ingested {stats['documents']}/{total} '{parsed['name']}' "
+                            f"({stats['documents'] / elapsed:.2f} docs/sec)"
+                        )
+
+        if self.manifest is not None and (stats["documents"] or stats["removed"]):
+            self.manifest.bump_generation()
+
+        stats["elapsed_seconds"] = time.perf_counter() - start
+        stats["docs_per_sec"] = stats["documents"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0
+        stats["embedding_cache_hits"] = self.embedder.hits
+        stats["embedding_cache_misses"] = self.embedder.misses
+        # Duplicates are neither embedded nor stored: one embedding call input and one vector each.
+        stats["vector_bytes_saved"] = stats["duplicate_chunks"] * self.vector_db.embedder.dimensions * 4
+        logging.info(
+            f"Ingestion finished: {stats['documents']} documents, {stats['chunks']} chunks, "
+            f"{stats['skipped']} skipped, {stats['removed']} removed, {stats['failed']} failed in {stats['elapsed_seconds']:.1f}s "
+            f"({stats['docs_per_sec']:.2f} docs/sec), {stats['embedding_cache_hits']} chunk embeddings served from cache, "
+            f"{stats['embedding_cache_misses']} embedded, {stats['duplicate_chunks']} near-duplicate chunks not embedded"
+        )
+        return stats
@@ -0,0 +1,54 @@
+from typing import Any, Dict, Optional
+
+from qdrant_client import models
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+
+def _is_range(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and set(value) <= set(RANGE_OPERATORS)
+
+
+def to_qdrant_filter(filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+    """
+    Converts metadata filters into a Qdrant filter evaluated against the payload indexes.
+    Keys are meta_data fields (the 'meta_data.' prefix is optional). A value is matched exactly,
+    a list matches any of its elements, and a dictionary of gt/gte/lt/lte is a range. On list
+    fields such as creators or tags, a condition matches when any element matches.
+    """
+    if not filters:
+        return None
+    conditions = []
+    for key, value in filters.items():
+        if value is None:
+            continue
+        key = key if key.startswith("meta_data.") else f"meta_data.{key}"
+        if _is_range(value):
+            conditions.append(models.FieldCondition(key=key, range=models.Range(**value)))
+        elif isinstance(value, (list, tuple, set)):
+            conditions.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(value))))
+        else:
+            conditions.append(models.FieldCondition(key=key, match=models.MatchValue(value=value)))
+    return models.Filter(must=conditions) if conditions else None
+
+
+def matches(meta_data: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluates the same filters as `to_qdrant_filter` on a meta_data dictionary, for the
+    indexes that live outside Qdrant.
+    """
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        field = meta_data.get(key.removeprefix("meta_data."))
+        values = field if isinstance(field, list) else [field]
+        if _is_range(value):
+            checks = {"gt": lambda x, y: x > y, "gte": lambda x, y: x >= y, "lt": lambda x, y: x < y, "lte": lambda x, y: x <= y}
+            if not any(v is not None and all(checks[op](v, bound) for op, bound in value.items()) for v in values):
+                return False
+        elif isinstance(value, (list, tuple, set)):
+            if not set(values) & set(value):
+                return False
+        elif value not in values:
+            return False
+    return True
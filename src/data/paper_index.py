@@ -0,0 +1,196 @@
+"""
+Paper-level collection for coarse-to-fine retrieval: one point per paper, embedding its title,
+Zotero abstract and the summary sections of its analysis. A query first picks the top papers
+here and then searches only their chunks in the chunk collection.
+
+    python -m src.data.paper_index             # incremental build
+"""
+import os
+import re
+import json
+import uuid
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from qdrant_client import models
+
+from src.data.collection_profiles import create_collection, create_payload_indexes, get_profile, search_params
+from src.data.metadata_filters import to_qdrant_filter
+from src.tracing import span
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PAPER_COLLECTION = os.getenv("QDRANT_PAPER_COLLECTION", f"{os.getenv('QDRANT_COLLECTION', 'master_literature_review')}_papers")
+ANALYSIS_OUTPUTS_DIR = os.getenv("ANALYSIS_OUTPUTS_DIR", "analysis_outputs")
+PAPER_SUMMARY_MAX_CHARS = int(os.getenv("PAPER_SUMMARY_MAX_CHARS", "6000"))
+# Bumped when the summary text changes, so that existing points are re-embedded.
+PAPER_INDEX_VERSION = "1"
+
+# Analysis sections that describe what a paper is about, in the order they are embedded.
+SUMMARY_SECTIONS = ("Summary", "Goals", "Contributions", "Main Area", "Keywords")
+SECTION_PATTERN = re.compile(r"^##\s+(.+?)\s*$", re.MULTILINE)
+
+PAPER_ID_NAMESPACE = uuid.UUID("0b6f3f0e-5d47-4a8e-8d43-2f1e9c7a4b21")
+
+
+def paper_point_id(title: str) -> str:
+    return str(uuid.uuid5(PAPER_ID_NAMESPACE, title))
+
+
+def analysis_sections(analysis: str) -> Dict[str, str]:
+    """
+    Splits an analysis markdown into its "## " sections, without the question answering block.
+    """
+    analysis = analysis.split("## Question Answering")[0]
+    headings = list(SECTION_PATTERN.finditer(analysis))
+    sections = {}
+    for heading, following in zip(headings, headings[1:] + [None]):
+        body = analysis[heading.end():following.start() if following else len(analysis)]
+        sections[heading.group(1)] = body.strip().strip("-").strip()
+    return sections
+
+
+def paper_summary(title: str, metadata: Dict[str, Any], abstract: Optional[str], analysis: Optional[str]) -> str:
+    """
+    Text embedded for a paper: title, authors, year and venue, the Zotero abstract and the
+    summary sections of the analysis (the whole analysis when it has none of them).
+    """
+    header = ", ".join(str(value) for value in (metadata.get("authors"), metadata.get("year"), metadata.get("venue")) if value)
+    parts = [title, header, abstract or ""]
+    if analysis:
+        sections = analysis_sections(analysis)
+        summary = [f"{name}: {sections[name]}" for name in SUMMARY_SECTIONS if sections.get(name)]
+        parts.append("\n".join(summary) if summary else analysis.split("## Question Answering")[0].strip())
+    return "\n\n".join(part for part in parts if part)[:PAPER_SUMMARY_MAX_CHARS]
+
+
+def _file_signature(filepath: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_paper_index(vector_db: Any = None, analysis_dir: Optional[str] = None, library=None, zotero_store=None, pdf_directory: Optional[str] = None) -> Dict[str, int]:
+    """
+    Incrementally (re)builds the paper collection from the library, the Zotero items and the
+    analysis outputs, with one point per PDF (titles sharing a PDF are indexed under the first
+    one, like its chunks). A paper is re-embedded only when its analysis file or Zotero item
+    version changed; points of papers no longer in the library are deleted.
+    """
+    from src.data.vector_database import connect_vector_db
+    from src.data.pdf_matcher import LIBRARY_CSV, library_pdfs, load_library
+    from src.data.zotero_integration import ZoteroStore, flatten_zotero_item
+
+    vector_db = vector_db if vector_db is not None else connect_vector_db(PAPER_COLLECTION)
+    analysis_dir = analysis_dir or ANALYSIS_OUTPUTS_DIR
+    library = library if library is not None else load_library(LIBRARY_CSV)
+    pdf_directory = pdf_directory if pdf_directory is not None else os.getenv("PDF_DIRECTORY", "")
+    zotero_store = zotero_store if zotero_store is not None else ZoteroStore()
+    client, collection = vector_db.client, vector_db.collection
+    if not vector_db.exists():
+        # The paper collection is small, so it always stays in RAM.
+        create_collection(client, collection, vector_db.embedder.dimensions, get_profile("default"))
+    create_payload_indexes(client, collection)
+
+    existing, offset = {}, None
+    while True:
+        points, offset = client.scroll(collection, limit=1024, offset=offset, with_payload=["source_signature"])
+        existing.update({str(point.id): (point.payload or {}).get("source_signature") for point in points})
+        if offset is None:
+            break
+
+    pending, stats = [], {"papers": 0, "embedded": 0, "reused": 0, "dropped": 0}
+    for pdf in library_pdfs(library, pdf_directory):
+        stats["papers"] += 1
+        point = paper_point_id(pdf['title'])
+        analysis_path = os.path.join(analysis_dir, f"{pdf['pdf_name'].replace('.pdf', '')}_analysis.md")
+        item = zotero_store.find_by_title(pdf['title'])
+        signature = json.dumps([PAPER_INDEX_VERSION, _file_signature(analysis_path), item.get('version') if item else None])
+        if existing.pop(point, None) == signature:
+            stats["reused"] += 1
+            continue
+        metadata = {**(flatten_zotero_item(item) if item else {}), "pdf_name": pdf['pdf_name']}
+        analysis = None
+        if os.path.isfile(analysis_path):
+            with open(analysis_path, 'r', encoding='utf-8') as f:
+                analysis = f.read()
+        abstract = (item.get('data', item).get('abstractNote') if item else None) or None
+        content = paper_summary(pdf['title'], metadata, abstract, analysis)
+        pending.append((point, {"name": pdf['title'], "content": content, "meta_data": metadata, "source_signature": signature}))
+
+    for start in range(0, len(pending), 64):
+        batch = pending[start:start + 64]
+        with span("embed", items=len(batch), bytes=sum(len(payload["content"]) for _, payload in batch)):
+            embeddings = vector_db.embedder.get_embeddings([payload["content"] for _, payload in batch])
+        client.upsert(
+            collection,
+            points=[models.PointStruct(id=point, vector=embedding, payload=payload) for (point, payload), embedding in zip(batch, embeddings)],
+            wait=True,
+        )
+        stats["embedded"] += len(batch)
+    if existing:
+        client.delete(collection, points_selector=models.PointIdsList(points=list(existing)), wait=True)
+        stats["dropped"] = len(existing)
+    logging.info(f"Paper collection '{collection}': {stats}")
+    return stats
+
+
+class PaperIndex():
+    """
+    Searches the paper collection for the papers most relevant to a query embedding. Until
+    the collection is built, searches return nothing and retrieval stays flat.
+    """
+    def __init__(self, vector_db: Any = None):
+        if vector_db is None:
+            from src.data.vector_database import connect_vector_db
+
+            vector_db = connect_vector_db(PAPER_COLLECTION)
+        self.vector_db = vector_db
+        self.search_params = search_params(get_profile("default"))
+        self._exists = False
+
+    def exists(self) -> bool:
+        if not self._exists:
+            self._exists = self.vector_db.exists()
+        return self._exists
+
+    def search(self, embedding: List[float], limit: int = 8, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the best matching papers as dictionaries with name, meta_data and score.
+        `filters` are the same meta_data conditions as for chunks.
+        """
+        if not self.exists():
+            return []
+        with span("paper_search", limit=limit, filtered=bool(filters)) as s:
+            response = self.vector_db.client.query_points(
+                collection_name=self.vector_db.collection,
+                query=embedding,
+                limit=limit,
+                query_filter=to_qdrant_filter(filters),
+                search_params=self.search_params,
+                with_payload=["name", "meta_data"],
+            )
+            papers = [
+                {"name": point.payload.get("name"), "meta_data": point.payload.get("meta_data", {}), "score": point.score}
+                for point in response.points
+                if point.payload is not None
+            ]
+            s.add(items=len(papers))
+        return papers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--analysis-dir", default=ANALYSIS_OUTPUTS_DIR)
+    args = parser.parse_args()
+    build_paper_index(analysis_dir=args.analysis_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import os
+import json
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz
+from dotenv import load_dotenv
+from agno.knowledge.reader.pdf_reader import PDFReader
+
+from src.data.ingestion import file_content_hash
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Bump the suffix whenever the extraction logic changes, so stale cache entries are not reused.
+PYMUPDF_EXTRACTOR_VERSION = f"pymupdf-{fitz.VersionBind}-1"
+DOCLING_EXTRACTOR_VERSION = "docling-2"
+
+
+class PDFTextCache():
+    """
+    On-disk cache of extracted PDF text, keyed by the PDF content hash and the extractor version.
+    The total size is bounded; when it is exceeded the least recently used entries are evicted.
+    """
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv("PDF_TEXT_CACHE_DIR", "pdf_text_cache")
+        self.max_bytes = max_bytes or int(os.getenv("PDF_TEXT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._hashes: Dict[tuple, str] = {}
+
+    def content_hash(self, pdf_filepath: str) -> str:
+        """
+        Returns the content hash of a PDF, memoized on (path, size, mtime) for this process.
+        """
+        stat = os.stat(pdf_filepath)
+        key = (os.path.abspath(pdf_filepath), stat.st_size, stat.st_mtime)
+        if key not in self._hashes:
+            self._hashes[key] = file_content_hash(pdf_filepath)
+        return self._hashes[key]
+
+    def _entry_path(self, content_hash: str, version: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.{version}.json")
+
+    def get(self, content_hash: str, version: str) -> Optional[Dict[str, Any]]:
+        entry_path = self._entry_path(content_hash, version)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # The mtime doubles as the last access time for LRU eviction.
+        os.utime(entry_path)
+        return entry
+
+    def put(self, content_hash: str, version: str, entry: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        self.commit(tmp_path, content_hash, version)
+
+    def commit(self, tmp_path: str, content_hash: str, version: str):
+        """
+        Installs an entry that was written to a temporary file in the cache directory.
+        """
+        os.replace(tmp_path, self._entry_path(content_hash, version))
+        self._evict()
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.cache_dir) if e.is_file() and e.name.endswith(".json")]
+        total = sum(e.stat().st_size for e in entries)
+        if total <= self.max_bytes:
+            return
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                logging.info(f"Evicted PDF text cache entry {entry.name}")
+            except FileNotFoundError:
+                pass
+
+
+_cache: Optional[PDFTextCache] = None
+
+
+def get_pdf_text_cache() -> PDFTextCache:
+    """
+    Returns the process-wide PDF text cache.
+    """
+    global _cache
+    if _cache is None:
+        _cache = PDFTextCache()
+    return _cache
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def iter_pages(
+    pdf_filepath: str,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    count_fn: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) for the pages of a PDF one at a time, page numbers starting at 1.
+    Only pages first_page..last_page are read. With a token budget, iteration stops before the
+    first page that would exceed it (the first page is always yielded), so the rest of the PDF
+    is never parsed. A complete pass over an uncached PDF is streamed into the text cache as
+    the pages are extracted; partial passes are not cached.
+    """
+    if not os.path.isfile(pdf_filepath):
+        logging.error(f"PDF file not found: {pdf_filepath}")
+        raise FileNotFoundError(f"PDF file not found: {pdf_filepath}")
+
+    cache = get_pdf_text_cache()
+    content_hash = cache.content_hash(pdf_filepath)
+    entry = cache.get(content_hash, PYMUPDF_EXTRACTOR_VERSION)
+    pages = _cached_pages(entry) if entry is not None else _extract_pages(pdf_filepath, cache, content_hash, first_page, last_page)
+
+    tokens = 0
+    try:
+        for page_number, text in pages:
+            if page_number < first_page:
+                continue
+            if last_page is not None and page_number > last_page:
+                break
+            if token_budget is not None:
+                tokens += count_fn(text)
+                if tokens > token_budget and page_number > first_page:
+                    break
+            yield page_number, text
+    finally:
+        pages.close()
+
+
+def _cached_pages(entry: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    yield from enumerate(entry["pages"], start=1)
+
+
+def _extract_pages(pdf_filepath: str, cache: PDFTextCache, content_hash: str, first_page: int, last_page: Optional[int]) -> Iterator[Tuple[int, str]]:
+    with fitz.open(pdf_filepath, filetype="pdf") as doc:
+        page_count = len(doc)
+        if first_page > 1 or (last_page is not None and last_page < page_count):
+            for page_index in range(max(first_page, 1) - 1, min(last_page or page_count, page_count)):
+                yield page_index + 1, doc.load_page(page_index).get_text()
+            return
+
+        # Written as {"pages": [...]} one page at a time; the entry is only installed when the
+        # caller consumed every page, otherwise the temporary file is dropped.
+        fd, tmp_path = tempfile.mkstemp(dir=cache.cache_dir, suffix=".tmp")
+        complete = False
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('{"pages": [')
+                for page_index in range(page_count):
+                    text = doc.load_page(page_index).get_text()
+                    f.write((", " if page_index else "") + json.dumps(text))
+                    yield page_index + 1, text
+                f.write(']}')
+            complete = True
+        finally:
+            if complete:
+                cache.commit(tmp_path, content_hash, PYMUPDF_EXTRACTOR_VERSION)
+            else:
+                os.remove(tmp_path)
+
+
+def read_pdf_pages(pdf_filepath: str, token_budget: Optional[int] = None, count_fn: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    Returns the text of each page of a PDF, extracted with PyMuPDF and cached on disk.
+    """
+    return [text for _, text in iter_pages(pdf_filepath, token_budget=token_budget, count_fn=count_fn)]
+
+
+def read_pdf_text(pdf_filepath: str, token_budget: Optional[int] = None, count_fn: Callable[[str], int] = estimate_tokens) -> str:
+    """
+    Returns the full text of a PDF (or its first pages within a token budget), joined once
+    at the end.
+    """
+    return "".join(text for _, text in iter_pages(pdf_filepath, token_budget=token_budget, count_fn=count_fn))
+
+
+def read_pdf_markdown(pdf_filepath: str) -> str:
+    """
+    Returns the docling markdown export of a PDF, cached on disk. Conversions run on the
+    shared pool of warm docling workers.
+    """
+    if not os.path.isfile(pdf_filepath):
+        logging.error(f"PDF file not found: {pdf_filepath}")
+        raise FileNotFoundError(f"PDF file not found: {pdf_filepath}")
+
+    cache = get_pdf_text_cache()
+    content_hash = cache.content_hash(pdf_filepath)
+    entry = cache.get(content_hash, DOCLING_EXTRACTOR_VERSION)
+    if entry is not None:
+        return entry["markdown"]
+
+    from src.data.docling_pool import get_docling_pool
+
+    markdown = get_docling_pool().convert(pdf_filepath)
+    cache.put(content_hash, DOCLING_EXTRACTOR_VERSION, {"markdown": markdown})
+    return markdown
+
+
+class CachedPDFReader(PDFReader):
+    """
+    agno PDFReader that takes the page texts from the shared extraction cache instead of
+    parsing the PDF again.
+    """
+    def read(self, pdf: Any, name: Optional[str] = None, password: Optional[str] = None):
+        if not isinstance(pdf, (str, os.PathLike)) or password:
+            return super().read(pdf, name=name, password=password)
+        # agno passes a Path when content is added by path
+        pdf = os.fspath(pdf)
+        doc_name = self._get_doc_name(pdf, name)
+        logging.info(f"Reading: {doc_name}")
+        return self._create_documents(read_pdf_pages(pdf), doc_name, use_uuid_for_id=True, page_number_shift=1)
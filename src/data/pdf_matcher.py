@@ -0,0 +1,242 @@
+"""
+Links Zotero items to the PDF files of the library folder and writes zotero_pdf_matches.csv.
+
+    python -m src.data.pdf_matcher --pdf-directory /path/to/pdfs --collection SVUM4G2M
+"""
+import os
+import re
+import csv
+import time
+import logging
+import argparse
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LIBRARY_CSV = os.getenv("LIBRARY_CSV", os.path.join(os.path.dirname(os.path.abspath(__file__)), "zotero_pdf_matches.csv"))
+
+PUNCTUATION = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+})
+# ZotFile / Zotero renaming pattern: "Author et al. - 2023 - Title.pdf"
+ZOTERO_FILENAME = re.compile(r"^.+? - (?:\d{4}|n\.d\.) - (?P<title>.+)$")
+
+
+def normalize_name(text: str) -> str:
+    """
+    Unicode-normalizes a title or file name so that typographic variants compare equal:
+    curly quotes and dashes become ASCII, accents are stripped and case is folded.
+    """
+    if text.isascii():
+        return text.casefold()
+    text = unicodedata.normalize("NFKD", text.translate(PUNCTUATION))
+    return "".join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def match_key(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", normalize_name(text)))
+
+
+def filename_title(filename: str) -> str:
+    stem = filename[:-4] if filename.lower().endswith(".pdf") else filename
+    match = ZOTERO_FILENAME.match(stem)
+    return match_key(match.group("title") if match else stem.replace("et al.", ""))
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# File names shorter than this are not treated as truncated titles: a prefix that short
+# would match every title starting with the same word.
+MIN_TRUNCATED_LENGTH = 24
+
+
+def similarity(title_key: str, file_key: str) -> float:
+    """
+    Dice coefficient of the character trigrams of a title and a file name title. File names
+    are often truncated, so a shorter file name (of at least MIN_TRUNCATED_LENGTH characters)
+    is compared with the same-length prefix of the title.
+    """
+    if MIN_TRUNCATED_LENGTH <= len(file_key) < len(title_key):
+        title_key = title_key[:len(file_key)]
+    title_trigrams, file_trigrams = trigrams(title_key), trigrams(file_key)
+    return 2 * len(title_trigrams & file_trigrams) / (len(title_trigrams) + len(file_trigrams))
+
+
+class TrigramIndex():
+    """
+    Character-trigram inverted index over PDF file names. Candidates for a title are looked up
+    through its `probe_size` rarest trigrams only, so each lookup reads a few short posting
+    lists and scores a handful of files, even on libraries of tens of thousands of files.
+    """
+    def __init__(self, filenames: Iterable[str], probe_size: int = 12):
+        self.filenames = list(filenames)
+        self.keys = [filename_title(filename) for filename in self.filenames]
+        self.probe_size = probe_size
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for file_id, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                self.postings[trigram].append(file_id)
+
+    def candidates(self, title_key: str, limit: int = 3) -> List[int]:
+        known = [trigram for trigram in trigrams(title_key) if trigram in self.postings]
+        rarest = sorted(known, key=lambda trigram: len(self.postings[trigram]))[:self.probe_size]
+        shared = Counter()
+        for trigram in rarest:
+            shared.update(self.postings[trigram])
+        return [file_id for file_id, _ in shared.most_common(limit)]
+
+    def best_match(self, title: str, limit: int = 3) -> Tuple[Optional[str], float]:
+        title_key = match_key(title)
+        best_file, best_score = None, 0.0
+        for file_id in self.candidates(title_key, limit):
+            score = similarity(title_key, self.keys[file_id])
+            if score > best_score:
+                best_file, best_score = self.filenames[file_id], score
+        return best_file, best_score
+
+
+def attachment_filenames(attachments: List[Dict[str, Any]]) -> List[str]:
+    """
+    Returns the PDF file names referenced by Zotero attachments, linked or stored.
+    """
+    names = []
+    for attachment in attachments:
+        if attachment.get("contentType") not in (None, "", "application/pdf"):
+            continue
+        path = attachment.get("path") or attachment.get("filename") or ""
+        path = path.removeprefix("attachments:").removeprefix("storage:")
+        if path:
+            names.append(os.path.basename(path.replace("\\", "/")))
+    return names
+
+
+def match_items(items: List[Dict[str, Any]], filenames: List[str], attachments_fn=None, threshold: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    Links every item to at most one PDF file. Attachment paths recorded in Zotero win when the
+    file exists; the other items are matched by title through the trigram index. Each file is
+    assigned to one item only, to the highest-scoring one.
+    Returns one row per item with title, pdf_name, confidence and method.
+    """
+    by_key = {match_key(filename): filename for filename in filenames}
+    index = TrigramIndex(filenames)
+    proposals = []
+    for item in items:
+        data = item.get("data", item)
+        title = data.get("title") or ""
+        attached = [by_key[match_key(name)] for name in attachment_filenames(attachments_fn(data.get("key")) if attachments_fn else []) if match_key(name) in by_key]
+        if attached:
+            proposals.append((title, attached[0], 1.0, "attachment"))
+        else:
+            filename, score = index.best_match(title)
+            proposals.append((title, filename, score, "title"))
+
+    rows, taken = [], set()
+    for title, filename, score, method in sorted(proposals, key=lambda proposal: proposal[2], reverse=True):
+        if filename is None or score < threshold or filename in taken:
+            rows.append({"title": title, "pdf_name": "", "confidence": round(score, 3), "method": "unmatched"})
+            continue
+        taken.add(filename)
+        rows.append({"title": title, "pdf_name": filename, "confidence": round(score, 3), "method": method})
+    return sorted(rows, key=lambda row: row["title"])
+
+
+def write_matches(rows: List[Dict[str, Any]], output_path: str):
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["title", "pdf_name", "confidence", "method"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_library(csv_path: str):
+    """
+    Reads a matches CSV. Files written by this module are UTF-8; older ones were saved as
+    Windows-1252. Rows carried over from the hand-curated mapping have the 'manual' method.
+    """
+    import pandas as pd
+
+    try:
+        return pd.read_csv(csv_path, encoding="utf-8").fillna({"pdf_name": ""})
+    except UnicodeDecodeError:
+        return pd.read_csv(csv_path, encoding="windows-1252").fillna({"pdf_name": ""})
+
+
+_directory_listings: Dict[str, Dict[str, str]] = {}
+
+
+def resolve_pdf_path(pdf_directory: str, pdf_name: str) -> str:
+    """
+    Returns the path of a PDF in the library folder. When the exact name does not exist (for
+    instance a curly apostrophe or an en dash lost in the CSV encoding), the file whose
+    normalized name is the same is used instead.
+    """
+    filepath = os.path.join(pdf_directory, pdf_name)
+    if not pdf_name or os.path.isfile(filepath):
+        return filepath
+    if pdf_directory not in _directory_listings:
+        _directory_listings[pdf_directory] = {
+            match_key(name): name for name in os.listdir(pdf_directory) if name.lower().endswith(".pdf")
+        } if os.path.isdir(pdf_directory) else {}
+    match = _directory_listings[pdf_directory].get(match_key(pdf_name))
+    return os.path.join(pdf_directory, match) if match else filepath
+
+
+def library_pdfs(library, pdf_directory: str) -> List[Dict[str, str]]:
+    """
+    Returns the title, resolved file path and file name of every library row with a PDF,
+    one per file: when several titles are matched to the same PDF, the first one is kept.
+    """
+    pdfs: Dict[str, Dict[str, str]] = {}
+    for _, row in library.iterrows():
+        if not row['pdf_name']:
+            continue
+        filepath = resolve_pdf_path(pdf_directory, row['pdf_name'])
+        if filepath in pdfs:
+            logging.info(f"'{row['title']}' shares its PDF with '{pdfs[filepath]['title']}', skipping it")
+            continue
+        pdfs[filepath] = {"title": row['title'], "filepath": filepath, "pdf_name": os.path.basename(filepath)}
+    return list(pdfs.values())
+
+
+def main():
+    from src.data.zotero_integration import ZoteroStore, pull_from_zotero
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf-directory", default=os.getenv("PDF_DIRECTORY", ""))
+    parser.add_argument("--collection", default="SVUM4G2M", help="Zotero collection key; empty for the whole library")
+    parser.add_argument("--output", default=LIBRARY_CSV)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    filenames = [name for name in os.listdir(args.pdf_directory) if name.lower().endswith(".pdf")]
+    store = ZoteroStore()
+    items = pull_from_zotero(args.collection or None, store=store)
+
+    start = time.perf_counter()
+    rows = match_items(items, filenames, attachments_fn=store.attachments, threshold=args.threshold)
+    elapsed = time.perf_counter() - start
+    write_matches(rows, args.output)
+
+    methods = Counter(row["method"] for row in rows)
+    low_confidence = [row for row in rows if row["method"] == "title" and row["confidence"] < 0.7]
+    logging.info(
+        f"Matched {len(items)} items against {len(filenames)} PDFs in {elapsed:.2f}s: "
+        f"{methods['attachment']} by attachment, {methods['title']} by title, {methods['unmatched']} unmatched"
+    )
+    for row in low_confidence:
+        logging.warning(f"Low confidence match ({row['confidence']:.2f}): {row['title'][:60]} -> {row['pdf_name']}")
+    logging.info(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class SemanticQueryCache():
+    """
+    In-memory cache of retrieval results. A new query is served from the cache when its text
+    matches a cached query exactly (no embedding needed) or when its embedding is within
+    `similarity_threshold` cosine similarity of a cached one with the same search options.
+    Entries expire after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and everything is dropped when `generation_fn()` reports that the
+    collection changed since the entries were stored.
+    """
+    def __init__(
+        self,
+        similarity_threshold: Optional[float] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        generation_fn: Optional[Callable[[], int]] = None,
+    ):
+        self.similarity_threshold = similarity_threshold or float(os.getenv("QUERY_CACHE_THRESHOLD", "0.95"))
+        self.ttl = ttl or float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+        self.generation_fn = generation_fn
+        self.generation = generation_fn() if generation_fn else 0
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_generation(self):
+        if self.generation_fn is None:
+            return
+        generation = self.generation_fn()
+        if generation != self.generation:
+            logging.info(f"Collection changed (generation {self.generation} -> {generation}), clearing the query cache")
+            self.entries.clear()
+            self.generation = generation
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if now - entry["stored_at"] > self.ttl]:
+            del self.entries[key]
+
+    def lookup_text(self, query: str, options_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached entry for an identical query text, without needing an embedding.
+        """
+        self._check_generation()
+        self._expire()
+        entry = self.entries.get((normalize_query(query), options_key))
+        if entry is not None:
+            self.entries.move_to_end((normalize_query(query), options_key))
+            self.hits += 1
+        return entry
+
+    def lookup_embedding(self, embedding: List[float], options_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached entry whose query embedding is the most similar one above the threshold.
+        """
+        candidates = [(key, entry) for key, entry in self.entries.items() if key[1] == options_key]
+        if not candidates:
+            self.misses += 1
+            return None
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        matrix = np.stack([entry["embedding"] for _, entry in candidates])
+        similarities = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            self.misses += 1
+            return None
+        key, entry = candidates[best]
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, query: str, options_key: str, embedding: List[float], result: Any):
+        self.entries[(normalize_query(query), options_key)] = {
+            "embedding": np.asarray(embedding, dtype=np.float32),
+            "result": result,
+            "stored_at": time.monotonic(),
+        }
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": len(self.entries)}
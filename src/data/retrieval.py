@@ -0,0 +1,180 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from qdrant_client import models
+
+from src.data.collection_profiles import get_profile, search_params
+from src.data.metadata_filters import to_qdrant_filter
+from src.data.query_cache import SemanticQueryCache
+from src.tracing import span
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+
+
+def fuse_results(vector_results: List[Dict[str, Any]], lexical_results: List[Dict[str, Any]], alpha: float, limit: int) -> List[Dict[str, Any]]:
+    """
+    Fuses vector and BM25 results with a weighted sum of their min-max normalized scores;
+    `alpha` is the weight of the vector score.
+    """
+    def normalized(results):
+        if not results:
+            return {}
+        scores = [result["score"] for result in results]
+        low, high = min(scores), max(scores)
+        return {result["id"]: (result["score"] - low) / (high - low) if high > low else 1.0 for result in results}
+
+    vector_scores, lexical_scores = normalized(vector_results), normalized(lexical_results)
+    documents = {result["id"]: result for result in lexical_results + vector_results}
+    fused = []
+    for chunk_id, document in documents.items():
+        score = alpha * vector_scores.get(chunk_id, 0.0) + (1 - alpha) * lexical_scores.get(chunk_id, 0.0)
+        fused.append({**document, "score": score})
+    return sorted(fused, key=lambda document: document["score"], reverse=True)[:limit]
+
+
+class KnowledgeRetriever():
+    """
+    Retrieval over the Qdrant collection behind the knowledge base, usable as an agno
+    `knowledge_retriever`. Results for repeated or near-identical questions are served from
+    a semantic query cache instead of embedding and searching again.
+    With a BM25 index, `search_mode` can be 'hybrid' (vector and lexical scores fused) or
+    'lexical', a fast path that needs no embedding call. It defaults to RETRIEVAL_MODE.
+    Vector searches use the search-time parameters of the collection profile.
+    With a `packer` (see context_packing), calls made by the agent over-fetch candidates and
+    return them deduplicated, diversified and packed into the context token budget.
+    With a `paper_index` (see paper_index), vector and hybrid searches are coarse-to-fine: the
+    query first picks the `top_papers` most relevant papers (RETRIEVAL_TOP_PAPERS, 0 for flat
+    search) and only their chunks are searched.
+    """
+    def __init__(
+        self,
+        vector_db: Any,
+        max_results: int = 50,
+        query_cache: Optional[SemanticQueryCache] = None,
+        lexical_index: Any = None,
+        search_mode: Optional[str] = None,
+        hybrid_alpha: Optional[float] = None,
+        collection_profile: Optional[str] = None,
+        packer: Any = None,
+        paper_index: Any = None,
+        top_papers: Optional[int] = None,
+    ):
+        self.vector_db = vector_db
+        self.packer = packer
+        self.paper_index = paper_index
+        self.top_papers = top_papers if top_papers is not None else int(os.getenv("RETRIEVAL_TOP_PAPERS", "8"))
+        self.max_results = max_results
+        self.query_cache = query_cache
+        self.lexical_index = lexical_index
+        self.search_mode = search_mode or os.getenv("RETRIEVAL_MODE", "hybrid")
+        self.hybrid_alpha = hybrid_alpha if hybrid_alpha is not None else float(os.getenv("HYBRID_ALPHA", "0.5"))
+        self.search_params = search_params(get_profile(collection_profile))
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{self.search_mode}', expected one of {SEARCH_MODES}")
+
+    def __call__(self, query: str, num_documents: Optional[int] = None, filters: Optional[Dict[str, Any]] = None, **kwargs) -> Optional[List[Dict[str, Any]]]:
+        if self.packer is None:
+            return self.search(query, num_documents=num_documents, filters=filters)
+        results = self.search(query, num_documents=max(self.packer.candidates, num_documents or 0), filters=filters)
+        return self.packer.pack(results, limit=num_documents)
+
+    def _vector_search(self, embedding: List[float], limit: int, filters: Optional[Dict[str, Any]], names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        query_filter = to_qdrant_filter(filters)
+        if names is not None:
+            # Deduplicated chunks list every document they appear in as 'sources'.
+            query_filter = models.Filter(must=[
+                *(query_filter.must if query_filter else []),
+                models.Filter(should=[
+                    models.FieldCondition(key="name", match=models.MatchAny(any=names)),
+                    models.FieldCondition(key="sources", match=models.MatchAny(any=names)),
+                ]),
+            ])
+        response = self.vector_db.client.query_points(
+            collection_name=self.vector_db.collection,
+            query=embedding,
+            limit=limit,
+            query_filter=query_filter,
+            search_params=self.search_params,
+            with_payload=True,
+        )
+        return [
+            {
+                "id": str(point.id),
+                "name": point.payload.get("name"),
+                "content": point.payload.get("content"),
+                "meta_data": point.payload.get("meta_data", {}),
+                "score": point.score,
+            }
+            for point in response.points
+            if point.payload is not None
+        ]
+
+    def search(
+        self,
+        query: str,
+        num_documents: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        search_mode: Optional[str] = None,
+        top_papers: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the chunks most relevant to the query as dictionaries with id, name, content,
+        meta_data and score. `filters` restrict the search to chunks whose meta_data match, for
+        instance {"year": {"gte": 2023}, "creators": "karras"}; see `metadata_filters`.
+        `top_papers` overrides the number of papers picked by the coarse stage (0 for flat search).
+        """
+        limit = num_documents or self.max_results
+        search_mode = search_mode or self.search_mode
+        if search_mode != "vector" and not self.lexical_index:
+            search_mode = "vector"
+        top_papers = top_papers if top_papers is not None else self.top_papers
+        # The coarse stage reuses the query embedding, so the lexical fast path stays flat.
+        if self.paper_index is None or search_mode == "lexical":
+            top_papers = 0
+        with span("retrieval", mode=search_mode, limit=limit, filtered=bool(filters), top_papers=top_papers) as s:
+            results = self._search(query, limit, filters, search_mode, top_papers)
+            s.add(items=len(results), papers=len({result["name"] for result in results}))
+        return results
+
+    def _search(self, query: str, limit: int, filters: Optional[Dict[str, Any]], search_mode: str, top_papers: int = 0) -> List[Dict[str, Any]]:
+        if search_mode == "lexical":
+            results = self.lexical_index.search(query, limit=limit, filters=filters)
+            logging.info(f"Found {len(results)} documents (lexical)")
+            return results
+
+        options_key = json.dumps({"limit": limit, "filters": filters or {}, "mode": search_mode, "top_papers": top_papers}, sort_keys=True, default=str)
+
+        if self.query_cache is not None:
+            cached = self.query_cache.lookup_text(query, options_key)
+            if cached is not None:
+                logging.info(f"Query cache hit (exact) for '{query}'")
+                return cached["result"]
+
+        with span("embed", items=1, bytes=len(query)):
+            embedding = self.vector_db.embedder.get_embedding(query)
+        if self.query_cache is not None:
+            cached = self.query_cache.lookup_embedding(embedding, options_key)
+            if cached is not None:
+                logging.info(f"Query cache hit (semantic) for '{query}'")
+                return cached["result"]
+
+        names = None
+        if top_papers:
+            # Without a paper collection (or a matching paper), the search falls back to flat.
+            names = [paper["name"] for paper in self.paper_index.search(embedding, top_papers, filters)] or None
+        results = self._vector_search(embedding, limit, filters, names)
+        if search_mode == "hybrid":
+            lexical_results = self.lexical_index.search(query, limit=limit, filters=filters, names=names)
+            results = fuse_results(results, lexical_results, self.hybrid_alpha, limit)
+        if self.query_cache is not None:
+            self.query_cache.store(query, options_key, embedding, results)
+        logging.info(f"Found {len(results)} documents")
+        return results
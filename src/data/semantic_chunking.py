@@ -0,0 +1,68 @@
+"""
+Semantic chunking whose sentence embeddings go through the persistent embedding cache.
+
+agno's SemanticChunking hands chonkie an embedding function or embedder object only when
+chonkie's SemanticChunker accepts one; current chonkie versions accept neither and get the
+model id instead, so chonkie embeds every sentence with its own client, bypassing the cache.
+Here chonkie receives its own embeddings interface, backed by a CachedEmbedder.
+"""
+from typing import Any, List, Optional
+
+import numpy as np
+from agno.knowledge.chunking.semantic import SemanticChunking
+from chonkie.embeddings import BaseEmbeddings
+
+from src.data.embedding_cache import CachedEmbedder
+
+
+class CachedChonkieEmbeddings(BaseEmbeddings):
+    """
+    chonkie embeddings backed by a CachedEmbedder. Chunk sizes are counted with tiktoken's
+    cl100k_base encoding when it is available and in words otherwise.
+    """
+    def __init__(self, embedder: CachedEmbedder):
+        super().__init__()
+        self.embedder = embedder
+
+    def embed(self, text: str) -> np.ndarray:
+        return np.asarray(self.embedder.get_embedding(text), dtype=np.float32)
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        if not texts:
+            return []
+        return list(np.asarray(self.embedder.get_embeddings(texts), dtype=np.float32))
+
+    @property
+    def dimension(self) -> int:
+        return self.embedder.dimensions
+
+    def get_tokenizer(self) -> Any:
+        try:
+            import tiktoken
+
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken is missing, or cannot download the encoding (offline)
+            return "word"
+
+    def __repr__(self) -> str:
+        return f"CachedChonkieEmbeddings(model={self.embedder.id})"
+
+
+class CachedSemanticChunking(SemanticChunking):
+    """
+    SemanticChunking with a CachedEmbedder (a default one when `embedder` is None) that chonkie
+    actually uses.
+    """
+    def __init__(self, embedder: Optional[CachedEmbedder] = None, chunk_size: int = 5000, similarity_threshold: float = 0.5):
+        super().__init__(embedder=embedder or CachedEmbedder(), chunk_size=chunk_size, similarity_threshold=similarity_threshold)
+
+    def _initialize_chunker(self):
+        if self.chunker is None:
+            from chonkie import SemanticChunker
+
+            self.chunker = SemanticChunker(
+                embedding_model=CachedChonkieEmbeddings(self.embedder),
+                chunk_size=self.chunk_size,
+                threshold=self.similarity_threshold,
+            )
@@ -1,70 +1,247 @@
 import os
+import uuid
 import logging
+import itertools
+import threading
 import time
-import pandas as pd
 from dotenv import load_dotenv
-from qdrant_client import models
-from typing import List, Dict, Any
-from src.data.zotero_integration import pull_from_zotero
-
-from agno.vectordb.qdrant import Qdrant
-from agno.db.postgres import PostgresDb
-from agno.knowledge.knowledge import Knowledge
-from agno.knowledge.reader.pdf_reader import PDFReader
-from agno.knowledge.chunking.semantic import SemanticChunking
+from qdrant_client import QdrantClient, models
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, List, Dict, Any, Optional
+from src.data.bm25_index import build_from_collection
+from src.data.embedding_cache import CachedEmbedder
+from src.data.collection_profiles import create_collection, create_payload_indexes, get_profile, migrate_collection, search_params
+from src.tracing import span
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "master_literature_review")
+# A directory here runs Qdrant in local mode instead of connecting to QDRANT_URL.
+QDRANT_PATH = os.getenv("QDRANT_PATH")
+POSTGRES_DB_URL = os.getenv("POSTGRES_DB_URL", "postgresql+psycopg://ai:ai@localhost:5532/ai")
+
+
+POINT_ID_NAMESPACE = uuid.UUID("6f1c1b52-3c1e-4d4e-9a53-0c2f7c1e8b90")
+
+
+def point_id(document_hash: str, chunk_index: int) -> str:
+    """
+    Deterministic point id for a chunk, so re-upserting a document overwrites its points.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{document_hash}:{chunk_index}"))
+
 
 class QdrantTools:
-    def __init__(self, collection_name: str, qdrant_host: str, qdrant_port: int, embedder: Any = None):
+    def __init__(self, collection_name: str, qdrant_host: str, qdrant_port: int, embedder: Any = None, profile: Optional[str] = None):
         self.collection_name = collection_name
-        self.qdrant_client = Qdrant(host=qdrant_host, port=qdrant_port)
-        self.embedder = embedder
+        self.profile = get_profile(profile)
+        self.qdrant_host = qdrant_host
+        self.qdrant_port = qdrant_port
+        self.qdrant_client = QdrantClient(host=qdrant_host, port=qdrant_port)
+        self.embedder = embedder if embedder is None or isinstance(embedder, CachedEmbedder) else CachedEmbedder(embedder=embedder)
+        self._local = threading.local()
         self._create_collection_if_not_exists()
 
     def _create_collection_if_not_exists(self):
         collections = self.qdrant_client.get_collections().collections
         if self.collection_name not in [c.name for c in collections]:
-            logging.info(f"Creating Qdrant collection: {self.collection_name}")
-            self.qdrant_client.recreate_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(size=self.embedder.dimensions, distance=models.Distance.COSINE),
-            )
+            create_collection(self.qdrant_client, self.collection_name, self.embedder.dimensions, self.profile)
         else:
             logging.info(f"Qdrant collection '{self.collection_name}' already exists.")
 
-    def upsert_vectors(self, points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def migrate(self, profile: str, wait_ready: bool = True):
+        """
+        Re-tunes the existing collection to another profile (quantization, on-disk storage, HNSW).
+        """
+        self.profile = get_profile(profile)
+        migrate_collection(self.qdrant_client, self.collection_name, self.profile, wait_ready=wait_ready)
+
+    def search(self, vector: List[float], limit: int = 10, query_filter: Optional[models.Filter] = None) -> List[models.ScoredPoint]:
+        """
+        Searches the collection with the search-time parameters (ef, rescoring) of the profile.
+        """
+        return self.qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=limit,
+            query_filter=query_filter,
+            search_params=search_params(self.profile),
+            with_payload=True,
+        ).points
+
+    def _thread_client(self) -> QdrantClient:
+        # One connection per upload thread, so batches are sent in parallel.
+        if not hasattr(self._local, "client"):
+            self._local.client = QdrantClient(host=self.qdrant_host, port=self.qdrant_port)
+        return self._local.client
+
+    @staticmethod
+    def _to_point_struct(point: Dict[str, Any]) -> models.PointStruct:
+        if point.get("id") is not None:
+            id_ = point["id"]
+        elif point.get("document_hash") is not None and point.get("chunk_index") is not None:
+            id_ = point_id(point["document_hash"], point["chunk_index"])
+        else:
+            raise ValueError("Each point needs an 'id' or a 'document_hash' and 'chunk_index'")
+        return models.PointStruct(id=id_, vector=point["vector"], payload=point["payload"])
+
+    def _send_batch(self, batch: List[models.PointStruct], wait: bool = False):
+        self._thread_client().upsert(collection_name=self.collection_name, points=batch, wait=wait)
+
+    def bulk_upsert(self, points: Iterable[Dict[str, Any]], batch_size: int = 256, parallel: int = 4) -> Dict[str, Any]:
+        """
+        Streams points into the collection in fixed-size batches over `parallel` connections.
+        Batches are written without waiting for indexing, and at most 2 * `parallel` batches are
+        held in memory, so any number of points can come from a generator. A final waited write
+        of the last batch acts as a consistency barrier, since Qdrant applies operations in order.
+        Args:
+            points: An iterable of dictionaries with 'vector', 'payload' and either an 'id' or a
+                    'document_hash' and 'chunk_index' from which a deterministic id is derived.
+        Returns the number of points, batches and the throughput in points per second.
+        """
+        with span("qdrant_upsert", collection=self.collection_name) as s:
+            stats = self._bulk_upsert(points, batch_size, parallel)
+            s.add(items=stats["points"], batches=stats["batches"])
+        return stats
+
+    def _bulk_upsert(self, points: Iterable[Dict[str, Any]], batch_size: int, parallel: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        iterator = iter(points)
+        total = 0
+        batches = 0
+        last_batch = None
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            while True:
+                batch = [self._to_point_struct(point) for point in itertools.islice(iterator, batch_size)]
+                if not batch:
+                    break
+                if len(in_flight) >= 2 * parallel:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(pool.submit(self._send_batch, batch))
+                total += len(batch)
+                batches += 1
+                last_batch = batch
+            for future in in_flight:
+                future.result()
+
+        if last_batch is not None:
+            self._send_batch(last_batch, wait=True)
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "status": "success",
+            "points": total,
+            "batches": batches,
+            "elapsed_seconds": elapsed,
+            "points_per_sec": total / elapsed if elapsed else 0.0,
+        }
+        logging.info(f"Upserted {total} points in {batches} batches ({stats['points_per_sec']:.0f} points/sec)")
+        return stats
+
+    def upsert_vectors(self, points: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Upserts vectors (embeddings) and their associated payloads into the Qdrant collection.
         Args:
-            points: A list of dictionaries, each representing a point to upsert.
-                    Each dictionary should have 'vector' (list of floats) and 'payload' (dict).
+            points: An iterable of dictionaries, each representing a point to upsert.
+                    Each dictionary should have 'vector' (list of floats), 'payload' (dict) and
+                    either an 'id' or a 'document_hash' and 'chunk_index'.
         """
-        qdrant_points = [
-            models.PointStruct(
-                vector=point["vector"],
-                payload=point["payload"]
-            )
-            for point in points
-        ]
-        operation_info = self.qdrant_client.upsert(
-            collection_name=self.collection_name,
+        return self.bulk_upsert(points)
+
+    def upsert_texts(self, texts: Iterable[str], payloads: Iterable[Dict[str, Any]], document_hash: str) -> Dict[str, Any]:
+        """
+        Embeds the chunk texts of a document through the cached embedder, in batches and without
+        repeating identical texts, and upserts them with their payloads.
+        """
+        def embedded_points():
+            chunks = enumerate(zip(texts, payloads))
+            while True:
+                batch = list(itertools.islice(chunks, self.embedder.batch_size))
+                if not batch:
+                    return
+                with span("embed", items=len(batch)) as s:
+                    embeddings = self.embedder.get_embeddings([text for _, (text, _) in batch])
+                    s.add(bytes=sum(len(text) for _, (text, _) in batch))
+                for (chunk_index, (_, payload)), embedding in zip(batch, embeddings):
+                    yield {"vector": embedding, "payload": payload, "document_hash": document_hash, "chunk_index": chunk_index}
+
+        return self.bulk_upsert(embedded_points())
+
+def backfill_zotero_payloads(vector_db: Any, metadata_by_name: Dict[str, Dict[str, Any]], lexical_index: Any = None) -> int:
+    """
+    Writes the flattened Zotero fields into the meta_data of chunks ingested before they
+    existed, matching chunks to items by document name. Returns the number of documents updated.
+    """
+    if not metadata_by_name:
+        return 0
+    missing = models.Filter(must=[
+        models.IsEmptyCondition(is_empty=models.PayloadField(key="meta_data.item_key")),
+        models.FieldCondition(key="name", match=models.MatchAny(any=list(metadata_by_name))),
+    ])
+    if not vector_db.client.count(collection_name=vector_db.collection, count_filter=missing).count:
+        return 0
+
+    for name, metadata in metadata_by_name.items():
+        vector_db.client.set_payload(
+            collection_name=vector_db.collection,
+            payload=metadata,
+            key="meta_data",
+            points=models.Filter(must=[models.FieldCondition(key="name", match=models.MatchValue(value=name))]),
             wait=True,
-            points=qdrant_points
         )
-        logging.info(f"Qdrant upsert operation: {operation_info}")
-        return {"status": "success", "operation_info": operation_info.dict()}
+    if lexical_index is not None:
+        build_from_collection(vector_db, lexical_index)
+    logging.info(f"Backfilled Zotero metadata of {len(metadata_by_name)} documents")
+    return len(metadata_by_name)
+
+_local_clients: Dict[str, QdrantClient] = {}
+_local_clients_lock = threading.Lock()
+
+
+def _local_client(path: str) -> QdrantClient:
+    # Local mode locks its storage directory, so all collections share one client per path.
+    with _local_clients_lock:
+        if path not in _local_clients:
+            _local_clients[path] = QdrantClient(path=path)
+        return _local_clients[path]
 
-def load_database(pdf_directory: str, skip_add=False):
-    COLLECTION_NAME = "master_literature_review"
+def connect_vector_db(collection_name: Optional[str] = None):
+    """
+    Returns the agno Qdrant handle of a collection, the knowledge base one by default. The
+    client connects on first use, and nothing else (Zotero, the library CSV, the PDF stack) is loaded.
+    """
+    from agno.vectordb.qdrant import Qdrant
 
-    vector_db = Qdrant(collection=COLLECTION_NAME, url="http://localhost:6333")
+    if QDRANT_PATH:
+        vector_db = Qdrant(collection=collection_name or QDRANT_COLLECTION, path=QDRANT_PATH, embedder=CachedEmbedder())
+        vector_db._client = _local_client(QDRANT_PATH)
+        return vector_db
+    return Qdrant(collection=collection_name or QDRANT_COLLECTION, url=QDRANT_URL, embedder=CachedEmbedder())
+
+def load_database(pdf_directory: str, skip_add=False, parallel=False, parse_workers=None, upsert_workers=4, max_retries=3):
+    from agno.db.postgres import PostgresDb
+    from agno.knowledge.knowledge import Knowledge
+    from src.data.zotero_integration import ZoteroStore, pull_from_zotero, flatten_zotero_item
+    from src.data.ingestion import IngestionPipeline
+    from src.data.ingest_manifest import IngestManifest
+    from src.data.bm25_index import BM25Index
+    from src.data.pdf_matcher import LIBRARY_CSV, library_pdfs, load_library
+    from src.data.paper_index import build_paper_index
+    from src.data.chunk_dedup import ChunkDeduplicator
+
+    vector_db = connect_vector_db()
+    if not vector_db.exists():
+        create_collection(vector_db.client, vector_db.collection, vector_db.embedder.dimensions)
+    create_payload_indexes(vector_db.client, vector_db.collection)
 
     contents_db = PostgresDb(
-        db_url="postgresql+psycopg://ai:ai@localhost:5532/ai",
+        db_url=POSTGRES_DB_URL,
         knowledge_table="knowledge_contents",
     )
 
@@ -75,28 +252,36 @@ def load_database(pdf_directory: str, skip_add=False):
         contents_db=contents_db,
         max_results=50
     )
+    if skip_add:
+        return knowledge
 
-    library = pd.read_csv('/home/mlevi/Work/research-assistant/src/data/zotero_pdf_matches.csv', encoding='windows-1252')
-    articles_metadata = pull_from_zotero()
-
-    if not skip_add:
-        for i, row in library.iterrows():
-            title = row['title']
-            pdf_name = row['pdf_name']
-            if pdf_name:
-                filepath = os.path.join(pdf_directory, pdf_name)
-                try:
-                    knowledge.add_content(
-                        name=title,
-                        path=filepath,
-                        metadata=articles_metadata[i],
-                        reader=PDFReader(
-                            name="Semantic Chunking Reader",
-                            chunking_strategy=SemanticChunking(similarity_threshold=0.5),
-                        ),
-                        skip_if_exists=True
-                    )
-                except Exception as e:
-                    logging.error(f"Error on Add Knowledge: {e}")
-                    time.sleep(5)
-    return knowledge
\ No newline at end of file
+    library = load_library(LIBRARY_CSV)
+    zotero_store = ZoteroStore()
+    pull_from_zotero(store=zotero_store)
+    articles_metadata = {}
+    for _, row in library.iterrows():
+        item = zotero_store.find_by_title(row['title'])
+        if item is None:
+            logging.warning(f"No Zotero item found for '{row['title']}'")
+        articles_metadata[row['title']] = flatten_zotero_item(item) if item else {}
+
+    # The serial ingest is the same pipeline with one worker per stage, so both go through the
+    # ingest manifest: replaced PDFs are re-indexed and removed ones are deleted.
+    jobs = [
+        {"name": pdf["title"], "filepath": pdf["filepath"], "metadata": articles_metadata[pdf["title"]]}
+        for pdf in library_pdfs(library, pdf_directory)
+    ]
+    deduplicator = ChunkDeduplicator()
+    pipeline = IngestionPipeline(
+        vector_db,
+        parse_workers=parse_workers if parallel else 1,
+        upsert_workers=upsert_workers if parallel else 1,
+        max_retries=max_retries,
+        manifest=IngestManifest(),
+        lexical_index=BM25Index(),
+        deduplicator=deduplicator if deduplicator.threshold > 0 else None,
+    )
+    pipeline.run(jobs)
+    backfill_zotero_payloads(vector_db, {job["name"]: job["metadata"] for job in jobs if job["metadata"]}, pipeline.lexical_index)
+    build_paper_index(library=library, zotero_store=zotero_store, pdf_directory=pdf_directory)
+    return knowledge
@@ -1,4 +1,14 @@
 import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from pyzotero import zotero
 import logging
@@ -9,6 +19,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 ZOTERO_USER_ID = os.getenv('ZOTERO_USER_ID')
 ZOTERO_API_KEY = os.getenv('ZOTERO_API_KEY')
+ZOTERO_API_URL = os.getenv('ZOTERO_API_URL', 'https://api.zotero.org')
 
 def get_zotero_client(group_id=None):
     """
@@ -51,10 +62,275 @@ def get_articles_metadata(zot, collection_id=None, limit=100):
         logging.error(f"Error fetching articles metadata from Zotero: {e}")
         return []
 
-def pull_from_zotero(collection_id="SVUM4G2M"):
-    zot = get_zotero_client()
-    articles_metadata = get_articles_metadata(zot, collection_id=collection_id, limit=106)
-    return articles_metadata
+def flatten_zotero_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flattens a Zotero item into the typed fields stored in the chunk payloads and indexed in
+    Qdrant: year, creators (lowercase last names), item_type, tags, collections and item_key,
+    plus a few display fields.
+    """
+    data = item.get('data', item)
+    date = (item.get('meta') or {}).get('parsedDate') or data.get('date') or ''
+    year = re.search(r'\b(\d{4})\b', date)
+    creators = [creator.get('lastName') or creator.get('name') or '' for creator in data.get('creators', [])]
+    return {
+        'item_key': data.get('key') or item.get('key'),
+        'item_type': data.get('itemType'),
+        'title': data.get('title'),
+        'year': int(year.group(1)) if year else None,
+        'creators': [creator.lower() for creator in creators if creator],
+        'authors': '; '.join(
+            f"{creator.get('lastName', '')}, {creator.get('firstName', '')}".strip(', ') if 'lastName' in creator else creator.get('name', '')
+            for creator in data.get('creators', [])
+        ),
+        'tags': [tag['tag'].lower() for tag in data.get('tags', []) if tag.get('tag')],
+        'collections': list(data.get('collections', [])),
+        'venue': data.get('publicationTitle') or data.get('proceedingsTitle') or data.get('conferenceName'),
+        'doi': data.get('DOI'),
+    }
+
+def normalize_title(title: str) -> str:
+    return re.sub(r'[^a-z0-9]+', ' ', (title or '').lower()).strip()
+
+# Regular library items, as opposed to child attachments and notes.
+TOP_LEVEL_CONDITION = "parent_key IS NULL AND item_type NOT IN ('attachment', 'note')"
+# Version of the store layout, bumped when columns are added (see ZoteroStore._migrate).
+STORE_SCHEMA_VERSION = 2
+
+class ZoteroStore():
+    """
+    Local SQLite copy of the Zotero library, keyed by item key, together with the library
+    version it was synced at. All metadata lookups are served from here.
+    """
+    def __init__(self, store_path: Optional[str] = None):
+        self.store_path = store_path or os.getenv('ZOTERO_STORE_PATH', 'zotero_store.sqlite')
+        if os.path.dirname(self.store_path):
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.store_path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                title TEXT,
+                normalized_title TEXT,
+                item_type TEXT,
+                parent_key TEXT,
+                item TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS items_normalized_title ON items (normalized_title);
+            CREATE TABLE IF NOT EXISTS item_collections (
+                key TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                PRIMARY KEY (collection, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._migrate()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_parent_key ON items (parent_key)")
+        self.conn.commit()
+
+    def _migrate(self):
+        """
+        Upgrades a store written by an older version. Version 1 had no item_type and parent_key
+        columns and did not sync attachments: the columns are added and filled from the stored
+        items, and the library versions are reset so that the next sync fetches everything,
+        attachments included, instead of only what changed since.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        columns = {column[1] for column in self.conn.execute("PRAGMA table_info(items)")}
+        if row is None and {"item_type", "parent_key"} <= columns and not self.conn.execute("SELECT 1 FROM meta LIMIT 1").fetchone():
+            # A new store.
+            self.conn.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(STORE_SCHEMA_VERSION),))
+            return
+        if row is not None and int(row[0]) >= STORE_SCHEMA_VERSION:
+            return
+        logging.info(f"Migrating Zotero store {self.store_path} to schema version {STORE_SCHEMA_VERSION}")
+        for column in ("item_type", "parent_key"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE items ADD COLUMN {column} TEXT")
+        for key, item in self.conn.execute("SELECT key, item FROM items").fetchall():
+            data = json.loads(item).get('data', {})
+            self.conn.execute("UPDATE items SET item_type = ?, parent_key = ? WHERE key = ?", (data.get('itemType'), data.get('parentItem'), key))
+        self.conn.execute("DELETE FROM meta WHERE key LIKE 'version:%'")
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(STORE_SCHEMA_VERSION),))
+
+    def library_version(self, library: str) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (f"version:{library}",)).fetchone()
+        return int(row[0]) if row else 0
+
+    def set_library_version(self, library: str, version: int):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"version:{library}", str(version)))
+            self.conn.commit()
+
+    def upsert(self, items: List[Dict[str, Any]]):
+        with self.lock:
+            for item in items:
+                data = item.get('data', {})
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        item['key'], item.get('version', 0), data.get('title'), normalize_title(data.get('title')),
+                        data.get('itemType'), data.get('parentItem'), json.dumps(item),
+                    ),
+                )
+                self.conn.execute("DELETE FROM item_collections WHERE key = ?", (item['key'],))
+                self.conn.executemany(
+                    "INSERT INTO item_collections VALUES (?, ?)", [(item['key'], collection) for collection in data.get('collections', [])]
+                )
+            self.conn.commit()
+
+    def delete(self, keys: List[str]):
+        with self.lock:
+            for key in keys:
+                self.conn.execute("DELETE FROM items WHERE key = ?", (key,))
+                self.conn.execute("DELETE FROM item_collections WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT item FROM items WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_title(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the item whose title matches, ignoring case and punctuation.
+        """
+        row = self.conn.execute(
+            f"SELECT item FROM items WHERE normalized_title = ? AND {TOP_LEVEL_CONDITION}", (normalize_title(title),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self, collection_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if collection_id:
+            rows = self.conn.execute(
+                f"SELECT i.item FROM items i JOIN item_collections c ON c.key = i.key WHERE c.collection = ? AND {TOP_LEVEL_CONDITION} ORDER BY i.title",
+                (collection_id,),
+            )
+        else:
+            rows = self.conn.execute(f"SELECT item FROM items WHERE {TOP_LEVEL_CONDITION} ORDER BY title")
+        return [json.loads(row[0]) for row in rows]
+
+    def attachments(self, key: str) -> List[Dict[str, Any]]:
+        """
+        Returns the data of the attachments of an item (linkMode, filename, path, contentType).
+        """
+        rows = self.conn.execute("SELECT item FROM items WHERE parent_key = ? AND item_type = 'attachment'", (key,))
+        return [json.loads(row[0])['data'] for row in rows]
+
+    def __len__(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM items WHERE {TOP_LEVEL_CONDITION}").fetchone()[0]
+
+class ZoteroSync():
+    """
+    Incremental sync of the items and attachments of a Zotero library into a ZoteroStore, using the
+    Zotero web API versioning: only items modified since the stored library version are
+    fetched (`since=`), an unchanged library answers 304 to `If-Modified-Since-Version`, and
+    deleted items are read from the /deleted endpoint. Pages of a large first sync are fetched
+    in parallel. The API base URL is configurable (ZOTERO_API_URL), e.g. for a fake server.
+    """
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        group_id: Optional[str] = None,
+        base_url: Optional[str] = None,
+        store: Optional[ZoteroStore] = None,
+        page_size: int = 100,
+        workers: int = 4,
+        max_retries: int = 5,
+    ):
+        self.api_key = api_key or ZOTERO_API_KEY
+        library_id = group_id or user_id or ZOTERO_USER_ID
+        if not library_id or not self.api_key:
+            raise ValueError("Zotero User ID and API Key must be set in the .env file.")
+        self.library = f"groups/{group_id}" if group_id else f"users/{library_id}"
+        self.base_url = (base_url or ZOTERO_API_URL).rstrip('/')
+        self.store = store if store is not None else ZoteroStore()
+        self.page_size = page_size
+        self.workers = workers
+        self.max_retries = max_retries
+
+    def _request(self, path: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], Any]:
+        url = f"{self.base_url}/{self.library}/{path}?{urllib.parse.urlencode(params)}"
+        request_headers = {"Zotero-API-Key": self.api_key, "Zotero-API-Version": "3", **(headers or {})}
+        for attempt in range(self.max_retries + 1):
+            request = urllib.request.Request(url, headers=request_headers)
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    body = json.loads(response.read().decode('utf-8') or 'null')
+                    return response.status, dict(response.headers), body
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    return 304, dict(e.headers), None
+                if e.code in (429, 503) and attempt < self.max_retries:
+                    delay = float(e.headers.get('Retry-After') or e.headers.get('Backoff') or 2 ** attempt)
+                    logging.warning(f"Zotero API returned {e.code}, retrying in {delay:.0f}s")
+                    time.sleep(delay)
+                    continue
+                raise
+
+    def _fetch_page(self, since: int, start: int, version: int) -> List[Dict[str, Any]]:
+        # If-Unmodified-Since-Version makes Zotero answer 412 if the library changes mid-sync.
+        _, _, items = self._request(
+            "items",
+            {"since": since, "start": start, "limit": self.page_size, "format": "json", "itemType": "-note"},
+            {"If-Unmodified-Since-Version": str(version)},
+        )
+        return items
+
+    def sync(self) -> Dict[str, Any]:
+        """
+        Brings the local store up to date with the library and returns the sync statistics.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._sync_once()
+            except urllib.error.HTTPError as e:
+                if e.code != 412 or attempt == self.max_retries:
+                    raise
+                logging.info("Zotero library changed during the sync, starting over")
+
+    def _sync_once(self) -> Dict[str, Any]:
+        since = self.store.library_version(self.library)
+        headers = {"If-Modified-Since-Version": str(since)} if since else {}
+        status, response_headers, items = self._request(
+            "items", {"since": since, "start": 0, "limit": self.page_size, "format": "json", "itemType": "-note"}, headers
+        )
+        if status == 304:
+            logging.info(f"Zotero library unchanged since version {since}")
+            return {"version": since, "updated": 0, "deleted": 0}
+
+        version = int(response_headers.get('Last-Modified-Version', since))
+        total = int(response_headers.get('Total-Results', len(items)))
+        starts = range(self.page_size, total, self.page_size)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for page in pool.map(lambda start: self._fetch_page(since, start, version), starts):
+                items.extend(page)
+
+        deleted = []
+        if since:
+            _, _, deleted_response = self._request("deleted", {"since": since})
+            deleted = deleted_response.get('items', [])
+
+        self.store.upsert(items)
+        self.store.delete(deleted)
+        self.store.set_library_version(self.library, version)
+        logging.info(f"Synced Zotero library to version {version}: {len(items)} items updated, {len(deleted)} deleted")
+        return {"version": version, "updated": len(items), "deleted": len(deleted)}
+
+def pull_from_zotero(collection_id="SVUM4G2M", store: Optional[ZoteroStore] = None):
+    """
+    Syncs the library into the local store and returns the items of a collection from it.
+    When Zotero is unreachable, the last synced copy is used.
+    """
+    store = store if store is not None else ZoteroStore()
+    try:
+        ZoteroSync(store=store).sync()
+    except (ValueError, OSError) as e:
+        logging.error(f"Zotero sync failed, using the local store ({len(store)} items): {e}")
+    return store.items(collection_id)
 
 if __name__ == '__main__':
     # Example Usage:
@@ -0,0 +1,259 @@
+"""
+Lightweight spans and per-stage metrics for the pipeline.
+
+    with span("llm_call", model=model) as s:
+        response = agent.run(message)
+        s.add(input_tokens=..., output_tokens=...)
+
+Every finished span is aggregated into per-stage latency histograms and counters (tokens,
+bytes, items, retries, errors), appended to a JSONL trace file when TRACE_PATH is set (it
+grows without bound, so it is off by default) and exposed in the Prometheus text format by
+`start_metrics_server`.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Upper bounds in seconds, from sub-millisecond cache hits to multi-minute LLM calls.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+COUNTERS = ("input_tokens", "output_tokens", "bytes", "items", "retries")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span():
+    """
+    A timed stage. Counters from COUNTERS are summed into the stage metrics; any other
+    attribute is only written to the trace.
+    """
+    def __init__(self, stage: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.stage = stage
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = {}
+        self.counters: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.add(**attributes)
+
+    def add(self, **values: Any):
+        for key, value in values.items():
+            if value is None:
+                continue
+            if key in COUNTERS:
+                self.counters[key] = self.counters.get(key, 0) + value
+            else:
+                self.attributes[key] = value
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "stage": self.stage,
+            "start": self.started_at,
+            "duration": self.duration,
+            "error": self.error,
+            **self.counters,
+            **self.attributes,
+        }
+
+
+class StageMetrics():
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.counters = {name: 0.0 for name in COUNTERS}
+
+    def observe(self, span: Span):
+        self.count += 1
+        self.errors += span.error is not None
+        self.total_seconds += span.duration
+        self.buckets[next((i for i, bound in enumerate(LATENCY_BUCKETS) if span.duration <= bound), len(LATENCY_BUCKETS))] += 1
+        for name, value in span.counters.items():
+            self.counters[name] += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates a latency quantile from the histogram (upper bound of the bucket).
+        """
+        if not self.count:
+            return None
+        seen = 0
+        for i, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= q * self.count:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Tracer():
+    """
+    Collects finished spans into per-stage metrics and the JSONL trace file.
+    """
+    def __init__(self, trace_path: Optional[str] = None):
+        self.trace_path = TRACE_PATH if trace_path is None else trace_path
+        self.stages: Dict[str, StageMetrics] = {}
+        self.lock = threading.Lock()
+        self._trace_file = None
+
+    @contextmanager
+    def span(self, stage: str, **attributes: Any) -> Iterator[Span]:
+        current = Span(stage, _current_span.get(), attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except GeneratorExit:
+            current.add(abandoned=True)
+            raise
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator span closed from another context (e.g. an abandoned stream).
+                pass
+            current.duration = time.perf_counter() - current._start
+            self.record(current)
+
+    def record(self, span: Span):
+        with self.lock:
+            self.stages.setdefault(span.stage, StageMetrics()).observe(span)
+            if self.trace_path:
+                if self._trace_file is None:
+                    self._trace_file = open(self.trace_path, 'a', encoding='utf-8', buffering=1)
+                self._trace_file.write(json.dumps(span.to_record(), default=str) + "\n")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-stage summary: count, errors, mean, p50/p95/p99 estimates, histogram and counters.
+        """
+        with self.lock:
+            return {
+                stage: {
+                    "count": metrics.count,
+                    "errors": metrics.errors,
+                    "mean_seconds": metrics.total_seconds / metrics.count if metrics.count else None,
+                    "p50_seconds": metrics.quantile(0.5),
+                    "p95_seconds": metrics.quantile(0.95),
+                    "p99_seconds": metrics.quantile(0.99),
+                    "histogram": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], metrics.buckets)),
+                    **metrics.counters,
+                }
+                for stage, metrics in sorted(self.stages.items())
+            }
+
+    def prometheus_text(self) -> str:
+        lines: List[str] = [
+            "# HELP research_assistant_stage_duration_seconds Duration of pipeline stages.",
+            "# TYPE research_assistant_stage_duration_seconds histogram",
+        ]
+        with self.lock:
+            stages = sorted(self.stages.items())
+            for stage, metrics in stages:
+                cumulative = 0
+                for bound, bucket in zip(list(LATENCY_BUCKETS) + ["+Inf"], metrics.buckets):
+                    cumulative += bucket
+                    lines.append(f'research_assistant_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'research_assistant_stage_duration_seconds_sum{{stage="{stage}"}} {metrics.total_seconds}')
+                lines.append(f'research_assistant_stage_duration_seconds_count{{stage="{stage}"}} {metrics.count}')
+            lines += [
+                "# HELP research_assistant_stage_errors_total Failed stage executions.",
+                "# TYPE research_assistant_stage_errors_total counter",
+            ]
+            lines += [f'research_assistant_stage_errors_total{{stage="{stage}"}} {metrics.errors}' for stage, metrics in stages]
+            for name in COUNTERS:
+                lines += [
+                    f"# HELP research_assistant_stage_{name}_total Sum of {name.replace('_', ' ')} recorded by stage spans.",
+                    f"# TYPE research_assistant_stage_{name}_total counter",
+                ]
+                lines += [f'research_assistant_stage_{name}_total{{stage="{stage}"}} {metrics.counters[name]}' for stage, metrics in stages]
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+def span(stage: str, **attributes: Any):
+    """
+    Opens a span on the process-wide tracer.
+    """
+    return tracer.span(stage, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def token_usage(response: Any) -> Dict[str, Any]:
+    """
+    Input and output token counts of an agno run response, when the model reported them.
+    """
+    metrics = getattr(response, "metrics", None)
+    return {
+        "input_tokens": getattr(metrics, "input_tokens", None) or None,
+        "output_tokens": getattr(metrics, "output_tokens", None) or None,
+    }
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: Optional[int] = None):
+    """
+    Serves /metrics in the Prometheus text format on a background thread, on `port` or
+    METRICS_PORT. Does nothing when neither is set or the server is already running.
+    """
+    global _metrics_server
+    port = port if port is not None else (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None or _metrics_server is not None:
+        return _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = tracer.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Could not start the metrics server on port {port}: {e}")
+        return None
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    logging.info(f"Serving Prometheus metrics on port {port}")
+    return _metrics_server
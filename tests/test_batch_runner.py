@@ -0,0 +1,168 @@
+import os
+import time
+import asyncio
+
+import openai
+import pytest
+
+from benchmarks.stand_ins import FakeOpenAIServer, make_library
+from src.agents.batch_runner import BatchRunner, RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer(chat_latency=0.05, rate_limit_every=2, retry_after=0.01)
+    yield server
+    server.close()
+
+
+def chat_call(server, runner, max_retries=0):
+    client = openai.AsyncOpenAI(api_key="test", base_url=f"{server.url}/v1", max_retries=max_retries)
+
+    async def call(prompt):
+        messages = [{"role": "user", "content": prompt}]
+        return await runner.call(lambda: client.chat.completions.create(model="gpt-5-mini", messages=messages), tokens=10)
+
+    return call
+
+
+def test_token_bucket_paces_after_the_burst():
+    async def main():
+        bucket = TokenBucket(600)
+        await bucket.acquire(600)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire(1)
+        return time.monotonic() - start
+
+    # 600 per minute refill one unit every 0.1s once the initial burst is spent.
+    assert 0.25 <= asyncio.run(main()) < 1.0
+
+
+def test_token_bucket_caps_requests_above_capacity():
+    async def main():
+        bucket = TokenBucket(60)
+        start = time.monotonic()
+        await bucket.acquire(1000)
+        return time.monotonic() - start, bucket.tokens
+
+    elapsed, tokens = asyncio.run(main())
+    assert elapsed < 0.1
+    assert tokens == pytest.approx(0, abs=1)
+
+
+def test_rate_limiter_pause_delays_every_caller():
+    async def main():
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600000)
+        limiter.pause(0.2)
+        start = time.monotonic()
+
+        async def acquire():
+            await limiter.acquire(10)
+            return time.monotonic() - start
+
+        return await asyncio.gather(acquire(), acquire(), acquire())
+
+    assert all(delay >= 0.19 for delay in asyncio.run(main()))
+
+
+def test_run_bounds_concurrency_and_keeps_order():
+    in_flight, peak, finished = 0, 0, []
+
+    async def worker(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        if item == 5:
+            raise ValueError("bad item")
+        return item * 2
+
+    runner = BatchRunner(concurrency=3)
+    results = asyncio.run(runner.run(list(range(10)), worker, on_result=lambda item, result: finished.append(item)))
+
+    assert peak == 3
+    assert results[:5] == [0, 2, 4, 6, 8] and results[6:] == [12, 14, 16, 18]
+    assert isinstance(results[5], ValueError)
+    assert sorted(finished) == list(range(10))
+
+
+def test_call_retries_rate_limits(server):
+    runner = BatchRunner(concurrency=3, base_delay=0.01)
+
+    results = asyncio.run(runner.run([f"question {i}" for i in range(6)], chat_call(server, runner)))
+
+    assert all(result.choices[0].message.content for result in results)
+    # Every second request is rejected, so six answers take eleven requests.
+    assert server.counts["chat_requests"] == 6
+    assert server.counts[429] == 5
+    assert server.counts["max_concurrent_chat"] <= 3
+
+
+def test_call_gives_up_after_max_retries(server):
+    server.rate_limit_every = 1
+    runner = BatchRunner(max_retries=2, base_delay=0.01)
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(chat_call(server, runner)("question"))
+
+    assert server.counts[429] == 3
+    assert server.counts["chat_requests"] == 0
+
+
+def test_call_does_not_retry_other_errors():
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        raise ValueError("not a rate limit")
+
+    with pytest.raises(ValueError):
+        asyncio.run(BatchRunner(base_delay=0.01).call(request, tokens=10))
+
+    assert attempts == 1
+
+
+@pytest.fixture
+def papers(tmp_path, monkeypatch):
+    server = FakeOpenAIServer(chat_latency=0.05, rate_limit_every=3, retry_after=0.01)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+    monkeypatch.setenv("PDF_DIRECTORY", os.path.join(tmp_path, "pdfs"))
+    monkeypatch.setenv("PDF_TEXT_CACHE_DIR", os.path.join(tmp_path, "pdf_text_cache"))
+    monkeypatch.setenv("LLM_CACHE_PATH", os.path.join(tmp_path, "llm_response_cache.sqlite"))
+    library = make_library(str(tmp_path), papers=4, pages=2)
+    yield server, [paper["pdf_name"] for paper in library]
+    server.close()
+
+
+def test_extract_many_under_rate_limits(papers):
+    from src.agents.extractor_agent import ExtractorAgent
+
+    server, pdf_names = papers
+    finished = []
+
+    results = asyncio.run(ExtractorAgent(use_cache=False).extract_many(
+        pdf_names, on_result=lambda name, result: finished.append(name), concurrency=2, base_delay=0.01,
+    ))
+
+    assert all(isinstance(result, dict) for result in results)
+    assert results[0]["Uses GANs?"]["answer"] is True
+    assert sorted(finished) == sorted(pdf_names)
+    assert server.counts[429] >= 1
+    assert server.counts["max_concurrent_chat"] <= 2
+
+
+def test_analyze_many_under_rate_limits(papers):
+    from src.agents.analyzer_agent import AnalyzerAgent
+
+    server, pdf_names = papers
+
+    results = asyncio.run(AnalyzerAgent(use_cache=False).analyze_many(pdf_names, concurrency=2, base_delay=0.01))
+
+    assert all(isinstance(result, tuple) for result in results)
+    assert all("Goals" in analysis for analysis, _ in results)
+    assert server.counts[429] >= 1
+    assert server.counts["max_concurrent_chat"] <= 2
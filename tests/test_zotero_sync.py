@@ -0,0 +1,116 @@
+import os
+import urllib.error
+
+import pytest
+
+from benchmarks.stand_ins import FakeZoteroServer
+from src.data.zotero_integration import ZoteroStore, ZoteroSync
+
+
+def article(key: str, title: str):
+    return {"key": key, "itemType": "journalArticle", "title": title, "collections": ["SVUM4G2M"]}
+
+
+@pytest.fixture
+def zotero():
+    server = FakeZoteroServer()
+    for i in range(5):
+        server.add_item(article(f"ITEM{i:04d}", f"Paper {i}"))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ZoteroStore(os.path.join(tmp_path, "zotero_store.sqlite"))
+
+
+def make_sync(zotero, store, **kwargs):
+    return ZoteroSync(user_id="1", api_key="test", base_url=zotero.url, store=store, **kwargs)
+
+
+def test_first_sync_fetches_every_page(zotero, store):
+    for i in range(5, 12):
+        zotero.add_item(article(f"ITEM{i:04d}", f"Paper {i}"))
+
+    stats = make_sync(zotero, store, page_size=5).sync()
+
+    assert stats == {"version": 12, "updated": 12, "deleted": 0}
+    assert len(store) == 12
+    assert store.library_version("users/1") == 12
+    assert store.find_by_title("Paper 11")["key"] == "ITEM0011"
+
+
+def test_unchanged_library_answers_304(zotero, store):
+    make_sync(zotero, store).sync()
+    requests = zotero.counts["requests"]
+
+    stats = make_sync(zotero, store).sync()
+
+    assert stats == {"version": 5, "updated": 0, "deleted": 0}
+    assert zotero.counts[304] == 1
+    assert zotero.counts["requests"] == requests + 1
+
+
+def test_incremental_sync_fetches_only_changes(zotero, store):
+    make_sync(zotero, store).sync()
+    zotero.add_item(article("ITEM0001", "Paper 1, camera-ready"))
+    zotero.add_item(article("ITEM0099", "Paper 99"))
+
+    stats = make_sync(zotero, store).sync()
+
+    assert stats == {"version": 7, "updated": 2, "deleted": 0}
+    assert len(store) == 6
+    assert store.get("ITEM0001")["data"]["title"] == "Paper 1, camera-ready"
+
+
+def test_deleted_items_are_removed(zotero, store):
+    make_sync(zotero, store).sync()
+    zotero.delete_item("ITEM0002")
+
+    stats = make_sync(zotero, store).sync()
+
+    assert stats == {"version": 6, "updated": 0, "deleted": 1}
+    assert store.get("ITEM0002") is None
+    assert len(store) == 4
+
+
+def test_library_change_mid_sync_restarts(zotero, store):
+    for i in range(5, 12):
+        zotero.add_item(article(f"ITEM{i:04d}", f"Paper {i}"))
+
+    def change_library(path):
+        zotero.after_response = None
+        zotero.add_item(article("ITEM0100", "Added during the sync"))
+
+    zotero.after_response = change_library
+
+    stats = make_sync(zotero, store, page_size=5, workers=1).sync()
+
+    assert zotero.counts[412] >= 1
+    assert stats["version"] == 13
+    assert len(store) == 13
+    assert store.library_version("users/1") == 13
+    assert store.get("ITEM0100") is not None
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_rate_limits_are_retried(zotero, store, status):
+    zotero.fail_next(status, count=2, retry_after=0)
+
+    stats = make_sync(zotero, store).sync()
+
+    assert zotero.counts[status] == 2
+    assert stats["updated"] == 5
+    assert len(store) == 5
+
+
+def test_rate_limit_gives_up_after_max_retries(zotero, store):
+    zotero.fail_next(503, count=3, retry_after=0)
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        make_sync(zotero, store, max_retries=2).sync()
+
+    assert error.value.code == 503
+    assert len(store) == 0
+    assert store.library_version("users/1") == 0
@@ -1,5 +1,6 @@
 import streamlit as st
 from src.agents.conversational_agent import ConversationalAgent
+from src.tracing import tracer, start_metrics_server
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -9,6 +10,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 def get_conversational_agent():
     try:
         agent = ConversationalAgent()
+        start_metrics_server()
+        # Imports agno and opens the retrieval indexes in the background while the page renders.
+        agent.warm_up()
         return agent
     except ValueError as e:
         st.error(f"Configuration Error: {e}. Please check your .env file.")
@@ -19,6 +23,43 @@ def get_conversational_agent():
 
 conversational_agent = get_conversational_agent()
 
+@st.fragment(run_every=5)
+def stage_stats_panel():
+    """
+    Per-stage latency of this process (retrieval, embedding, LLM answers), refreshed every few seconds.
+    """
+    stats = tracer.snapshot()
+    if not stats:
+        st.caption("Nenhuma etapa registrada ainda.")
+        return
+    st.dataframe(
+        [
+            {
+                "etapa": stage,
+                "n": summary["count"],
+                "erros": summary["errors"],
+                "média (s)": round(summary["mean_seconds"], 3),
+                "p50 (s)": summary["p50_seconds"],
+                "p95 (s)": summary["p95_seconds"],
+            }
+            for stage, summary in stats.items()
+        ],
+        hide_index=True,
+    )
+    stage = st.selectbox("Histograma", list(stats))
+    histogram = list(stats[stage]["histogram"].items())
+    last = max(i for i, (_, count) in enumerate(histogram) if count)
+    st.bar_chart(
+        [{"≤ segundos": bound, "chamadas": count} for bound, count in histogram[:last + 1]],
+        x="≤ segundos",
+        y="chamadas",
+        sort=False,
+    )
+
+with st.sidebar:
+    st.subheader("Desempenho")
+    stage_stats_panel()
+
 st.title("Assistente de Pesquisa Acadêmica")
 st.markdown("Faça perguntas sobre seus documentos acadêmicos indexados.")
 
@@ -41,11 +82,9 @@ if prompt := st.chat_input("Sua pergunta..."):
 
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
-        with st.spinner("Buscando e gerando resposta..."):
-            try:
-                response = conversational_agent.run(prompt)
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
-            except Exception as e:
-                st.error(f"Erro ao gerar resposta: {e}")
-                logging.error(f"Error generating response for prompt '{prompt}': {e}")
+        try:
+            response = st.write_stream(conversational_agent.ask_stream(prompt))
+            st.session_state.messages.append({"role": "assistant", "content": response})
+        except Exception as e:
+            st.error(f"Erro ao gerar resposta: {e}")
+            logging.error(f"Error generating response for prompt '{prompt}': {e}")